@@ -1,3 +1,15 @@
-from .modem import find_sim7600_port, Modem
+__all__ = ["main", "find_sim7600_port", "find_sim7600_ports", "Modem"]
 
-__all__ = ["main", "find_sim7600_port", "Modem"]
+
+def __getattr__(name):
+    # Resolved on first use so "python -m sim7600 <command>" only imports
+    # what that command needs
+    if name in ("find_sim7600_port", "find_sim7600_ports", "Modem"):
+        from . import modem
+
+        return getattr(modem, name)
+    if name == "main":
+        from .__main__ import main
+
+        return main
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,14 +4,30 @@ Handles subcommand dispatching for SMS, GPS, and Voice features.
 """
 
 import sys
+import time
 import argparse
 
 
 def main():
+    # Checked before parsing so parsing is timed too. It is a top-level
+    # option, so only the arguments before the command are looked at.
+    for arg in sys.argv[1:]:
+        if not arg.startswith("-"):
+            break
+        if arg == "--profile-startup":
+            from . import startup
+
+            startup.enable()
+
     parser = argparse.ArgumentParser(
         description="SIM7600 Toolkit - SMS, GPS, and Voice for SIM7600G-H modem",
         epilog="Use 'python -m sim7600 <command> --help' for more information on a specific command.",
     )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Print where startup time goes (to stderr) when the command exits",
+    )
 
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
@@ -37,6 +53,42 @@ def main():
     receive_parser.add_argument(
         "--json-out", default="", help="Write messages as JSON Lines"
     )
+    receive_parser.add_argument(
+        "--archive-dir",
+        default=None,
+        help="Segmented message archive directory (default: logs/sms, '' to disable)",
+    )
+    receive_parser.add_argument(
+        "--webhook", default="", help="POST received messages to this URL in batches"
+    )
+    receive_parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=None,
+        help="Capacity of each pipeline stage queue (default: 1000)",
+    )
+    receive_parser.add_argument(
+        "--overflow",
+        choices=["block", "drop-oldest", "spill"],
+        default=None,
+        help="Full sink queue policy (default: spill)",
+    )
+    receive_parser.add_argument(
+        "--urc-port",
+        default=None,
+        help="Second AT interface for incoming SMS, or 'auto' (default: one port)",
+    )
+    receive_parser.add_argument(
+        "--urc-interface",
+        choices=["modem", "at"],
+        default=None,
+        help="Which interface --urc-port is (default: modem)",
+    )
+    receive_parser.add_argument(
+        "--schedule",
+        default=None,
+        help="Scheduled sends file (default: logs/scheduled.json, '' to disable)",
+    )
     receive_parser.add_argument(
         "--no-console", action="store_true", help="Don't print messages to console"
     )
@@ -65,20 +117,199 @@ def main():
         "--encoding",
         default="auto",
         choices=["auto", "gsm", "ucs2"],
-        help="Character encoding: auto (default), gsm (ASCII), ucs2 (Unicode/emoji)"
+        help="Character encoding: auto (default: GSM 7-bit, UCS2 if needed), "
+        "gsm (replace unsupported characters), ucs2 (Unicode/emoji)"
     )
     send_parser.add_argument(
         "--echo", action="store_true", help="Echo raw serial lines (debug)"
     )
 
-    # GPS subcommand (placeholder for future)
-    gps_parser = subparsers.add_parser("gps", help="GPS operations (coming soon)")
+    # SMS stats subcommand
+    stats_parser = sms_subparsers.add_parser(
+        "stats", help="Show traffic statistics (volumes, top contacts, latency)"
+    )
+    stats_parser.add_argument(
+        "--file",
+        default="logs/analytics.json",
+        help="Statistics snapshot (default: logs/analytics.json)",
+    )
+    stats_parser.add_argument(
+        "--hours", type=int, default=24, help="Window for the hourly series (default: 24)"
+    )
+    stats_parser.add_argument(
+        "--top", type=int, default=10, help="Number of top contacts (default: 10)"
+    )
+    stats_parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Recreate the statistics from the message archive into a separate "
+             "file (<file>.rebuilt.json) and show them",
+    )
+    stats_parser.add_argument(
+        "--archive-dir", default="logs/sms", help="Archive used by --rebuild"
+    )
+    stats_parser.add_argument(
+        "--json", action="store_true", help="Print the raw summary as JSON"
+    )
+
+    # SMS schedule subcommand
+    schedule_parser = sms_subparsers.add_parser(
+        "schedule",
+        help="Send an SMS later through a running receiver or dashboard",
+    )
+    schedule_parser.add_argument("recipient", nargs="?", help="Phone number")
+    schedule_parser.add_argument("message", nargs="?", help="Message text")
+    when_group = schedule_parser.add_mutually_exclusive_group()
+    when_group.add_argument(
+        "--at", default=None, help="Send time, e.g. '2025-10-20 08:00'"
+    )
+    when_group.add_argument(
+        "--in", dest="after", default=None, help="Send after a delay, e.g. 30m, 2h, 1d"
+    )
+    schedule_parser.add_argument(
+        "--list", action="store_true", help="Show pending and recent scheduled sends"
+    )
+    schedule_parser.add_argument(
+        "--cancel", metavar="ID", default=None, help="Cancel a pending scheduled send"
+    )
+    schedule_parser.add_argument(
+        "--file", default="logs/scheduled.json",
+        help="Scheduled sends file (default: logs/scheduled.json)",
+    )
+    schedule_parser.add_argument(
+        "--inbox", default="logs/scheduled-inbox",
+        help="Where new requests are queued (default: logs/scheduled-inbox)",
+    )
+
+    # SMS history subcommand
+    history_parser = sms_subparsers.add_parser(
+        "history", help="Search sent and received messages"
+    )
+    history_parser.add_argument(
+        "--contact", "-c", default=None, help="Only messages to/from this number"
+    )
+    history_parser.add_argument(
+        "--direction", choices=["sent", "received"], default=None,
+        help="Only sent or only received messages",
+    )
+    history_parser.add_argument(
+        "--since", default=None,
+        help="Start time: ISO date/time or an age like 2h, 7d (default: everything)",
+    )
+    history_parser.add_argument(
+        "--until", default=None, help="End time: ISO date/time or an age like 30m"
+    )
+    history_parser.add_argument(
+        "--text", "-t", default=None, help="Only messages containing this text"
+    )
+    history_parser.add_argument(
+        "--ignore-case", "-i", action="store_true", help="Case-insensitive --text"
+    )
+    history_parser.add_argument(
+        "--last", "-n", type=int, default=None, help="Show only the newest N matches"
+    )
+    history_parser.add_argument(
+        "--follow", "-f", action="store_true",
+        help="Keep printing new matching messages as they arrive",
+    )
+    history_parser.add_argument(
+        "--json", action="store_true", help="Print JSON Lines instead of a table"
+    )
+    history_parser.add_argument(
+        "--archive-dir", default="logs/sms",
+        help="Message archive to search (default: logs/sms)",
+    )
+    history_parser.add_argument(
+        "--file", default=None,
+        help="Search a JSON Lines log instead (e.g. logs/sms.jsonl)",
+    )
+
+    # GPS subcommand
+    gps_parser = subparsers.add_parser("gps", help="GPS operations")
     gps_subparsers = gps_parser.add_subparsers(dest="gps_command", help="GPS actions")
     track_parser = gps_subparsers.add_parser(
-        "track", help="Track GPS location (coming soon)"
+        "track", help="Track GPS location and record it to a track file"
     )
     track_parser.add_argument(
-        "--interval", type=int, default=5, help="Update interval in seconds"
+        "--interval",
+        type=float,
+        default=1.0,
+        help="Fix interval in seconds; below 1 selects 10 Hz NMEA (default: 1)",
+    )
+    track_parser.add_argument(
+        "--port",
+        default="auto",
+        help="AT serial port or 'auto' to auto-detect"
+    )
+    track_parser.add_argument(
+        "--baud", type=int, default=115200, help="Baud rate (default: 115200)"
+    )
+    track_parser.add_argument(
+        "--source",
+        default="auto",
+        choices=["auto", "nmea", "poll"],
+        help="Read NMEA port (streaming) or poll AT+CGPSINFO (default: auto)",
+    )
+    track_parser.add_argument(
+        "--nmea-port",
+        default="auto",
+        help="NMEA serial port or 'auto' to auto-detect"
+    )
+    track_parser.add_argument(
+        "--out",
+        default="logs/gps/track.bin",
+        help="Binary track file ('' to disable, default: logs/gps/track.bin)",
+    )
+    track_parser.add_argument(
+        "--capacity",
+        type=int,
+        default=36000,
+        help="Fixes kept in memory (default: 36000 = 1h at 10 Hz)",
+    )
+    track_parser.add_argument(
+        "--simplify",
+        type=float,
+        default=0,
+        metavar="METRES",
+        help="Record a simplified track with this tolerance (default: raw fixes)",
+    )
+    track_parser.add_argument(
+        "--quiet", action="store_true", help="Don't print fixes to console"
+    )
+    track_parser.add_argument(
+        "--echo", action="store_true", help="Echo raw serial lines (debug)"
+    )
+
+    # GPS export subcommand
+    export_parser = gps_subparsers.add_parser(
+        "export", help="Simplify and export a recorded track"
+    )
+    export_parser.add_argument(
+        "track", nargs="?", default="logs/gps/track.bin", help="Binary track file"
+    )
+    export_parser.add_argument("out", help="Output file")
+    export_parser.add_argument(
+        "--format",
+        choices=["gpx", "geojson", "bin"],
+        help="Output format (default: from the output file extension)",
+    )
+    export_parser.add_argument(
+        "--epsilon",
+        type=float,
+        default=5.0,
+        help="Douglas-Peucker tolerance in metres, 0 to keep every fix (default: 5)",
+    )
+    export_parser.add_argument(
+        "--min-distance",
+        type=float,
+        default=2.0,
+        help="Drop fixes closer than this many metres (default: 2)",
+    )
+    export_parser.add_argument(
+        "--since", type=float, help="Start time (epoch seconds)"
+    )
+    export_parser.add_argument(
+        "--until", type=float, help="End time (epoch seconds)"
     )
 
     # Voice subcommand
@@ -107,6 +338,94 @@ def main():
         "--echo", action="store_true", help="Echo raw serial lines (debug)"
     )
 
+    # Combined SMS + call listener
+    both_parser = subparsers.add_parser(
+        "listen", help="Listen for SMS and incoming calls on one port"
+    )
+    both_parser.add_argument(
+        "--port",
+        default="auto",
+        help="Serial port or 'auto' to auto-detect"
+    )
+    both_parser.add_argument(
+        "--baud", type=int, default=115200, help="Baud rate (default: 115200)"
+    )
+    both_parser.add_argument(
+        "--sink",
+        action="append",
+        default=None,
+        help="Event sink: console, jsonl:<path>, archive:<dir>, webhook:<url> "
+        "(repeatable, default: console + archive:logs/sms)",
+    )
+    both_parser.add_argument(
+        "--ring-timeout",
+        type=float,
+        default=8.0,
+        help="Seconds without RING before a call is closed (default: 8)",
+    )
+    both_parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=1000,
+        help="Capacity of each pipeline stage queue (default: 1000)",
+    )
+    both_parser.add_argument(
+        "--overflow",
+        choices=["block", "drop-oldest", "spill"],
+        default="spill",
+        help="Full sink queue policy (default: spill)",
+    )
+    both_parser.add_argument(
+        "--urc-port",
+        default="",
+        help="Second AT interface for SMS/call indications, or 'auto' (default: one port)",
+    )
+    both_parser.add_argument(
+        "--urc-interface",
+        choices=["modem", "at"],
+        default="modem",
+        help="Which interface --urc-port is (default: modem)",
+    )
+    both_parser.add_argument(
+        "--echo", action="store_true", help="Echo raw serial lines (debug)"
+    )
+
+    # Health subcommand
+    health_parser = subparsers.add_parser(
+        "health", help="Show signal quality, network registration and SIM state"
+    )
+    health_parser.add_argument(
+        "--port",
+        default="auto",
+        help="Serial port or 'auto' to auto-detect"
+    )
+    health_parser.add_argument(
+        "--baud", type=int, default=115200, help="Baud rate (default: 115200)"
+    )
+    health_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep sampling until Ctrl+C"
+    )
+    health_parser.add_argument(
+        "--interval",
+        type=float,
+        default=10.0,
+        help="Seconds between samples with --watch (default: 10)"
+    )
+    health_parser.add_argument(
+        "--json", action="store_true", help="Print each sample as a JSON line"
+    )
+    health_parser.add_argument(
+        "--echo", action="store_true", help="Echo raw serial lines (debug)"
+    )
+    health_parser.add_argument(
+        "--dashboard",
+        default="http://127.0.0.1:5000",
+        help="Read samples from this running dashboard instead of opening "
+             "the port ('' to always open it; default: http://127.0.0.1:5000)",
+    )
+
     # Dashboard subcommand
     dashboard_parser = subparsers.add_parser("dashboard", help="Launch web dashboard")
     dashboard_parser.add_argument(
@@ -125,8 +444,30 @@ def main():
         action="store_true",
         help="Enable debug mode"
     )
+    dashboard_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="WSGI worker processes; >1 serves with gunicorn (default: 1)"
+    )
+    dashboard_parser.add_argument(
+        "--history",
+        type=int,
+        default=None,
+        help="Messages kept in memory (default: $DASHBOARD_HISTORY or 10000)"
+    )
+    dashboard_parser.add_argument(
+        "--backend-address",
+        default=None,
+        help="host:port of the modem backend process (default: 127.0.0.1:5050)"
+    )
 
     args = parser.parse_args()
+    if args.profile_startup:
+        from . import startup
+
+        startup.enable()  # already on unless the option was abbreviated
+        startup.mark("parse arguments")
 
     # Dispatch to appropriate handler
     if args.command == "sms":
@@ -144,6 +485,20 @@ def main():
                 sys.argv.extend(["--logfile", args.logfile])
             if args.json_out:
                 sys.argv.extend(["--json-out", args.json_out])
+            if args.archive_dir is not None:
+                sys.argv.extend(["--archive-dir", args.archive_dir])
+            if args.webhook:
+                sys.argv.extend(["--webhook", args.webhook])
+            if args.queue_size is not None:
+                sys.argv.extend(["--queue-size", str(args.queue_size)])
+            if args.overflow is not None:
+                sys.argv.extend(["--overflow", args.overflow])
+            if args.urc_port is not None:
+                sys.argv.extend(["--urc-port", args.urc_port])
+            if args.urc_interface is not None:
+                sys.argv.extend(["--urc-interface", args.urc_interface])
+            if args.schedule is not None:
+                sys.argv.extend(["--schedule", args.schedule])
             if args.no_console:
                 sys.argv.append("--no-console")
             if args.init_only:
@@ -153,6 +508,7 @@ def main():
             sms_main()
         elif args.sms_command == "send":
             # Import and initialize modem
+            from .codec import plan_message
             from .modem import Modem, find_sim7600_port
             from .logger_config import setup_logging
             
@@ -175,12 +531,29 @@ def main():
             # Open modem
             modem = Modem(port, args.baud, echo_raw=args.echo)
             try:
-                modem.open()
+                try:
+                    modem.open()
+                except Exception:
+                    if args.port.lower() != "auto":
+                        raise
+                    # The cached port may be stale (modem re-plugged); rescan once
+                    port = find_sim7600_port(refresh=True)
+                    if not port:
+                        raise
+                    modem = Modem(port, args.baud, echo_raw=args.echo)
+                    modem.open()
                 logger.info(f"Connected to modem on {port}")
                 
                 # Send SMS
                 logger.info(f"Sending SMS to {args.recipient}...")
                 logger.info(f"Message: {args.message}")
+                plan = plan_message(args.message, args.encoding)
+                logger.info(
+                    f"Encoding: {'GSM 7-bit' if plan.encoding == 'gsm' else 'UCS2'}, "
+                    f"{plan.segments} part{'s' if plan.segments > 1 else ''}"
+                )
+                if plan.lossy:
+                    logger.warning(f"Some characters can't be sent in GSM; sending: {plan.text}")
                 if modem.send_sms(args.recipient, args.message, encoding=args.encoding):
                     logger.info("✅ SMS sent successfully!")
                     sys.exit(0)
@@ -197,12 +570,272 @@ def main():
                 sys.exit(1)
             finally:
                 modem.close()
+        elif args.sms_command == "stats":
+            import json
+            from pathlib import Path
+            from .analytics import TrafficStats, rebuild_from_archive
+
+            if args.hours < 1:
+                stats_parser.error("--hours must be at least 1")
+            if args.rebuild:
+                from .archive import MessageArchive
+
+                # Never the live snapshot: a running receiver or dashboard would
+                # overwrite it from memory at its next save
+                rebuilt = Path(args.file).with_suffix(".rebuilt.json")
+                stats = rebuild_from_archive(MessageArchive(args.archive_dir), rebuilt)
+                if not args.json:
+                    print(f"✅ Rebuilt into {rebuilt}. To use it, stop the receiver and "
+                          f"dashboard, then replace {args.file} with it.")
+            else:
+                if not Path(args.file).exists():
+                    print(f"❌ No statistics at {args.file}. Run the receiver or use --rebuild.")
+                    sys.exit(1)
+                stats = TrafficStats.load(args.file)
+
+            summary = stats.summary(args.hours, args.top)
+            if args.json:
+                print(json.dumps(summary, indent=2, ensure_ascii=False))
+                return
+
+            def pct(rate):
+                return "-" if rate is None else f"{rate:.1%}"
+
+            w, t = summary["window"], summary["totals"]
+            print(f"📊 Last {args.hours} h: {w['received']} received, {w['sent']} sent, "
+                  f"{w['failed']} failed ({pct(w['failure_rate'])} failure rate)")
+            print(f"   All time: {t['received']} received, {t['sent']} sent, "
+                  f"{t['failed']} failed ({pct(t['failure_rate'])})")
+            busiest = max(summary["hourly"], key=lambda h: h["received"] + h["sent"])
+            if busiest["received"] + busiest["sent"]:
+                print(f"   Busiest hour: {busiest['hour'][:13]}:00 "
+                      f"({busiest['received']} in, {busiest['sent']} out)")
+
+            lat = summary["send_latency"]
+            if lat["count"]:
+                print(f"\n⏱️  Send latency ({lat['count']} sends): p50 {lat['p50']}s, "
+                      f"p90 {lat['p90']}s, p99 {lat['p99']}s, max {lat['max']}s")
+
+            if summary["top_contacts"]:
+                print("\n👥 Top contacts:")
+                print(f"   {'Contact':<18} {'Msgs':>6} {'In':>6} {'Out':>6} {'Failed':>6}")
+                for c in summary["top_contacts"]:
+                    approx = "~" if c["error"] else " "
+                    print(f"   {c['contact']:<18} {approx}{c['messages']:>5} {c['received']:>6} "
+                          f"{c['sent']:>6} {c['failed']:>6}")
+        elif args.sms_command == "schedule":
+            from datetime import datetime
+            from .history import parse_duration
+            from .scheduler import load_jobs, request_cancel, submit
+
+            def fmt(ts):
+                return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
+
+            if args.list:
+                jobs = load_jobs(args.file)
+                if not jobs["pending"] and not jobs["recent"]:
+                    print("Nothing scheduled.")
+                for job in jobs["pending"]:
+                    retry = f" (retry {job['attempts']})" if job["attempts"] else ""
+                    print(f"⏰ {job['id']}  {fmt(job['due'])}  {job['phone']}: "
+                          f"{job['message']}{retry}")
+                for job in jobs["recent"][:10]:
+                    print(f"   {job['id']}  {job['status']:<9}  {job['phone']}: {job['message']}")
+            elif args.cancel:
+                request_cancel(args.inbox, args.cancel)
+                print(f"✅ Cancel requested for {args.cancel}")
+            else:
+                if not args.recipient or not args.message or not (args.at or args.after):
+                    schedule_parser.error("recipient, message and --at or --in are required")
+                try:
+                    if args.after:
+                        delay = parse_duration(args.after)
+                        if delay is None:
+                            raise ValueError(f"Invalid delay {args.after!r}: use e.g. 30m, 2h, 1d")
+                        due = time.time() + delay
+                    else:
+                        due = args.at
+                    job = submit(args.inbox, args.recipient, args.message, due)
+                except ValueError as e:
+                    print(f"❌ {e}")
+                    sys.exit(1)
+                print(f"⏰ Scheduled {job['id']} for {fmt(job['due'])}.")
+                print("   It is sent by a running `sms receive` or dashboard.")
+        elif args.sms_command == "history":
+            import json
+            import os
+            import shutil
+            from collections import deque
+            from itertools import chain
+            from .history import (
+                TABLE_HEADER,
+                HistoryFilter,
+                follow_archive,
+                follow_jsonl,
+                format_row,
+                has_archive,
+                parse_when,
+                query_archive,
+                scan_jsonl,
+            )
+
+            try:
+                flt = HistoryFilter(
+                    contact=args.contact,
+                    direction=args.direction,
+                    since=parse_when(args.since) if args.since else None,
+                    until=parse_when(args.until) if args.until else None,
+                    text=args.text,
+                    ignore_case=args.ignore_case,
+                )
+            except ValueError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+
+            # The segmented archive (with its index) unless a log file is given
+            if args.file:
+                source = args.file
+                if not os.path.exists(source):
+                    print(f"❌ No log file at {source}")
+                    sys.exit(1)
+                matches = scan_jsonl(source, flt)
+                follow = follow_jsonl
+            elif has_archive(args.archive_dir):
+                source = args.archive_dir
+                matches = query_archive(source, flt)
+                follow = follow_archive
+            elif os.path.exists("logs/sms.jsonl"):
+                source = "logs/sms.jsonl"
+                matches = scan_jsonl(source, flt)
+                follow = follow_jsonl
+            else:
+                print(f"❌ No messages found in {args.archive_dir}")
+                sys.exit(1)
+
+            if args.last is not None:
+                matches = iter(deque(matches, maxlen=max(args.last, 0)))
+            if args.follow:
+                matches = chain(matches, follow(source, flt))
+
+            width = shutil.get_terminal_size().columns
+            try:
+                if not args.json:
+                    print(TABLE_HEADER)
+                for msg in matches:
+                    if args.json:
+                        print(json.dumps(msg, ensure_ascii=False), flush=args.follow)
+                    else:
+                        print(format_row(msg, width), flush=args.follow)
+            except KeyboardInterrupt:
+                pass
+            except BrokenPipeError:
+                # Output piped into e.g. `head`; stop quietly
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
         else:
             sms_parser.print_help()
     elif args.command == "gps":
         if args.gps_command == "track":
-            print("📍 GPS tracking feature coming soon!")
-            sys.exit(1)
+            from .modem import Modem, find_sim7600_port
+            from .gps import FixRing, GpsTracker, TrackWriter, find_nmea_port
+
+            port = args.port
+            if port.lower() == "auto":
+                port = find_sim7600_port()
+                if not port:
+                    print("❌ Modem not found. Specify --port.")
+                    sys.exit(1)
+
+            nmea_port = None
+            if args.source != "poll":
+                nmea_port = args.nmea_port
+                if nmea_port.lower() == "auto":
+                    nmea_port = find_nmea_port()
+                if not nmea_port and args.source == "nmea":
+                    print("❌ NMEA port not found. Specify --nmea-port.")
+                    sys.exit(1)
+
+            last_print = [0.0]
+
+            def show(t, lat, lon, alt, speed, course, sats):
+                # Console output is throttled; the track file gets every fix
+                if time.monotonic() - last_print[0] >= max(args.interval, 1.0):
+                    last_print[0] = time.monotonic()
+                    print(f"📍 {lat:.6f}, {lon:.6f}  alt {alt:.1f} m  "
+                          f"{speed * 3.6:.1f} km/h  sats {sats}")
+
+            try:
+                writer = TrackWriter(args.out) if args.out else None
+            except (OSError, ValueError) as e:
+                print(f"❌ Could not open {args.out}: {e}")
+                sys.exit(1)
+            if writer and args.simplify > 0:
+                from .track import Simplifier, SimplifyingWriter
+
+                writer = SimplifyingWriter(
+                    writer,
+                    Simplifier(epsilon_m=args.simplify, min_distance_m=args.simplify / 2),
+                )
+            tracker = GpsTracker(
+                FixRing(args.capacity), writer, on_fix=None if args.quiet else show
+            )
+            modem = Modem(port, args.baud, echo_raw=args.echo)
+            nmea = None
+            try:
+                modem.open()
+                modem.start_gps(rate_hz=10 if args.interval < 1 else 1)
+                if nmea_port:
+                    nmea = Modem(nmea_port, args.baud, echo_raw=args.echo)
+                    nmea.open()
+                    print(f"📍 Tracking from NMEA port {nmea_port}... (Ctrl+C to stop)")
+                    tracker.run_nmea(nmea)
+                else:
+                    print("📍 Tracking via AT+CGPSINFO polling... (Ctrl+C to stop)")
+                    tracker.run_poll(modem, args.interval)
+            except KeyboardInterrupt:
+                print(f"Stopped. {len(tracker.ring)} fixes in memory"
+                      + (f", {writer.count} written to {args.out}" if writer else ""))
+            except (OSError, ValueError, RuntimeError) as e:
+                # Port missing or owned by another process, or +CGPS ERROR
+                print(f"❌ GPS tracking failed: {e}")
+                sys.exit(1)
+            finally:
+                if nmea:
+                    nmea.close()
+                if modem.ser and modem.ser.is_open:
+                    modem.stop_gps()
+                modem.close()
+                if writer:
+                    writer.close()
+        elif args.gps_command == "export":
+            from .gps import read_track
+            from .track import export_track, simplify
+
+            fmt = args.format or args.out.rsplit(".", 1)[-1].lower()
+            if fmt == "json":
+                fmt = "geojson"
+            if fmt not in ("gpx", "geojson", "bin"):
+                print("❌ Unknown format. Use --format gpx|geojson|bin.")
+                sys.exit(1)
+            try:
+                stats = {"read": 0, "written": 0}
+
+                def counted(fixes, key):
+                    for fix in fixes:
+                        stats[key] += 1
+                        yield fix
+
+                fixes = counted(
+                    read_track(args.track, since=args.since, until=args.until), "read"
+                )
+                if args.epsilon > 0 or args.min_distance > 0:
+                    fixes = simplify(
+                        fixes, epsilon_m=args.epsilon, min_distance_m=args.min_distance
+                    )
+                export_track(counted(fixes, "written"), fmt, args.out)
+            except (OSError, ValueError) as e:
+                print(f"❌ Export failed: {e}")
+                sys.exit(1)
+            print(f"✅ Exported {stats['written']} of {stats['read']} fixes to {args.out}")
         else:
             gps_parser.print_help()
     elif args.command == "voice":
@@ -243,14 +876,156 @@ def main():
             except KeyboardInterrupt:
                 print("Stopped.")
                 sys.exit(0)
+            except RuntimeError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
             finally:
                 modem.close()
         else:
             voice_parser.print_help()
+    elif args.command == "listen":
+        from .modem import Modem, find_sim7600_port, resolve_urc_port
+        from .events import EventParser, make_sink
+        from .pipeline import ReceivePipeline
+        from .logger_config import setup_logging
+
+        logger = setup_logging(None, console=True)
+
+        port = args.port
+        if port.lower() == "auto":
+            port = find_sim7600_port()
+            if not port:
+                logger.error("Could not find SIM7600 modem. Specify --port manually.")
+                sys.exit(1)
+
+        try:
+            sinks = [make_sink(spec, logger) for spec in (args.sink or ["console", "archive"])]
+        except ValueError as e:
+            logger.error(str(e))
+            sys.exit(1)
+
+        urc_port, urc_interface = resolve_urc_port(args.urc_port, port, args.urc_interface)
+        if args.urc_port and not urc_port:
+            logger.warning("No second AT interface found; using one port.")
+
+        modem = Modem(
+            port,
+            args.baud,
+            echo_raw=args.echo,
+            urc_port=urc_port,
+            urc_interface=urc_interface,
+        )
+        pipeline = ReceivePipeline(
+            modem.readline,
+            sinks,
+            parser=EventParser(args.ring_timeout),
+            queue_size=args.queue_size,
+            sink_overflow=args.overflow,
+        )
+        try:
+            modem.open()
+            modem.init_listen()
+            where = f"{urc_port} (commands on {port})" if urc_port else port
+            logger.info(f"Listening for SMS and calls on {where}... (Ctrl+C to stop)")
+            pipeline.run()
+        except KeyboardInterrupt:
+            logger.info("Stopped by user (Ctrl+C).")
+        except Exception as e:
+            logger.error(f"Error: {e}")
+            sys.exit(1)
+        finally:
+            # Drains queued events and closes sinks
+            pipeline.shutdown()
+            modem.close()
+    elif args.command == "health":
+        import json
+        from urllib.error import URLError
+        from urllib.request import urlopen
+        from .modem import Modem, find_sim7600_port
+        from .health import HealthSampler
+
+        def show(sample, where):
+            if args.json:
+                print(json.dumps(sample))
+            elif not sample["responding"]:
+                print(f"❌ {sample['at']}  No response from modem on {where}")
+            else:
+                signal = "unknown" if sample["dbm"] is None else f"{sample['dbm']} dBm"
+                print(
+                    f"📶 {sample['at']}  Signal: {signal} (CSQ {sample['rssi']}, "
+                    f"BER {sample['ber']})  Network: {sample['creg']} "
+                    f"(LTE: {sample['cereg']})  SIM: {sample['sim']}"
+                )
+
+        def from_dashboard():
+            url = args.dashboard.rstrip("/") + "/api/health?last=1"
+            try:
+                with urlopen(url, timeout=1.0) as resp:
+                    return json.load(resp).get("latest")
+            except (URLError, OSError, ValueError):
+                return None
+
+        # A running dashboard owns the port and already samples it; opening
+        # the port as well would have two processes reading the same lines
+        latest = from_dashboard() if args.dashboard else None
+        if latest is not None:
+            try:
+                while True:
+                    started = time.monotonic()
+                    show(latest, args.dashboard)
+                    if not args.watch:
+                        break
+                    time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+                    latest = from_dashboard()
+                    if latest is None:
+                        print(f"❌ Dashboard at {args.dashboard} stopped answering")
+                        sys.exit(1)
+            except KeyboardInterrupt:
+                pass
+            return
+
+        port = args.port
+        if port.lower() == "auto":
+            port = find_sim7600_port()
+            if not port:
+                print("❌ Modem not found. Specify --port.")
+                sys.exit(1)
+
+        modem = Modem(port, args.baud, echo_raw=args.echo)
+        sampler = HealthSampler(modem, interval=args.interval)
+        try:
+            modem.open()
+        except Exception as e:
+            print(f"❌ Could not open {port}: {e}")
+            print("   If `sms receive`, `listen` or the dashboard is running, it owns the "
+                  "port. A running dashboard is read instead when --dashboard points at it.")
+            sys.exit(1)
+        try:
+            modem.command("AT+CMEE=2")  # readable SIM errors
+            while True:
+                started = time.monotonic()
+                show(sampler.sample_now(), port)
+                if not args.watch:
+                    break
+                time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            sys.exit(1)
+        finally:
+            modem.close()
     elif args.command == "dashboard":
         try:
             from sim7600_dashboard import run_dashboard
-            run_dashboard(host=args.host, port=args.port, debug=args.debug)
+            run_dashboard(
+                host=args.host,
+                port=args.port,
+                debug=args.debug,
+                workers=args.workers,
+                backend_address=args.backend_address,
+                history=args.history,
+            )
         except ImportError:
             print("❌ Dashboard not installed!")
             print("\nTo install the dashboard, run:")
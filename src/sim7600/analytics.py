@@ -0,0 +1,370 @@
+"""
+Incremental SMS traffic statistics.
+
+``TrafficStats`` is updated once per message as it flows through the
+receiver or the dashboard's send endpoint, and keeps only fixed-size
+aggregates:
+
+- hourly buckets of received / sent / failed counts (the last ``max_hours``)
+- the same counts by hour of day (24 buckets)
+- the busiest contacts, tracked with a Space-Saving sketch of bounded size
+- a log-scale histogram of send latency for quantiles
+
+Queries cost O(buckets), never O(history). Aggregates are saved to a JSON
+snapshot so they survive restarts; ``rebuild_from_archive`` recreates one
+from the message archive.
+"""
+
+from __future__ import annotations
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from .parser import message_time
+
+ANALYTICS_PATH = "logs/analytics.json"
+SNAPSHOT_VERSION = 1
+
+RECEIVED, SENT, FAILED = 0, 1, 2
+_KINDS = ("received", "sent", "failed")
+
+# Send latency buckets: 50 ms growing by 25% per bucket, up to ~5 minutes
+LATENCY_BOUNDS = tuple(0.05 * 1.25**i for i in range(40))
+
+
+class SpaceSaving:
+    """
+    Top-N heavy hitters in bounded memory (Metwally et al.).
+
+    Keeps at most ``capacity`` keys. When a new key arrives and the table is
+    full, the key with the smallest count is replaced and the newcomer
+    inherits that count as its ``error``. Any key with a true count above
+    total/capacity is guaranteed to be present, and ``count - error`` is a
+    lower bound on its true count.
+
+    Per-kind counts (received/sent/failed) are exact from the moment a key
+    entered the table.
+    """
+
+    def __init__(self, capacity: int = 200):
+        self.capacity = capacity
+        # key -> [count, error, received, sent, failed]
+        self._items: dict[str, list[int]] = {}
+
+    def add(self, key: str, kind: int, n: int = 1):
+        item = self._items.get(key)
+        if item is None:
+            if len(self._items) < self.capacity:
+                item = self._items[key] = [0, 0, 0, 0, 0]
+            else:
+                victim = min(self._items, key=lambda k: self._items[k][0])
+                floor = self._items.pop(victim)[0]
+                item = self._items[key] = [floor, floor, 0, 0, 0]
+        item[0] += n
+        item[2 + kind] += n
+
+    def top(self, n: int = 10) -> list[dict]:
+        ranked = sorted(self._items.items(), key=lambda kv: kv[1][0], reverse=True)[:n]
+        return [
+            {
+                "contact": key,
+                "messages": count,
+                "error": error,
+                "received": received,
+                "sent": sent,
+                "failed": failed,
+            }
+            for key, (count, error, received, sent, failed) in ranked
+        ]
+
+    def to_dict(self) -> dict:
+        return {"capacity": self.capacity, "items": self._items}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "SpaceSaving":
+        sketch = cls(d.get("capacity", 200))
+        sketch._items = {k: list(v) for k, v in d.get("items", {}).items()}
+        return sketch
+
+
+class LatencyHistogram:
+    """Fixed log-scale buckets; quantiles are read off cumulative counts."""
+
+    def __init__(self, bounds: tuple[float, ...] = LATENCY_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last bucket: above every bound
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        lo, hi = 0, len(self.bounds)
+        while lo < hi:  # first bound >= seconds
+            mid = (lo + hi) // 2
+            if self.bounds[mid] < seconds:
+                lo = mid + 1
+            else:
+                hi = mid
+        self.counts[lo] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-th quantile."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        def r(v):
+            return None if v is None else round(v, 3)
+
+        return {
+            "count": self.count,
+            "mean": r(self.total / self.count) if self.count else None,
+            "p50": r(self.quantile(0.5)),
+            "p90": r(self.quantile(0.9)),
+            "p99": r(self.quantile(0.99)),
+            "max": r(self.max) if self.count else None,
+        }
+
+    def to_dict(self) -> dict:
+        return {"counts": self.counts, "count": self.count, "total": self.total, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "LatencyHistogram":
+        h = cls()
+        counts = d.get("counts", [])
+        if len(counts) == len(h.counts):
+            h.counts = list(counts)
+            h.count = d.get("count", sum(counts))
+            h.total = d.get("total", 0.0)
+            h.max = d.get("max", 0.0)
+        return h
+
+
+class TrafficStats:
+    """
+    Thread-safe traffic aggregates with an optional JSON snapshot.
+
+    Args:
+        path: Snapshot file ('' or None keeps everything in memory).
+        max_hours: Hourly buckets kept (default 90 days).
+        top_capacity: Contacts tracked by the heavy-hitters sketch.
+        save_interval: Minimum seconds between automatic snapshot writes.
+
+    Example:
+        >>> stats = TrafficStats.load("logs/analytics.json")
+        >>> stats.record_received("+1234567890")
+        >>> stats.record_send("+1234567890", ok=True, latency=2.4)
+        >>> stats.summary(hours=24, top=5)
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike | None = ANALYTICS_PATH,
+        max_hours: int = 24 * 90,
+        top_capacity: int = 200,
+        save_interval: float = 30.0,
+    ):
+        self.path = Path(path) if path else None
+        self.max_hours = max_hours
+        self.save_interval = save_interval
+        self.hours: dict[int, list[int]] = {}  # hour start (epoch) -> counts
+        self.hour_of_day = [[0, 0, 0] for _ in range(24)]
+        self.contacts = SpaceSaving(top_capacity)
+        self.latency = LatencyHistogram()
+        self.totals = [0, 0, 0]
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one snapshot write at a time
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.logger = logging.getLogger("sim7600")
+
+    # ----- updates -----
+
+    def _record(self, kind: int, contact: str | None, at: float | None):
+        at = time.time() if at is None else at
+        hour = int(at // 3600) * 3600
+        bucket = self.hours.get(hour)
+        if bucket is None:
+            bucket = self.hours[hour] = [0, 0, 0]
+            if len(self.hours) > self.max_hours:
+                del self.hours[min(self.hours)]
+        bucket[kind] += 1
+        self.hour_of_day[datetime.fromtimestamp(at).hour][kind] += 1
+        self.totals[kind] += 1
+        if contact:
+            self.contacts.add(contact, kind)
+        self._dirty = True
+
+    def record_received(self, sender: str | None, at: float | None = None):
+        with self._lock:
+            self._record(RECEIVED, sender, at)
+        self.maybe_save()
+
+    def record_send(
+        self, recipient: str | None, ok: bool, latency: float | None = None, at: float | None = None
+    ):
+        """Count a send attempt; ``latency`` is seconds spent in ``send_sms``."""
+        with self._lock:
+            self._record(SENT if ok else FAILED, recipient, at)
+            if ok and latency is not None:
+                self.latency.add(latency)
+        self.maybe_save()
+
+    def record_message(self, message: dict):
+        """Count an archived message dict (used when rebuilding)."""
+        at = message_time(message)
+        if message.get("direction") == "sent":
+            self.record_send(message.get("recipient"), ok=True, at=at)
+        elif message.get("direction") == "received":
+            self.record_received(message.get("sender"), at=at)
+
+    # ----- queries -----
+
+    def summary(self, hours: int = 24, top: int = 10, now: float | None = None) -> dict:
+        """Totals, hourly series, hour-of-day profile, top contacts and latency."""
+        now = time.time() if now is None else now
+        current = int(now // 3600) * 3600
+        with self._lock:
+            hourly = []
+            window = [0, 0, 0]
+            for i in range(hours - 1, -1, -1):
+                start = current - i * 3600
+                counts = self.hours.get(start, (0, 0, 0))
+                for k in range(3):
+                    window[k] += counts[k]
+                hourly.append(
+                    {"hour": datetime.fromtimestamp(start).isoformat(), **dict(zip(_KINDS, counts))}
+                )
+            return {
+                "window_hours": hours,
+                "window": {**dict(zip(_KINDS, window)), "failure_rate": _rate(window)},
+                "totals": {**dict(zip(_KINDS, self.totals)), "failure_rate": _rate(self.totals)},
+                "hourly": hourly,
+                "hour_of_day": [
+                    {"hour": h, **dict(zip(_KINDS, counts))}
+                    for h, counts in enumerate(self.hour_of_day)
+                ],
+                "top_contacts": [
+                    {**c, "failure_rate": _rate((0, c["sent"], c["failed"]))}
+                    for c in self.contacts.top(top)
+                ],
+                "send_latency": self.latency.summary(),
+            }
+
+    # ----- persistence -----
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> dict:
+        return {
+            "version": SNAPSHOT_VERSION,
+            "hours": {str(h): c for h, c in self.hours.items()},
+            "hour_of_day": self.hour_of_day,
+            "totals": self.totals,
+            "contacts": self.contacts.to_dict(),
+            "latency": self.latency.to_dict(),
+        }
+
+    @classmethod
+    def load(cls, path: str | os.PathLike | None = ANALYTICS_PATH, **kwargs) -> "TrafficStats":
+        """Load a snapshot, or start empty if there is none (or it is unreadable)."""
+        stats = cls(path, **kwargs)
+        if not stats.path or not stats.path.exists():
+            return stats
+        try:
+            d = json.loads(stats.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return stats
+        if d.get("version") != SNAPSHOT_VERSION:
+            return stats
+        stats.hours = {int(h): list(c) for h, c in d.get("hours", {}).items()}
+        stats.hour_of_day = [list(c) for c in d.get("hour_of_day", stats.hour_of_day)]
+        stats.totals = list(d.get("totals", stats.totals))
+        stats.contacts = SpaceSaving.from_dict(d.get("contacts", {}))
+        stats.latency = LatencyHistogram.from_dict(d.get("latency", {}))
+        return stats
+
+    def save(self):
+        """Write the snapshot atomically; safe to call from several threads."""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                # Serialized under the lock: the buckets are live lists
+                data = json.dumps(self._snapshot(), ensure_ascii=False)
+                self._dirty = False
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                # A unique temporary name, so no other writer can move it
+                with tempfile.NamedTemporaryFile(
+                    "w", encoding="utf-8", dir=self.path.parent,
+                    prefix=self.path.name, suffix=".tmp", delete=False,
+                ) as tmp:
+                    tmp.write(data)
+                try:
+                    os.replace(tmp.name, self.path)
+                except OSError:
+                    os.unlink(tmp.name)
+                    raise
+            except OSError:
+                self._dirty = True  # try again next time
+                raise
+            self._last_save = time.monotonic()
+
+    def maybe_save(self):
+        """Write the snapshot if it changed and ``save_interval`` has passed."""
+        if self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+            try:
+                self.save()
+            except OSError as e:
+                # Called after every update; a full disk mustn't fail a send
+                self.logger.error(f"Could not save {self.path}: {e}")
+
+    def close(self):
+        if self._dirty:
+            self.save()
+
+
+def _rate(counts) -> float | None:
+    attempts = counts[SENT] + counts[FAILED]
+    return round(counts[FAILED] / attempts, 4) if attempts else None
+
+
+def rebuild_from_archive(archive, path: str | os.PathLike | None = ANALYTICS_PATH) -> TrafficStats:
+    """Recreate a snapshot from every message in a ``MessageArchive``."""
+    stats = TrafficStats(path, save_interval=float("inf"))
+    for message in archive.iter_messages():
+        stats.record_message(message)
+    stats.save()
+    return stats
+
+
+class AnalyticsSink:
+    """Sink that counts received SMS (see ``sim7600.events``)."""
+
+    def __init__(self, stats: TrafficStats):
+        self.stats = stats
+
+    def __call__(self, event):
+        if getattr(event, "kind", None) == "sms":
+            self.stats.record_received(event.sender)
+
+    def close(self):
+        self.stats.close()
@@ -0,0 +1,526 @@
+"""
+Time-partitioned message archive.
+
+Messages are appended as JSON lines to a segment file under the archive
+directory. Segments roll over daily or when they reach ``max_bytes``; closed
+segments are gzip-compressed. A small sidecar ``index.json`` records, per
+segment, the time range, message count, the first offset of every contact and
+periodic (time, offset) checkpoints, so queries open only the segments they
+need and can seek straight to the first interesting record.
+
+Layout::
+
+    logs/sms/
+        index.json
+        sms-20251017-000.jsonl.gz   # closed
+        sms-20251018-000.jsonl      # active
+"""
+
+from __future__ import annotations
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .parser import message_time
+
+INDEX_NAME = "index.json"
+INDEX_VERSION = 1
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+CHECKPOINT_EVERY = 256
+
+
+def message_contact(message: dict) -> str | None:
+    """Return the other party of a message (sender or recipient)."""
+    if message.get("direction") == "sent":
+        return message.get("recipient")
+    return message.get("sender") or message.get("recipient")
+
+
+class _Segment:
+    """Index entry for one segment file."""
+
+    __slots__ = (
+        "name", "day", "start", "end", "count", "size", "closed",
+        "compressed", "contacts", "checkpoints", "_max_seen",
+    )
+
+    def __init__(self, name: str, day: str):
+        self.name = name
+        self.day = day
+        self.start: float | None = None
+        self.end: float | None = None
+        self.count = 0
+        self.size = 0
+        self.closed = False
+        self.compressed = False
+        # contact -> offset of its first message in this segment
+        self.contacts: dict[str, int] = {}
+        # [max time of all records before offset, offset]
+        self.checkpoints: list[list[float]] = []
+        self._max_seen: float | None = None
+
+    def note(self, message: dict, ts: float, offset: int, length: int):
+        if self.count % CHECKPOINT_EVERY == 0 and self._max_seen is not None:
+            self.checkpoints.append([self._max_seen, offset])
+        self.start = ts if self.start is None else min(self.start, ts)
+        self.end = ts if self.end is None else max(self.end, ts)
+        self._max_seen = self.end
+        contact = message_contact(message)
+        if contact and contact not in self.contacts:
+            self.contacts[contact] = offset
+        self.count += 1
+        self.size = offset + length
+
+    def overlaps(self, since: float | None, until: float | None) -> bool:
+        if self.count == 0:
+            return False
+        if since is not None and self.end is not None and self.end < since:
+            return False
+        if until is not None and self.start is not None and self.start > until:
+            return False
+        return True
+
+    def seek_offset(self, since: float | None, contact: str | None) -> int:
+        """Earliest offset that may hold a record matching the query."""
+        offset = 0
+        if since is not None:
+            for max_before, cp_offset in self.checkpoints:
+                if max_before < since:
+                    offset = int(cp_offset)
+                else:
+                    break
+        if contact is not None:
+            offset = max(offset, self.contacts.get(contact, 0))
+        return offset
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "day": self.day,
+            "start": self.start,
+            "end": self.end,
+            "count": self.count,
+            "size": self.size,
+            "closed": self.closed,
+            "compressed": self.compressed,
+            "contacts": self.contacts,
+            "checkpoints": self.checkpoints,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "_Segment":
+        seg = cls(data["name"], data["day"])
+        seg.start = data.get("start")
+        seg.end = data.get("end")
+        seg.count = data.get("count", 0)
+        seg.size = data.get("size", 0)
+        seg.compressed = data.get("compressed", False)
+        seg.closed = data.get("closed", seg.compressed)
+        seg.contacts = dict(data.get("contacts", {}))
+        seg.checkpoints = [list(cp) for cp in data.get("checkpoints", [])]
+        seg._max_seen = seg.end
+        return seg
+
+
+class MessageArchive:
+    """
+    Append-only, segmented message store with a seek index.
+
+    Thread-safe: the dashboard appends from the receiver thread and request
+    handlers at the same time. With ``readonly=True`` the archive can be
+    queried while another process is writing to it: nothing is created,
+    truncated or re-indexed on disk.
+
+    Example:
+        >>> archive = MessageArchive("logs/sms")
+        >>> archive.append({"direction": "sent", "recipient": "+123", "text": "Hi"})
+        >>> archive.tail(10)
+    """
+
+    def __init__(
+        self,
+        root: str | os.PathLike = "logs/sms",
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        compress: bool = True,
+        readonly: bool = False,
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.readonly = readonly
+        self.segments: list[_Segment] = []
+        self._fh = None
+        self._lock = threading.Lock()
+        self._leftovers: list[Path] = []  # compressed originals still to delete
+        if not readonly:
+            self.root.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    # ----- index -----
+
+    @property
+    def index_path(self) -> Path:
+        return self.root / INDEX_NAME
+
+    def _load_index(self):
+        if self.index_path.exists():
+            try:
+                data = json.loads(self.index_path.read_text(encoding="utf-8"))
+                if data.get("version") == INDEX_VERSION:
+                    self.segments = [_Segment.from_dict(s) for s in data["segments"]]
+            except (OSError, ValueError, KeyError):
+                self.segments = []
+        # A segment present both plain and compressed: the index says which
+        # copy is current (compression may have been interrupted, or the
+        # original couldn't be deleted while a reader had it open)
+        indexed = {s.name for s in self.segments}
+        stale = set()
+        for gz in self.root.glob("sms-*.jsonl.gz"):
+            plain = gz.with_suffix("")
+            if plain.exists():
+                stale.add(plain.name if gz.name in indexed else gz.name)
+        if not self.readonly:
+            self._leftovers = [self.root / name for name in sorted(stale)]
+            self._remove_leftovers()
+        # Drop entries whose files vanished, then adopt unindexed segment files
+        self.segments = [
+            s for s in self.segments if s.name not in stale and (self.root / s.name).exists()
+        ]
+        known = {s.name for s in self.segments}
+        for path in sorted(self.root.glob("sms-*.jsonl*")):
+            if path.name not in known and path.name not in stale:
+                self.segments.append(self._scan_segment(path))
+        self.segments.sort(key=lambda s: s.name)
+        for seg in self.segments[:-1]:
+            seg.closed = True
+        # The active segment may have grown after the index was last written
+        active = self._active()
+        if active:
+            path = self.root / active.name
+            if path.stat().st_size != active.size:
+                active = self.segments[-1] = self._scan_segment(path)
+            if path.stat().st_size > active.size and not self.readonly:
+                os.truncate(path, active.size)
+        if not self.readonly:
+            self._write_index()
+
+    def _write_index(self):
+        data = {
+            "version": INDEX_VERSION,
+            "segments": [s.to_dict() for s in self.segments],
+        }
+        tmp = self.index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, self.index_path)
+
+    def _scan_segment(self, path: Path) -> _Segment:
+        """Rebuild an index entry by reading a segment file."""
+        name = path.name
+        day = name.split("-")[1]
+        seg = _Segment(name, day)
+        seg.compressed = seg.closed = name.endswith(".gz")
+        opener = gzip.open if seg.compressed else open
+        fallback = path.stat().st_mtime
+        offset = 0
+        with opener(path, "rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # torn write; truncated before the next append
+                try:
+                    msg = json.loads(raw)
+                except ValueError:
+                    msg = None
+                if isinstance(msg, dict):
+                    ts = message_time(msg)
+                    seg.note(msg, ts if ts is not None else seg.end or fallback, offset, len(raw))
+                offset += len(raw)
+        seg.size = offset
+        return seg
+
+    def _active(self) -> _Segment | None:
+        if self.segments and not self.segments[-1].closed:
+            return self.segments[-1]
+        return None
+
+    # ----- writing -----
+
+    def append(self, message: dict):
+        """Append one message to the active segment."""
+        with self._lock:
+            self._append(message)
+            self._fh.flush()
+
+    def extend(self, messages: Iterable[dict]):
+        """Append many messages (e.g. importing an old JSONL log)."""
+        with self._lock:
+            for message in messages:
+                self._append(message)
+            if self._fh:
+                self._fh.flush()
+            self._write_index()
+
+    def _append(self, message: dict):
+        if self.readonly:
+            raise RuntimeError("Archive is open read-only")
+        ts = message_time(message) or time.time()
+        data = (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+        seg = self._segment_for(ts, len(data))
+        if self._fh is None:
+            self._fh = open(self.root / seg.name, "ab")
+        offset = seg.size
+        self._fh.write(data)
+        seg.note(message, ts, offset, len(data))
+        if seg.count % CHECKPOINT_EVERY == 0:
+            self._write_index()
+
+    def _segment_for(self, ts: float, length: int) -> _Segment:
+        day = datetime.fromtimestamp(ts).strftime("%Y%m%d")
+        active = self._active()
+        if active is not None:
+            # Late records (older day) stay in the active segment; only roll
+            # forward in time or on size.
+            if day <= active.day and active.size + length <= self.max_bytes:
+                return active
+            if active.count == 0:
+                return active
+            self._close_active()
+        seq = sum(1 for s in self.segments if s.day == day)
+        seg = _Segment(f"sms-{day}-{seq:03d}.jsonl", day)
+        self.segments.append(seg)
+        self._write_index()
+        return seg
+
+    def _remove_leftovers(self):
+        remaining = []
+        for path in self._leftovers:
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                remaining.append(path)
+        self._leftovers = remaining
+
+    def _close_active(self):
+        """Close the active segment and compress it."""
+        self._remove_leftovers()
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+        seg = self._active()
+        if seg is None:
+            return
+        if self.compress:
+            src = self.root / seg.name
+            dst = self.root / (seg.name + ".gz")
+            with open(src, "rb") as fin, gzip.open(dst, "wb") as fout:
+                while True:
+                    chunk = fin.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    fout.write(chunk)
+            try:
+                src.unlink()
+            except OSError:
+                # On Windows a reader (``sms history`` in another process)
+                # may have it open; the .gz is complete, so retry later
+                self._leftovers.append(src)
+            seg.name = dst.name
+            seg.compressed = True
+        seg.closed = True
+        self._write_index()
+
+    def rotate(self):
+        """Force the active segment closed (e.g. from a maintenance job)."""
+        with self._lock:
+            self._close_active()
+
+    def close(self):
+        """Flush the file handle and persist the index."""
+        with self._lock:
+            if self._fh:
+                self._fh.close()
+                self._fh = None
+            if not self.readonly:
+                self._write_index()
+
+    # ----- reading -----
+
+    def _open_segment(self, seg: _Segment):
+        path = self.root / seg.name
+        if seg.compressed:
+            return gzip.open(path, "rb")
+        return open(path, "rb")
+
+    def segments_for(
+        self,
+        since: float | None = None,
+        until: float | None = None,
+        contact: str | None = None,
+    ) -> list[_Segment]:
+        """Segments whose index entry could hold matching messages."""
+        with self._lock:
+            if self._fh:
+                self._fh.flush()
+            return [
+                s for s in self.segments
+                if s.overlaps(since, until)
+                and (contact is None or contact in s.contacts)
+            ]
+
+    def iter_messages(
+        self,
+        since: float | None = None,
+        until: float | None = None,
+        contact: str | None = None,
+        needles: Iterable[bytes] = (),
+    ) -> Iterator[dict]:
+        """
+        Yield messages in log order, optionally filtered.
+
+        Args:
+            since: Only messages at or after this epoch time.
+            until: Only messages at or before this epoch time.
+            contact: Only messages to/from this number.
+            needles: Byte strings every raw line must contain; lines without
+                them are skipped before JSON decoding.
+        """
+        needles = list(needles)
+        if contact is not None:
+            needles.append(contact.encode("utf-8"))
+        for seg in self.segments_for(since, until, contact):
+            with self._open_segment(seg) as f:
+                f.seek(seg.seek_offset(since, contact))
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break  # partially written tail
+                    if needles and not all(n in raw for n in needles):
+                        continue
+                    try:
+                        msg = json.loads(raw)
+                    except ValueError:
+                        continue
+                    if contact is not None and message_contact(msg) != contact:
+                        continue
+                    if since is not None or until is not None:
+                        ts = message_time(msg)
+                        if ts is not None:
+                            if since is not None and ts < since:
+                                continue
+                            if until is not None and ts > until:
+                                continue
+                    yield msg
+
+    def tail(self, n: int = 100) -> list[dict]:
+        """Return the last ``n`` messages, oldest first, reading newest segments only."""
+        if n <= 0:
+            return []
+        chunks: list[list[dict]] = []
+        found = 0
+        for seg in reversed(self.segments_for()):
+            chunk = []
+            with self._open_segment(seg) as f:
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break
+                    try:
+                        chunk.append(json.loads(raw))
+                    except ValueError:
+                        continue
+            chunk = chunk[-(n - found):]
+            chunks.append(chunk)
+            found += len(chunk)
+            if found >= n:
+                break
+        # Join once at the end so large ``n`` doesn't copy per segment
+        return [msg for chunk in reversed(chunks) for msg in chunk]
+
+    def read_after(
+        self, position: tuple[str, int] | None = None, last: int | None = None
+    ) -> tuple[list[dict], tuple[str, int] | None]:
+        """
+        Messages written after ``position``, oldest first, and the new position.
+
+        For following an archive that another process appends to (the
+        dashboard's WSGI workers do this). Segment files are listed on disk,
+        not taken from the index, so new segments show up without a reload.
+        A position is (segment name without ``.gz``, byte offset) and stays
+        valid when the segment is compressed.
+
+        Args:
+            position: Where the previous call stopped; None starts at the
+                beginning.
+            last: Return at most this many of the newest messages.
+        """
+        names = sorted({p.name.removesuffix(".gz") for p in self.root.glob("sms-*.jsonl*")})
+        if position is not None:
+            names = [n for n in names if n >= position[0]]
+        chunks: list[list[dict]] = []
+        found = 0
+        new_position = position
+        for name in reversed(names):
+            start = position[1] if position is not None and name == position[0] else 0
+            try:
+                chunk, end = self._read_segment_from(name, start)
+            except FileNotFoundError:
+                continue  # removed between listing and opening
+            if not chunks:
+                new_position = (name, end)  # the newest segment read
+            if last is not None:
+                chunk = chunk[max(0, len(chunk) - (last - found)):]
+            chunks.append(chunk)
+            found += len(chunk)
+            if last is not None and found >= last:
+                break
+        return [msg for chunk in reversed(chunks) for msg in chunk], new_position
+
+    def _read_segment_from(self, name: str, offset: int) -> tuple[list[dict], int]:
+        """Complete records of one segment after ``offset``, and where they end."""
+        # Prefer the plain file: a .gz next to it may still be being written
+        try:
+            f = open(self.root / name, "rb")
+        except FileNotFoundError:
+            f = gzip.open(self.root / (name + ".gz"), "rb")
+        messages = []
+        with f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # partially written tail; read again next time
+                offset += len(raw)
+                try:
+                    messages.append(json.loads(raw))
+                except ValueError:
+                    continue
+        return messages, offset
+
+    def __len__(self) -> int:
+        return sum(s.count for s in self.segments)
+
+
+def import_legacy_log(archive: MessageArchive, path: str | os.PathLike) -> int:
+    """
+    Copy an old single-file ``sms.jsonl`` log into an empty archive.
+
+    Returns the number of messages imported (0 if the archive already had data
+    or the file does not exist). The legacy file is left untouched.
+    """
+    legacy = Path(path)
+    if len(archive) or not legacy.exists():
+        return 0
+
+    def _read():
+        with open(legacy, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        pass
+
+    before = len(archive)
+    archive.extend(_read())
+    return len(archive) - before
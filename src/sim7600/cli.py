@@ -1,13 +1,18 @@
 from __future__ import annotations
-import argparse, json, os, sys
-from pathlib import Path
-from dotenv import load_dotenv
+import argparse, os, sys, threading, time
+from datetime import datetime
+from .events import ArchiveSink, ConsoleSink, JsonlSink
 from .logger_config import setup_logging
-from .modem import Modem, find_sim7600_port
-from .parser import parse_cmt_header
+from .modem import Modem, find_sim7600_port, forget_port_cache, resolve_urc_port
+from .pipeline import OVERFLOW_POLICIES, ReceivePipeline
+
+# Optional sinks (archive, webhook, analytics, scheduler) are imported only
+# when enabled: the webhook alone pulls in http.client and ssl.
 
 
 def main():
+    from dotenv import load_dotenv
+
     load_dotenv()
 
     parser = argparse.ArgumentParser(
@@ -21,6 +26,49 @@ def main():
     parser.add_argument("--baud", type=int, default=int(os.getenv("BAUD", "115200")))
     parser.add_argument("--logfile", default=os.getenv("LOG_PATH", "logs/sms.log"))
     parser.add_argument("--json-out", default=os.getenv("JSONL_PATH", ""))
+    parser.add_argument(
+        "--archive-dir",
+        default=os.getenv("ARCHIVE_DIR", "logs/sms"),
+        help="Segmented message archive directory ('' to disable).",
+    )
+    parser.add_argument(
+        "--webhook",
+        default=os.getenv("WEBHOOK_URL", ""),
+        help="POST received messages to this URL in batches.",
+    )
+    parser.add_argument(
+        "--analytics",
+        default=os.getenv("ANALYTICS_PATH", "logs/analytics.json"),
+        help="Traffic statistics snapshot ('' to disable).",
+    )
+    parser.add_argument(
+        "--schedule",
+        default=os.getenv("SCHEDULE_PATH", "logs/scheduled.json"),
+        help="Send scheduled SMS (see `sms schedule`) from this file ('' to disable).",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=int(os.getenv("QUEUE_SIZE", "1000")),
+        help="Capacity of each pipeline stage queue.",
+    )
+    parser.add_argument(
+        "--overflow",
+        choices=OVERFLOW_POLICIES,
+        default=os.getenv("SINK_OVERFLOW", "spill"),
+        help="What a full sink queue does: block, drop-oldest or spill to disk.",
+    )
+    parser.add_argument(
+        "--urc-port",
+        default=os.getenv("URC_PORT", ""),
+        help="Second AT interface that receives SMS indications, or 'auto'.",
+    )
+    parser.add_argument(
+        "--urc-interface",
+        choices=["modem", "at"],
+        default=os.getenv("URC_INTERFACE", "modem"),
+        help="Which interface --urc-port is.",
+    )
     parser.add_argument("--no-console", action="store_true")
     parser.add_argument(
         "--init-only", action="store_true", help="Send init AT commands and exit."
@@ -50,68 +98,140 @@ def main():
     else:
         logger.info(f"Using specified port: {port}")
 
-    json_path = None
-    jf = None
-    if args.json_out:
-        json_path = Path(args.json_out)
-        json_path.parent.mkdir(parents=True, exist_ok=True)
-        jf = open(json_path, "a", encoding="utf-8")
-
-    modem = Modem(port, args.baud, echo_raw=args.echo)
+    urc_port, urc_interface = resolve_urc_port(args.urc_port, port, args.urc_interface)
+    if urc_port:
+        logger.info(f"Receiving SMS on {urc_port} ({urc_interface} interface)")
+    elif args.urc_port:
+        logger.warning("No second AT interface found; using one port.")
+
+    modem = Modem(
+        port,
+        args.baud,
+        echo_raw=args.echo,
+        urc_port=urc_port,
+        urc_interface=urc_interface,
+    )
     try:
         modem.open()
     except Exception as e:
         logger.error(f"Failed to open serial port {port}: {e}")
+        if args.port.lower() == "auto":
+            forget_port_cache()  # rescan next time
         sys.exit(1)
 
+    pipeline = None
+    scheduler = None
     try:
-        modem.init_sms_push()
+        try:
+            modem.init_sms_push()
+        except RuntimeError as e:
+            logger.error(f"Modem init failed: {e}")
+            sys.exit(1)
         logger.info("Modem initialized for SMS push (+CMT).")
 
         if args.init_only:
             logger.info("Init-only requested; exiting.")
             return
 
-        pending_header = None
-        for line in modem.lines():
-            if not line:
-                continue
-
-            if pending_header is None:
-                hdr = parse_cmt_header(line)
-                if hdr:
-                    pending_header = hdr
-                continue
-            else:
-                # The next non-empty line after +CMT header is the message body
-                body = line.strip()
-                if not body:
-                    # Sometimes an empty line appears; keep waiting
-                    continue
-
-                message = {
-                    "sender": pending_header["number"],
-                    "timestamp": pending_header["timestamp"],
-                    "text": body,
-                    "raw_header": pending_header["raw_header"],
-                }
-                logger.info(
-                    f'SMS from {message["sender"]} @ {message["timestamp"]}: {message["text"]}'
-                )
-
-                if jf:
-                    jf.write(json.dumps(message, ensure_ascii=False) + "\n")
-                    jf.flush()
-
-                pending_header = None
+        # The serial thread only reads lines; parsing and every sink run on
+        # their own pipeline stages so a slow sink can't stall the modem.
+        sinks = [ConsoleSink(logger)]
+        archive = stats = None
+        if args.json_out:
+            sinks.append(JsonlSink(args.json_out))
+        if args.archive_dir:
+            from .archive import MessageArchive
+
+            archive = MessageArchive(args.archive_dir)
+            sinks.append(ArchiveSink(archive))
+        if args.webhook:
+            from .webhook import WebhookSink
+
+            sinks.append(WebhookSink(args.webhook))
+        if args.analytics:
+            from .analytics import AnalyticsSink, TrafficStats
+
+            stats = TrafficStats.load(args.analytics)
+            sinks.append(AnalyticsSink(stats))
+
+        read_line = modem.readline
+        dispatch = None
+        if args.schedule:
+            # Scheduled sends share the port with the reader: take turns
+            modem_lock = threading.Lock()
+
+            def read_line():
+                if modem.has_urc_channel:
+                    return modem.readline()
+                with modem_lock:
+                    return modem.readline()
+
+            def dispatch(jobs):
+                # One result per job as it finishes, so a failure can't
+                # change the outcome of jobs already sent
+                with modem_lock:
+                    for job in jobs:
+                        yield send_scheduled(job)
+
+            def send_scheduled(job) -> bool:
+                started = time.monotonic()
+                try:
+                    # An SMS arriving mid-send goes to the pipeline
+                    ok = modem.send_sms(
+                        job["phone"], job["message"], on_urc=pipeline.parse_stage.put
+                    )
+                except Exception as e:
+                    logger.error(f"Scheduled SMS to {job['phone']} failed: {e}")
+                    ok = False
+                try:
+                    if stats:
+                        stats.record_send(job["phone"], ok, time.monotonic() - started)
+                    if ok:
+                        logger.info(f"Sent scheduled SMS {job['id']} to {job['phone']}")
+                        if archive:
+                            archive.append(
+                                {
+                                    "direction": "sent",
+                                    "recipient": job["phone"],
+                                    "text": job["message"],
+                                    "timestamp": datetime.now().isoformat(),
+                                    "scheduled": job["id"],
+                                }
+                            )
+                except Exception as e:
+                    logger.error(f"Could not record scheduled SMS {job['id']}: {e}")
+                return ok
+
+        pipeline = ReceivePipeline(
+            read_line,
+            sinks,
+            queue_size=args.queue_size,
+            sink_overflow=args.overflow,
+        )
+        if dispatch:
+            from .scheduler import SendScheduler
+
+            # Started once the pipeline exists: sends hand it stray URCs
+            scheduler = SendScheduler(dispatch, args.schedule)
+            scheduler.start()
+            if len(scheduler):
+                logger.info(f"{len(scheduler)} scheduled SMS pending.")
+        pipeline.run()
 
     except KeyboardInterrupt:
         logger.info("Stopped by user (Ctrl+C).")
     finally:
-        if jf:
-            jf.close()
+        if scheduler:
+            scheduler.stop()
+        if pipeline:
+            pipeline.shutdown()
+            for m in pipeline.metrics()["stages"]:
+                logger.info(
+                    f"Stage {m['stage']}: {m['processed']} processed, "
+                    f"max depth {m['max_depth']}, {m['dropped']} dropped, "
+                    f"{m['spilled']} spilled"
+                )
         modem.close()
 
-
 if __name__ == "__main__":
     main()
@@ -0,0 +1,414 @@
+"""
+GSM 03.38 / UCS2 message encoding and SMS-SUBMIT PDUs.
+
+Text is mapped to GSM 7-bit septets with a single ``str.translate`` over a
+precomputed table (default alphabet plus the escape-prefixed extension
+table). If any character has no GSM mapping the whole message falls back to
+UCS2. The encoded message is then split into the fewest segments that fit,
+with a concatenation header (UDH) when more than one is needed, and each
+segment becomes a PDU for ``AT+CMGS`` in PDU mode (``AT+CMGF=0``).
+
+Plans are cached per text, so sending the same template to many recipients
+only encodes it once.
+
+Example:
+    >>> plan = plan_message("Hello {world}")
+    >>> plan.encoding, plan.segments, plan.units
+    ('gsm', 1, 15)
+    >>> for pdu, length in build_submit_pdus("+1234567890", plan):
+    ...     print(f"AT+CMGS={length}", pdu)
+"""
+
+from __future__ import annotations
+import functools
+import unicodedata
+from typing import NamedTuple
+
+# GSM 03.38 default alphabet, indexed by septet value. 0x1B is the escape to
+# the extension table and never maps to a character on its own.
+GSM_ALPHABET = (
+    "@£$¥èéùìòÇ\nØø\rÅå"
+    "Δ_ΦΓΛΩΠΨΣΘΞ\x1bÆæßÉ"
+    " !\"#¤%&'()*+,-./"
+    "0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNO"
+    "PQRSTUVWXYZÄÖÑÜ§"
+    "¿abcdefghijklmno"
+    "pqrstuvwxyzäöñüà"
+)
+GSM_ESCAPE = 0x1B
+# Extension table: sent as ESC + code, so each counts as two septets
+GSM_EXTENSION = {
+    "\x0c": 0x0A,
+    "^": 0x14,
+    "{": 0x28,
+    "}": 0x29,
+    "\\": 0x2F,
+    "[": 0x3C,
+    "~": 0x3D,
+    "]": 0x3E,
+    "|": 0x40,
+    "€": 0x65,
+}
+
+DCS_GSM = 0x00
+DCS_UCS2 = 0x08
+
+# Per-segment capacity: single message / part of a concatenated message
+# (the 6-octet UDH with an 8-bit reference takes 7 septets or 6 octets)
+GSM_SINGLE, GSM_PART = 160, 153  # septets
+UCS2_SINGLE, UCS2_PART = 140, 134  # octets
+MAX_PARTS = 255
+
+ENCODINGS = ("auto", "gsm", "ucs2")
+
+_UNMAPPED = "Ā"  # any non-ASCII marker; survives translate as "not GSM"
+
+
+def _build_encode_table() -> dict[int, str]:
+    # Every ASCII code point must be mapped, otherwise characters that are
+    # not in the GSM alphabet (e.g. "`") would pass through as septets.
+    table = {cp: _UNMAPPED for cp in range(128)}
+    for septet, ch in enumerate(GSM_ALPHABET):
+        if septet != GSM_ESCAPE:
+            table[ord(ch)] = chr(septet)
+    for ch, code in GSM_EXTENSION.items():
+        table[ord(ch)] = chr(GSM_ESCAPE) + chr(code)
+    return table
+
+
+_GSM_ENCODE = _build_encode_table()
+_GSM_CHARS = frozenset(ch for i, ch in enumerate(GSM_ALPHABET) if i != GSM_ESCAPE) | frozenset(
+    GSM_EXTENSION
+)
+
+
+def encode_gsm(text: str) -> bytes | None:
+    """Text -> one septet per byte, or None if a character has no GSM mapping."""
+    septets = text.translate(_GSM_ENCODE)
+    if not septets.isascii():
+        return None
+    return septets.encode("ascii")
+
+
+def to_gsm(text: str) -> str:
+    """
+    Make text GSM-encodable, losing what can't be represented.
+
+    Accents are dropped where the base letter exists (e.g. "ą" -> "a") and
+    anything else becomes "?".
+    """
+    out = []
+    for ch in text:
+        if ch in _GSM_CHARS:
+            out.append(ch)
+            continue
+        base = "".join(
+            c for c in unicodedata.normalize("NFD", ch) if unicodedata.category(c) != "Mn"
+        )
+        out.append(base if base and all(c in _GSM_CHARS for c in base) else "?")
+    return "".join(out)
+
+
+def pack_septets(septets: bytes, fill_bits: int = 0) -> bytes:
+    """Pack 7-bit values into octets, after ``fill_bits`` zero bits."""
+    value = 0
+    shift = fill_bits
+    for s in septets:
+        value |= s << shift
+        shift += 7
+    return value.to_bytes((shift + 7) // 8, "little")
+
+
+def _split(data: bytes, single: int, part: int, step: int, cut_ok) -> list[bytes]:
+    """Greedy split into the fewest chunks, never cutting where ``cut_ok`` is False."""
+    if len(data) <= single:
+        return [data]
+    parts = []
+    start = 0
+    while start < len(data):
+        end = min(start + part, len(data))
+        while end < len(data) and not cut_ok(data, end):
+            end -= step
+        parts.append(data[start:end])
+        start = end
+    return parts
+
+
+def _gsm_cut_ok(data: bytes, end: int) -> bool:
+    # An escape and the character it introduces must stay together
+    return data[end - 1] != GSM_ESCAPE
+
+
+def _ucs2_cut_ok(data: bytes, end: int) -> bool:
+    # Don't separate a UTF-16 surrogate pair (emoji etc.)
+    return not 0xD8 <= data[end - 2] <= 0xDB
+
+
+class SmsPlan(NamedTuple):
+    """
+    How a message will be sent.
+
+    Attributes:
+        text: The text that will arrive (differs from the input only for
+            lossy ``encoding="gsm"``).
+        encoding: "gsm" or "ucs2".
+        parts: Per segment, septets (GSM, one per byte) or UTF-16-BE octets.
+        lossy: True if characters were replaced to fit GSM.
+    """
+
+    text: str
+    encoding: str
+    parts: tuple[bytes, ...]
+    lossy: bool = False
+
+    @property
+    def segments(self) -> int:
+        return len(self.parts)
+
+    @property
+    def units(self) -> int:
+        """Septets (GSM) or UTF-16 code units (UCS2) in the whole message."""
+        n = sum(len(p) for p in self.parts)
+        return n if self.encoding == "gsm" else n // 2
+
+    @property
+    def per_segment(self) -> int:
+        """Capacity of each segment at the current segment count, in units."""
+        if self.encoding == "gsm":
+            return GSM_SINGLE if self.segments == 1 else GSM_PART
+        return (UCS2_SINGLE if self.segments == 1 else UCS2_PART) // 2
+
+    def to_dict(self) -> dict:
+        return {
+            "encoding": self.encoding,
+            "segments": self.segments,
+            "units": self.units,
+            "per_segment": self.per_segment,
+            "lossy": self.lossy,
+            "text": self.text,
+        }
+
+
+@functools.lru_cache(maxsize=512)
+def plan_message(text: str, encoding: str = "auto") -> SmsPlan:
+    """
+    Encode and segment a message.
+
+    Args:
+        text: Message text.
+        encoding: "auto" (GSM 7-bit when every character fits, otherwise
+            UCS2), "gsm" (always GSM, replacing what doesn't fit) or "ucs2".
+
+    Raises:
+        ValueError: Unknown encoding, or the message needs more than 255 parts.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding: {encoding!r} (use {', '.join(ENCODINGS)})")
+
+    lossy = False
+    septets = encode_gsm(text) if encoding != "ucs2" else None
+    if septets is None and encoding == "gsm":
+        converted = to_gsm(text)
+        lossy = converted != text
+        text = converted
+        septets = encode_gsm(text)
+
+    if septets is not None:
+        parts = _split(septets, GSM_SINGLE, GSM_PART, 1, _gsm_cut_ok)
+        plan = SmsPlan(text, "gsm", tuple(parts), lossy)
+    else:
+        data = text.encode("utf-16-be")
+        parts = _split(data, UCS2_SINGLE, UCS2_PART, 2, _ucs2_cut_ok)
+        plan = SmsPlan(text, "ucs2", tuple(parts))
+
+    if plan.segments > MAX_PARTS:
+        raise ValueError(f"Message too long ({plan.segments} parts, max {MAX_PARTS})")
+    return plan
+
+
+@functools.lru_cache(maxsize=256)
+def encode_address(number: str) -> bytes:
+    """Phone number -> length, type-of-address and swapped semi-octets."""
+    digits = number.strip().replace(" ", "").replace("-", "")
+    international = digits.startswith("+")
+    digits = digits.lstrip("+")
+    if not digits.isdigit():
+        raise ValueError(f"Invalid phone number: {number!r}")
+    padded = digits + "F" * (len(digits) % 2)
+    swapped = "".join(padded[i + 1] + padded[i] for i in range(0, len(padded), 2))
+    toa = 0x91 if international else 0x81
+    return bytes([len(digits), toa]) + bytes.fromhex(swapped)
+
+
+def build_submit_pdus(number: str, plan: SmsPlan, ref: int = 0) -> list[tuple[str, int]]:
+    """
+    SMS-SUBMIT PDUs for every segment of ``plan``.
+
+    The SMSC field is left empty, so the SIM's service centre is used.
+
+    Args:
+        number: Recipient.
+        plan: From ``plan_message``.
+        ref: Concatenation reference (0-255); must differ between recent
+            multipart messages to the same recipient.
+
+    Returns:
+        ``(pdu_hex, tpdu_length)`` per segment; the length is what
+        ``AT+CMGS=<length>`` expects.
+    """
+    address = encode_address(number)
+    total = plan.segments
+    dcs = DCS_GSM if plan.encoding == "gsm" else DCS_UCS2
+    # TP-MTI=SMS-SUBMIT, TP-VPF=relative, TP-UDHI when concatenated
+    first_octet = 0x11 | (0x40 if total > 1 else 0)
+    pdus = []
+    for i, part in enumerate(plan.parts, 1):
+        udh = bytes([5, 0x00, 3, ref & 0xFF, total, i]) if total > 1 else b""
+        if plan.encoding == "gsm":
+            # Septets start on the next septet boundary after the header
+            fill = -len(udh) * 8 % 7
+            ud = udh + pack_septets(part, fill)
+            udl = (len(udh) * 8 + fill) // 7 + len(part)
+        else:
+            ud = udh + part
+            udl = len(ud)
+        # TP-MR=0 (modem assigns), TP-PID=0, TP-VP=0xAA (4 days)
+        tpdu = bytes([first_octet, 0]) + address + bytes([0, dcs, 0xAA, udl]) + ud
+        pdus.append(("00" + tpdu.hex().upper(), len(tpdu)))
+    return pdus
+
+
+# ----- decoding (SMS-DELIVER) -----
+
+_GSM_DECODE = {i: ch for i, ch in enumerate(GSM_ALPHABET) if i != GSM_ESCAPE}
+_GSM_EXT_DECODE = {code: ch for ch, code in GSM_EXTENSION.items()}
+
+
+def unpack_septets(data: bytes, count: int) -> bytes:
+    """Unpack ``count`` 7-bit values from packed octets (one per byte)."""
+    value = int.from_bytes(data, "little")
+    return bytes((value >> (7 * k)) & 0x7F for k in range(count))
+
+
+def decode_gsm(septets: bytes) -> str:
+    """Septets (one per byte) -> text, resolving extension-table escapes."""
+    s = septets.decode("latin-1")
+    if "\x1b" not in s:
+        return s.translate(_GSM_DECODE)
+    chunks = s.split("\x1b")
+    out = [chunks[0].translate(_GSM_DECODE)]
+    for chunk in chunks[1:]:
+        if not chunk:
+            continue
+        code = ord(chunk[0])
+        # Unknown extension codes show as the default-alphabet character
+        out.append(_GSM_EXT_DECODE.get(code, GSM_ALPHABET[code]))
+        out.append(chunk[1:].translate(_GSM_DECODE))
+    return "".join(out)
+
+
+def _swapped_digits(data: bytes) -> str:
+    return "".join(f"{b & 0x0F:X}{b >> 4:X}" for b in data).rstrip("F")
+
+
+def decode_scts(data: bytes) -> str:
+    """Service centre timestamp -> "yy/MM/dd,hh:mm:ss+zz", as in text mode."""
+    fields = [(b & 0x0F) * 10 + (b >> 4) for b in data[:6]]
+    tz = data[6]
+    quarters = (tz & 0x07) * 10 + (tz >> 4)
+    sign = "-" if tz & 0x08 else "+"
+    yy, mo, dd, hh, mi, ss = fields
+    return f"{yy:02d}/{mo:02d}/{dd:02d},{hh:02d}:{mi:02d}:{ss:02d}{sign}{quarters:02d}"
+
+
+class DeliverPdu(NamedTuple):
+    """
+    A received SMS (one part of it, for concatenated messages).
+
+    ``ref``, ``part`` and ``total`` come from the concatenation header; a
+    single message has ``total == 1``.
+    """
+
+    sender: str
+    timestamp: str
+    text: str
+    ref: int = 0
+    part: int = 1
+    total: int = 1
+
+
+def _parse_udh(header: bytes) -> tuple[int, int, int] | None:
+    """Concatenation (ref, part, total) from a user data header, if present."""
+    i = 0
+    while i + 1 < len(header):
+        iei, length = header[i], header[i + 1]
+        value = header[i + 2 : i + 2 + length]
+        if len(value) < length:
+            raise IndexError("truncated information element")
+        if iei == 0x00 and length == 3:  # 8-bit reference
+            return value[0], value[2], value[1]
+        if iei == 0x08 and length == 4:  # 16-bit reference
+            return (value[0] << 8) | value[1], value[3], value[2]
+        i += 2 + length
+    return None
+
+
+def parse_deliver_pdu(pdu_hex: str) -> DeliverPdu:
+    """
+    Decode an SMS-DELIVER PDU as reported by ``+CMT: ,<length>`` in PDU mode.
+
+    Raises:
+        ValueError: Not valid hex, not an SMS-DELIVER, or truncated.
+    """
+    try:
+        b = bytes.fromhex(pdu_hex.strip())
+        i = 1 + b[0]  # skip the SMSC address
+        first = b[i]
+        if first & 0x03 != 0:
+            raise ValueError(f"Not an SMS-DELIVER PDU (MTI {first & 0x03})")
+        oa_digits, toa = b[i + 1], b[i + 2]
+        oa = b[i + 3 : i + 3 + (oa_digits + 1) // 2]
+        i += 3 + (oa_digits + 1) // 2
+        if toa & 0x70 == 0x50:
+            # Alphanumeric sender ("BANK"), GSM packed
+            sender = decode_gsm(unpack_septets(oa, oa_digits * 4 // 7))
+        else:
+            sender = ("+" if toa & 0x70 == 0x10 else "") + _swapped_digits(oa)
+        dcs = b[i + 1]
+        timestamp = decode_scts(b[i + 2 : i + 9])
+        udl = b[i + 9]
+        ud = b[i + 10 :]
+
+        concat = None
+        header_len = 0
+        if first & 0x40 and ud:  # TP-UDHI
+            header_len = ud[0] + 1
+            if header_len > len(ud):
+                raise IndexError
+            # A truncated information element raises IndexError too
+            concat = _parse_udh(ud[1:header_len])
+    except IndexError:
+        raise ValueError("Truncated PDU") from None
+
+    # Alphabet from the data coding scheme
+    if dcs & 0x80 == 0:
+        # General data coding, including the 0x40-0x7F "auto-delete" group
+        alphabet = (dcs >> 2) & 0x03  # 0 GSM, 1 8-bit, 2 UCS2
+    elif dcs & 0xF0 == 0xF0:
+        alphabet = 1 if dcs & 0x04 else 0
+    else:
+        alphabet = 2 if dcs & 0xF0 == 0xE0 else 0
+
+    if alphabet == 0:
+        septets = unpack_septets(ud, udl)
+        text = decode_gsm(septets[(header_len * 8 + 6) // 7 :])
+    elif alphabet == 2:
+        text = ud[header_len:udl].decode("utf-16-be", errors="replace")
+    else:
+        text = ud[header_len:udl].decode("latin-1")
+
+    if concat:
+        ref, part, total = concat
+        return DeliverPdu(sender, timestamp, text, ref, part, total)
+    return DeliverPdu(sender, timestamp, text)
@@ -0,0 +1,379 @@
+"""
+Typed modem events for SMS and voice calls.
+
+An ``EventParser`` turns the unsolicited result codes read from the modem
+into ``SmsEvent`` and ``CallRecord`` objects. ``ReceivePipeline`` (see
+``sim7600.pipeline``) runs the parser and hands every event to each
+configured sink (any callable taking one event).
+
+Incoming call indications look like::
+
+    RING                      (or +CRING: VOICE with AT+CRC=1)
+    +CLIP: "+1234567890",145,,,"",0
+    ...repeated every few seconds...
+    NO CARRIER / MISSED_CALL: 10:15AM +1234567890
+
+A call is reported once, as a ``CallRecord``, after ringing stops.
+
+In PDU mode (``AT+CMGF=0``) each SMS arrives as::
+
+    +CMT: ,<length>
+    <hex PDU>
+
+Parts of a concatenated message are held by a ``Reassembler`` and reported
+as one ``SmsEvent`` once all of them have arrived.
+"""
+
+from __future__ import annotations
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+from .codec import DeliverPdu, parse_deliver_pdu
+from .parser import parse_cmt_header
+
+CLIP_RE = re.compile(r'^\+CLIP:\s*"(?P<number>[^"]*)"')
+# PDU mode: +CMT: [<alpha>],<length>
+CMT_PDU_RE = re.compile(r'^\+CMT:\s*(?:"[^"]*")?\s*,\s*(?P<length>\d+)\s*$')
+MISSED_RE = re.compile(r"^MISSED_CALL:\s*\S+\s+(?P<number>\S+)")
+
+# The modem repeats RING roughly every 5 s; after this long without one the
+# caller has hung up.
+RING_TIMEOUT = 8.0
+
+
+@dataclass
+class SmsEvent:
+    sender: str
+    timestamp: str
+    text: str
+    raw_header: str
+    received_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    parts: int = 1  # SMS segments joined into this message
+    incomplete: bool = False  # True if some parts never arrived
+
+    kind = "sms"
+
+    def to_dict(self) -> dict:
+        d = {"direction": "received", **asdict(self)}
+        # Keep single-part messages in the same shape as before
+        if d["parts"] == 1:
+            del d["parts"]
+        if not d["incomplete"]:
+            del d["incomplete"]
+        return d
+
+
+@dataclass
+class CallRecord:
+    caller: str | None
+    ring_count: int
+    started_at: float
+    ended_at: float
+    end_reason: str = "timeout"  # "timeout", "no_carrier" or "missed_call"
+
+    kind = "call"
+
+    @property
+    def duration(self) -> float:
+        """Seconds from the first ring until ringing stopped."""
+        return self.ended_at - self.started_at
+
+    def to_dict(self) -> dict:
+        return {
+            "direction": "call",
+            "caller": self.caller,
+            "ring_count": self.ring_count,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(),
+            "ended_at": datetime.fromtimestamp(self.ended_at).isoformat(),
+            "duration": round(self.duration, 1),
+            "end_reason": self.end_reason,
+        }
+
+
+Event = SmsEvent | CallRecord
+Sink = Callable[[Event], None]
+
+
+class _Pending:
+    __slots__ = ("first", "raw_header", "total", "parts", "chars", "started")
+
+    def __init__(self, first: DeliverPdu, raw_header: str, now: float):
+        self.first = first
+        self.raw_header = raw_header
+        self.total = first.total
+        self.parts: dict[int, str] = {}
+        self.chars = 0
+        self.started = now
+
+
+class Reassembler:
+    """
+    Join the parts of concatenated SMS.
+
+    Parts are keyed by sender, reference and part count. Incomplete messages
+    are flushed (marked ``incomplete``) when they are older than ``timeout``
+    or when buffering more would exceed ``max_messages`` / ``max_chars``, so
+    orphaned parts never accumulate.
+
+    Args:
+        timeout: Seconds to wait for the remaining parts.
+        max_messages: Partial messages held at once.
+        max_chars: Total text held across partial messages.
+    """
+
+    def __init__(self, timeout: float = 300.0, max_messages: int = 64, max_chars: int = 256_000):
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self.max_chars = max_chars
+        self._pending: OrderedDict[tuple, _Pending] = OrderedDict()
+        self._chars = 0
+        self.stats = {"completed": 0, "expired": 0, "evicted": 0}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, pdu: DeliverPdu, raw_header: str, now: float | None = None) -> list[SmsEvent]:
+        """Add one received PDU; returns the messages it completes or displaces."""
+        now = time.time() if now is None else now
+        if pdu.total <= 1:
+            return [_sms_event(pdu, pdu.text, raw_header)]
+
+        out = self.expire(now)
+        key = (pdu.sender, pdu.ref, pdu.total)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = _Pending(pdu, raw_header, now)
+        if pdu.part in pending.parts:  # re-delivered part
+            pending.chars -= len(pending.parts[pdu.part])
+            self._chars -= len(pending.parts[pdu.part])
+        if pdu.part == 1:
+            pending.first, pending.raw_header = pdu, raw_header
+        pending.parts[pdu.part] = pdu.text
+        pending.chars += len(pdu.text)
+        self._chars += len(pdu.text)
+
+        if len(pending.parts) >= pending.total:
+            del self._pending[key]
+            self._chars -= pending.chars
+            self.stats["completed"] += 1
+            out.append(self._join(pending))
+
+        # Memory cap: flush the oldest partial messages first
+        while self._pending and (
+            len(self._pending) > self.max_messages or self._chars > self.max_chars
+        ):
+            out.append(self._flush_oldest("evicted"))
+        return out
+
+    def expire(self, now: float | None = None) -> list[SmsEvent]:
+        """Flush partial messages older than ``timeout``."""
+        now = time.time() if now is None else now
+        out = []
+        while self._pending:
+            oldest = next(iter(self._pending.values()))
+            if now - oldest.started <= self.timeout:
+                break
+            out.append(self._flush_oldest("expired"))
+        return out
+
+    def _flush_oldest(self, reason: str) -> SmsEvent:
+        _, pending = self._pending.popitem(last=False)
+        self._chars -= pending.chars
+        self.stats[reason] += 1
+        logging.getLogger("sim7600").warning(
+            f"SMS from {pending.first.sender}: only {len(pending.parts)} of "
+            f"{pending.total} parts arrived ({reason})"
+        )
+        return self._join(pending)
+
+    @staticmethod
+    def _join(pending: _Pending) -> SmsEvent:
+        text = "".join(pending.parts[i] for i in sorted(pending.parts))
+        event = _sms_event(pending.first, text, pending.raw_header)
+        event.parts = len(pending.parts)
+        event.incomplete = len(pending.parts) < pending.total
+        return event
+
+
+def _sms_event(pdu: DeliverPdu, text: str, raw_header: str) -> SmsEvent:
+    return SmsEvent(
+        sender=pdu.sender, timestamp=pdu.timestamp, text=text, raw_header=raw_header
+    )
+
+
+class EventParser:
+    """
+    Turn modem lines into events.
+
+    Call ``feed()`` for every line and ``tick()`` regularly (e.g. after each
+    readline timeout) so calls are closed once ringing stops.
+    """
+
+    def __init__(
+        self, ring_timeout: float = RING_TIMEOUT, reassembler: Reassembler | None = None
+    ):
+        self.ring_timeout = ring_timeout
+        self.reassembler = reassembler if reassembler is not None else Reassembler()
+        self._pending_header: dict | None = None
+        self._call: CallRecord | None = None
+
+    def feed(self, line: str, now: float | None = None) -> list[Event]:
+        now = time.time() if now is None else now
+        events = self.tick(now)
+        line = line.strip()
+        if not line:
+            return events
+
+        if line == "RING" or line.startswith("+CRING:"):
+            if self._call is None:
+                self._call = CallRecord(None, 0, now, now)
+            self._call.ring_count += 1
+            self._call.ended_at = now
+            return events
+
+        m = CLIP_RE.match(line)
+        if m:
+            if self._call is None:
+                self._call = CallRecord(None, 0, now, now)
+            self._call.caller = m.group("number") or None
+            self._call.ended_at = now
+            return events
+
+        if self._call is not None and line == "NO CARRIER":
+            self._call.ended_at = now
+            events.append(self._close_call("no_carrier"))
+            return events
+
+        m = MISSED_RE.match(line)
+        if m:
+            if self._call is None:
+                self._call = CallRecord(m.group("number"), 0, now, now)
+            self._call.caller = self._call.caller or m.group("number")
+            events.append(self._close_call("missed_call"))
+            return events
+
+        if self._pending_header is None:
+            hdr = parse_cmt_header(line)
+            if hdr is None and CMT_PDU_RE.match(line):
+                hdr = {"pdu": True, "raw_header": line}
+            if hdr:
+                self._pending_header = hdr
+            return events
+
+        # The next non-empty line after a +CMT header is the message body
+        hdr, self._pending_header = self._pending_header, None
+        if hdr.get("pdu"):
+            try:
+                pdu = parse_deliver_pdu(line)
+            except ValueError as e:
+                logging.getLogger("sim7600").warning(f"Undecodable SMS PDU ({e}): {line}")
+                return events
+            events.extend(self.reassembler.add(pdu, hdr["raw_header"], now))
+            return events
+
+        events.append(
+            SmsEvent(
+                sender=hdr["number"],
+                timestamp=hdr["timestamp"],
+                text=line,
+                raw_header=hdr["raw_header"],
+            )
+        )
+        return events
+
+    def tick(self, now: float | None = None) -> list[Event]:
+        """Close a call whose ringing has stopped and flush stale SMS parts."""
+        now = time.time() if now is None else now
+        events: list[Event] = self.reassembler.expire(now)
+        if self._call is not None and now - self._call.ended_at > self.ring_timeout:
+            events.append(self._close_call("timeout"))
+        return events
+
+    def _close_call(self, reason: str) -> CallRecord:
+        call, self._call = self._call, None
+        call.end_reason = reason
+        return call
+
+
+# ----- sinks -----
+
+
+class ConsoleSink:
+    """Log events through the sim7600 logger."""
+
+    def __init__(self, logger: logging.Logger | None = None):
+        self.logger = logger or logging.getLogger("sim7600")
+
+    def __call__(self, event: Event):
+        if isinstance(event, SmsEvent):
+            self.logger.info(f"SMS from {event.sender} @ {event.timestamp}: {event.text}")
+        else:
+            self.logger.info(
+                f"Call from {event.caller or 'unknown'}: {event.ring_count} rings, "
+                f"{event.duration:.0f}s ({event.end_reason})"
+            )
+
+
+class JsonlSink:
+    """Append every event as one JSON line."""
+
+    def __init__(self, path: str):
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(p, "a", encoding="utf-8")
+
+    def __call__(self, event: Event):
+        self._f.write(json.dumps(event.to_dict(), ensure_ascii=False) + "\n")
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+class ArchiveSink:
+    """Store received SMS in a ``MessageArchive`` (calls are skipped)."""
+
+    def __init__(self, archive):
+        self.archive = archive
+
+    def __call__(self, event: Event):
+        if isinstance(event, SmsEvent):
+            self.archive.append(event.to_dict())
+
+    def close(self):
+        self.archive.close()
+
+
+def make_sink(spec: str, logger: logging.Logger | None = None) -> Sink:
+    """
+    Build a sink from a CLI spec: ``console``, ``jsonl:<path>``,
+    ``archive:<dir>``, ``webhook:<url>`` or ``analytics:<path>``.
+    """
+    kind, _, arg = spec.partition(":")
+    if kind == "webhook" and arg:
+        from .webhook import WebhookSink
+
+        return WebhookSink(arg)
+    if kind == "console":
+        return ConsoleSink(logger)
+    if kind == "jsonl" and arg:
+        return JsonlSink(arg)
+    if kind == "archive":
+        from .archive import MessageArchive
+
+        return ArchiveSink(MessageArchive(arg or "logs/sms"))
+    if kind == "analytics":
+        from .analytics import ANALYTICS_PATH, AnalyticsSink, TrafficStats
+
+        return AnalyticsSink(TrafficStats.load(arg or ANALYTICS_PATH))
+    raise ValueError(
+        f"Unknown sink: {spec!r} (use console, jsonl:<path>, archive:<dir>, "
+        "webhook:<url>, analytics:<path>)"
+    )
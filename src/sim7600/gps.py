@@ -0,0 +1,359 @@
+"""
+GPS tracking for the SIM7600 GNSS engine.
+
+Fixes come either from the NMEA port (streaming, 1 or 10 Hz) or from polling
+``AT+CGPSINFO`` on the AT port. They are parsed without building per-fix
+dicts, kept in an array-backed ring buffer and streamed to a compact binary
+track file, so a long-running tracker uses constant memory.
+
+Track file format: an 8-byte magic header followed by fixed-size little-endian
+records (see ``TRACK_RECORD``).
+"""
+
+from __future__ import annotations
+import math
+import os
+import struct
+import time
+from array import array
+from calendar import timegm
+from pathlib import Path
+from typing import Callable, Iterator
+
+TRACK_MAGIC = b"S76TRK1\x00"
+# time (epoch s), lat, lon (deg), alt (m), speed (m/s), course (deg), satellites
+TRACK_RECORD = struct.Struct("<dddfffB")
+KNOTS_TO_MS = 0.514444
+
+NAN = float("nan")
+
+
+def find_nmea_port() -> str | None:
+    """Return the SIM7600 NMEA port (e.g. 'COM9'), if present."""
+    from .modem import find_sim7600_ports
+
+    return find_sim7600_ports().get("nmea")
+
+
+# ----- parsing -----
+
+
+def _nmea_checksum_ok(line: str) -> bool:
+    star = line.rfind("*")
+    if star < 0:
+        return True  # checksum is optional in NMEA 0183
+    try:
+        expected = int(line[star + 1 : star + 3], 16)
+    except ValueError:
+        return False
+    calc = 0
+    for ch in line[1:star].encode("ascii", "ignore"):
+        calc ^= ch
+    return calc == expected
+
+
+def _coord(value: str, hemi: str) -> float:
+    """Convert NMEA (d)ddmm.mmmm + hemisphere to signed decimal degrees."""
+    if not value:
+        return NAN
+    dot = value.find(".")
+    deg_len = (dot if dot >= 0 else len(value)) - 2
+    deg = float(value[:deg_len]) + float(value[deg_len:]) / 60.0
+    return -deg if hemi in ("S", "W") else deg
+
+
+def _float(value: str) -> float:
+    return float(value) if value else NAN
+
+
+def _epoch(ddmmyy: str, hhmmss: str) -> float:
+    """UTC date + time fields to epoch seconds."""
+    whole = int(hhmmss[:6])
+    frac = float(hhmmss[6:]) if len(hhmmss) > 6 else 0.0
+    return timegm((
+        2000 + int(ddmmyy[4:6]), int(ddmmyy[2:4]), int(ddmmyy[0:2]),
+        whole // 10000, (whole // 100) % 100, whole % 100, 0, 0, 0,
+    )) + frac
+
+
+class NmeaParser:
+    """
+    Incremental NMEA parser that emits one fix per RMC sentence.
+
+    GGA supplies altitude and satellite count; the most recent GGA with the
+    same UTC time is merged into the RMC fix. State is held in scalars so
+    feeding a sentence allocates nothing beyond the field split.
+
+    ``on_fix`` is called as ``on_fix(t, lat, lon, alt, speed, course, sats)``.
+    """
+
+    __slots__ = ("on_fix", "_gga_time", "_gga_alt", "_gga_sats", "bad_checksums")
+
+    def __init__(self, on_fix: Callable[..., None]):
+        self.on_fix = on_fix
+        self._gga_time = ""
+        self._gga_alt = NAN
+        self._gga_sats = 0
+        self.bad_checksums = 0
+
+    def feed(self, line: str) -> bool:
+        """Parse one sentence. Returns True if a fix was emitted."""
+        if len(line) < 7 or line[0] != "$":
+            return False
+        kind = line[3:6]
+        if kind != "RMC" and kind != "GGA":
+            return False
+        if not _nmea_checksum_ok(line):
+            self.bad_checksums += 1
+            return False
+        star = line.rfind("*")
+        f = (line[:star] if star > 0 else line).split(",")
+        try:
+            if kind == "GGA":
+                # $xxGGA,time,lat,N,lon,E,quality,sats,hdop,alt,M,...
+                if len(f) > 9 and f[6] not in ("", "0"):
+                    self._gga_time = f[1]
+                    self._gga_sats = int(f[7] or 0)
+                    self._gga_alt = _float(f[9])
+                return False
+            # $xxRMC,time,status,lat,N,lon,E,speed_kn,course,date,...
+            if len(f) < 10 or f[2] != "A" or not f[9]:
+                return False
+            same = f[1] == self._gga_time
+            self.on_fix(
+                _epoch(f[9], f[1]),
+                _coord(f[3], f[4]),
+                _coord(f[5], f[6]),
+                self._gga_alt if same else NAN,
+                _float(f[7]) * KNOTS_TO_MS,
+                _float(f[8]),
+                self._gga_sats if same else 0,
+            )
+            return True
+        except (ValueError, IndexError):
+            return False
+
+
+def parse_cgpsinfo(line: str) -> tuple | None:
+    """
+    Parse a ``+CGPSINFO:`` response into a fix tuple, or None without a fix.
+
+    Format: lat,N/S,lon,E/W,ddmmyy,hhmmss.s,alt,speed_kn,course
+    """
+    if not line.startswith("+CGPSINFO:"):
+        return None
+    f = line[10:].strip().split(",")
+    if len(f) < 8 or not f[0] or not f[4]:
+        return None
+    try:
+        return (
+            _epoch(f[4], f[5]),
+            _coord(f[0], f[1]),
+            _coord(f[2], f[3]),
+            _float(f[6]),
+            _float(f[7]) * KNOTS_TO_MS,
+            _float(f[8]) if len(f) > 8 else NAN,
+            0,
+        )
+    except (ValueError, IndexError):
+        return None
+
+
+# ----- storage -----
+
+
+class FixRing:
+    """
+    Fixed-capacity ring of fixes stored column-wise in ``array`` buffers.
+
+    Appending overwrites the oldest fix once full; memory never grows.
+    """
+
+    def __init__(self, capacity: int = 36000):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.t = array("d", bytes(8 * capacity))
+        self.lat = array("d", bytes(8 * capacity))
+        self.lon = array("d", bytes(8 * capacity))
+        self.alt = array("f", bytes(4 * capacity))
+        self.speed = array("f", bytes(4 * capacity))
+        self.course = array("f", bytes(4 * capacity))
+        self.sats = array("B", bytes(capacity))
+        self._next = 0
+        self.count = 0
+
+    def append(self, t, lat, lon, alt, speed, course, sats):
+        i = self._next
+        self.t[i] = t
+        self.lat[i] = lat
+        self.lon[i] = lon
+        self.alt[i] = alt
+        self.speed[i] = speed
+        self.course[i] = course
+        self.sats[i] = min(int(sats), 255)
+        self._next = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _index(self, k: int) -> int:
+        """Physical slot of the k-th oldest fix."""
+        return (self._next - self.count + k) % self.capacity
+
+    def fix(self, k: int) -> tuple:
+        i = self._index(k)
+        return (self.t[i], self.lat[i], self.lon[i], self.alt[i],
+                self.speed[i], self.course[i], self.sats[i])
+
+    def latest(self) -> tuple | None:
+        return self.fix(self.count - 1) if self.count else None
+
+    def __iter__(self) -> Iterator[tuple]:
+        for k in range(self.count):
+            yield self.fix(k)
+
+
+class TrackWriter:
+    """Append fixes to a binary track file, flushing at most once a second."""
+
+    def __init__(self, path: str | os.PathLike, flush_interval: float = 1.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        head = len(TRACK_MAGIC)
+        size = self.path.stat().st_size if self.path.exists() else 0
+        if size < head:
+            # New file, or a crash before the header was complete
+            self._f = open(self.path, "wb")
+            self._f.write(TRACK_MAGIC)
+        else:
+            partial = (size - head) % TRACK_RECORD.size
+            if partial:
+                # A crash mid-record; appending after it would misalign every
+                # later record
+                os.truncate(self.path, size - partial)
+            self._f = open(self.path, "ab")
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        self.count = 0
+
+    def write(self, t, lat, lon, alt, speed, course, sats):
+        self._f.write(TRACK_RECORD.pack(t, lat, lon, alt, speed, course, min(int(sats), 255)))
+        self.count += 1
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self._f.flush()
+            self._last_flush = now
+
+    def close(self):
+        self._f.close()
+
+
+def read_track(
+    path: str | os.PathLike,
+    last: int | None = None,
+    since: float | None = None,
+    until: float | None = None,
+) -> Iterator[tuple]:
+    """
+    Read fixes from a binary track file.
+
+    Records are fixed-size and appended in time order, so ``since`` is found
+    by binary search and only the requested range is read.
+
+    Args:
+        path: Track file written by ``TrackWriter``.
+        last: Only the last N records (seeks instead of reading the whole file).
+        since: Only fixes at or after this epoch time.
+        until: Only fixes at or before this epoch time.
+    """
+    size = TRACK_RECORD.size
+    head = len(TRACK_MAGIC)
+    with open(path, "rb") as f:
+        if f.read(head) != TRACK_MAGIC:
+            raise ValueError(f"{path} is not a SIM7600 track file")
+        n = (f.seek(0, os.SEEK_END) - head) // size
+        start = 0 if last is None else max(0, n - last)
+        if since is not None:
+            lo, hi = start, n
+            while lo < hi:
+                mid = (lo + hi) // 2
+                f.seek(head + mid * size)
+                if TRACK_RECORD.unpack(f.read(size))[0] < since:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            start = lo
+        f.seek(head + start * size)
+        chunk = 4096
+        # n excludes a trailing partial record left by a crash
+        for i in range(start, n, chunk):
+            data = f.read(min(chunk, n - i) * size)
+            for rec in TRACK_RECORD.iter_unpack(data[: len(data) - len(data) % size]):
+                if until is not None and rec[0] > until:
+                    return
+                yield rec
+
+
+def fix_to_dict(fix: tuple) -> dict:
+    """JSON-friendly view of a fix tuple (NaN fields become None)."""
+    keys = ("time", "lat", "lon", "alt", "speed", "course", "sats")
+    return {
+        k: (None if isinstance(v, float) and math.isnan(v) else v)
+        for k, v in zip(keys, fix)
+    }
+
+
+# ----- tracker -----
+
+
+class GpsTracker:
+    """
+    Collect fixes into a ``FixRing`` and optionally a ``TrackWriter``.
+
+    Args:
+        ring: In-memory ring buffer for recent fixes.
+        writer: Optional binary track writer.
+        on_fix: Optional extra callback per fix (e.g. console output).
+    """
+
+    def __init__(
+        self,
+        ring: FixRing,
+        writer: TrackWriter | None = None,
+        on_fix: Callable[..., None] | None = None,
+    ):
+        self.ring = ring
+        self.writer = writer
+        self.on_fix = on_fix
+        self.parser = NmeaParser(self.add_fix)
+
+    def add_fix(self, t, lat, lon, alt, speed, course, sats):
+        self.ring.append(t, lat, lon, alt, speed, course, sats)
+        if self.writer:
+            self.writer.write(t, lat, lon, alt, speed, course, sats)
+        if self.on_fix:
+            self.on_fix(t, lat, lon, alt, speed, course, sats)
+
+    def run_nmea(self, nmea_modem, stop: Callable[[], bool] = lambda: False):
+        """Stream sentences from an opened NMEA-port ``Modem``."""
+        while not stop():
+            line = nmea_modem.readline()
+            if line:
+                self.parser.feed(line)
+
+    def run_poll(self, modem, interval: float, stop: Callable[[], bool] = lambda: False):
+        """Poll ``AT+CGPSINFO`` on an opened AT-port ``Modem`` every ``interval`` s."""
+        next_at = time.monotonic()
+        while not stop():
+            fix = parse_cgpsinfo(modem.gps_info() or "")
+            if fix:
+                self.add_fix(*fix)
+            next_at += interval
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_at = time.monotonic()
@@ -0,0 +1,370 @@
+"""
+Modem health sampling: signal quality, network registration and SIM state.
+
+Every ``interval`` seconds a ``HealthSampler`` runs one round of probes
+(``AT+CSQ``, ``AT+CREG?``, ``AT+CEREG?``, ``AT+CPIN?``). Each probe is a
+separate short command, and a probe only runs while the port is otherwise
+idle, so sampling never holds the port during a send:
+
+- with one port, the receive loop calls ``step()`` while it already owns the
+  port, between reads;
+- with a separate URC port, ``start()`` runs a thread that takes the modem
+  lock without blocking and skips its turn if a send has it.
+
+Samples go into an array-backed ``HealthRing`` (like ``gps.FixRing``), so a
+long-running sampler uses constant memory.
+"""
+
+from __future__ import annotations
+import logging
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Callable, Iterator
+
+PROBES = (
+    ("AT+CSQ", "+CSQ:"),
+    ("AT+CREG?", "+CREG:"),
+    ("AT+CEREG?", "+CEREG:"),
+    ("AT+CPIN?", "+CPIN:"),
+)
+
+# <stat> of +CREG / +CEREG
+REG_STATES = ("not registered", "home", "searching", "denied", "unknown", "roaming")
+SIM_STATES = (
+    "READY", "SIM PIN", "SIM PUK", "PH-SIM PIN", "SIM PIN2", "SIM PUK2",
+    "NOT INSERTED", "ERROR",
+)
+UNKNOWN = -1
+
+# Below this a modem is treated as unusable for sending
+MIN_USABLE_DBM = -105
+# Rounds without any answer before the modem counts as not responding
+MAX_SILENT_ROUNDS = 3
+
+
+# ----- parsing -----
+
+
+def parse_csq(line: str) -> tuple[int, int]:
+    """
+    ``+CSQ: <rssi>,<ber>`` -> (rssi, ber). rssi is 0..31, or 100..191 on
+    TD-SCDMA; 99 and anything else out of range map to -1.
+    """
+    try:
+        rssi, ber = (int(v) for v in line.split(":", 1)[1].split(",")[:2])
+    except (ValueError, IndexError):
+        return UNKNOWN, UNKNOWN
+    if not (0 <= rssi <= 31 or 100 <= rssi <= 191):
+        rssi = UNKNOWN
+    if not 0 <= ber <= 7:
+        ber = UNKNOWN
+    return rssi, ber
+
+
+def csq_to_dbm(rssi: int) -> int | None:
+    """CSQ 0..31 -> -113..-51 dBm (27.007, 8.5); TD-SCDMA 100..191 -> -116..-25 dBm."""
+    if rssi < 0:
+        return None
+    return -216 + rssi if rssi >= 100 else -113 + 2 * rssi
+
+
+def parse_reg(line: str) -> int:
+    """``+CREG: <n>,<stat>[,...]`` -> stat index into ``REG_STATES``."""
+    fields = line.split(":", 1)[1].split(",") if ":" in line else []
+    try:
+        stat = int(fields[1])
+    except (ValueError, IndexError):
+        return UNKNOWN
+    return stat if 0 <= stat < len(REG_STATES) else UNKNOWN
+
+
+def parse_cpin(lines: list[str]) -> int:
+    """State from an ``AT+CPIN?`` response (a missing SIM answers with an error)."""
+    for line in lines:
+        if line.startswith("+CPIN:"):
+            state = line[6:].strip().upper()
+            return SIM_STATES.index(state) if state in SIM_STATES else UNKNOWN
+        if "ERROR" in line:
+            return SIM_STATES.index("NOT INSERTED" if "NOT INSERTED" in line.upper() else "ERROR")
+    return UNKNOWN
+
+
+def _state(names: tuple[str, ...], i: int) -> str | None:
+    return names[i] if i >= 0 else None
+
+
+# ----- storage -----
+
+
+class HealthRing:
+    """
+    Fixed-capacity ring of health samples stored column-wise.
+
+    A sample is ``(time, rssi, ber, creg, cereg, sim, responding)``; unknown
+    values are -1. Appending overwrites the oldest sample once full.
+    """
+
+    def __init__(self, capacity: int = 2880):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.t = array("d", bytes(8 * capacity))
+        self.rssi = array("h", bytes(2 * capacity))  # up to 191 on TD-SCDMA
+        self.ber = array("b", bytes(capacity))
+        self.creg = array("b", bytes(capacity))
+        self.cereg = array("b", bytes(capacity))
+        self.sim = array("b", bytes(capacity))
+        self.ok = array("B", bytes(capacity))
+        self._next = 0
+        self.count = 0
+
+    def append(self, t, rssi, ber, creg, cereg, sim, ok):
+        i = self._next
+        self.t[i] = t
+        self.rssi[i] = rssi
+        self.ber[i] = ber
+        self.creg[i] = creg
+        self.cereg[i] = cereg
+        self.sim[i] = sim
+        self.ok[i] = 1 if ok else 0
+        self._next = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    def sample(self, k: int) -> tuple:
+        """The k-th oldest sample."""
+        i = (self._next - self.count + k) % self.capacity
+        return (self.t[i], self.rssi[i], self.ber[i], self.creg[i],
+                self.cereg[i], self.sim[i], bool(self.ok[i]))
+
+    def latest(self) -> tuple | None:
+        return self.sample(self.count - 1) if self.count else None
+
+    def last(self, n: int) -> Iterator[tuple]:
+        """The newest ``n`` samples, oldest first."""
+        n = min(n, self.count)
+        for k in range(self.count - n, self.count):
+            yield self.sample(k)
+
+    def __iter__(self) -> Iterator[tuple]:
+        return self.last(self.count)
+
+
+def sample_to_dict(sample: tuple) -> dict:
+    """JSON-friendly view of a sample tuple."""
+    t, rssi, ber, creg, cereg, sim, ok = sample
+    return {
+        "time": t,
+        "at": datetime.fromtimestamp(t).isoformat(timespec="seconds"),
+        "rssi": None if rssi < 0 else rssi,
+        "dbm": csq_to_dbm(rssi),
+        "ber": None if ber < 0 else ber,
+        "creg": _state(REG_STATES, creg),
+        "cereg": _state(REG_STATES, cereg),
+        "registered": creg in (1, 5) or cereg in (1, 5),
+        "sim": _state(SIM_STATES, sim),
+        "responding": ok,
+    }
+
+
+# ----- sampler -----
+
+
+class HealthSampler:
+    """
+    Periodic, interleaved health probes for one opened ``Modem``.
+
+    Args:
+        modem: The opened modem.
+        lock: Lock guarding the command port (used by the ``start()`` thread).
+        interval: Seconds between sampling rounds.
+        capacity: Samples kept in the ring.
+        on_urc: Called with unsolicited lines that arrived during a probe, so
+            an SMS that lands mid-probe is not lost.
+        command_timeout: Seconds to wait for each probe's answer.
+
+    Example:
+        >>> sampler = HealthSampler(modem, interval=30)
+        >>> while True:             # in a loop that owns the port
+        ...     sampler.step()      # at most one short probe
+        ...     line = modem.readline()
+        >>> sampler.latest()        # {'dbm': -79, 'creg': 'home', ...}
+    """
+
+    def __init__(
+        self,
+        modem,
+        lock: threading.Lock | None = None,
+        interval: float = 30.0,
+        capacity: int = 2880,
+        on_urc: Callable[[str], None] | None = None,
+        command_timeout: float = 1.0,
+    ):
+        self.modem = modem
+        self.lock = lock or threading.Lock()
+        self.interval = interval
+        self.ring = HealthRing(capacity)
+        self.on_urc = on_urc
+        self.command_timeout = command_timeout
+        self.logger = logging.getLogger("sim7600")
+
+        self.silent_rounds = 0
+        self.skipped = 0  # probes deferred because the port was busy
+        self._ring_lock = threading.Lock()
+        self._next_round = time.monotonic()
+        self._round: dict | None = None
+        self._probe = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ----- probing -----
+
+    def due(self) -> bool:
+        return self._round is not None or time.monotonic() >= self._next_round
+
+    def step(self) -> bool:
+        """
+        Run the next probe if one is due. The caller must own the port.
+
+        Returns True if a probe ran.
+        """
+        if not self.due():
+            return False
+        if self._round is None:
+            self._round = {"t": time.time(), "answered": False, "lines": {}}
+            self._probe = 0
+        cmd, prefix = PROBES[self._probe]
+        try:
+            # An SMS arriving mid-probe goes to on_urc, not into the answer
+            lines = self.modem.command(
+                cmd, timeout=self.command_timeout, on_urc=self.on_urc
+            )
+        except Exception as e:
+            self.logger.debug(f"Health probe {cmd} failed: {e}")
+            lines = []
+        self._collect(prefix, lines)
+        self._probe += 1
+        if self._probe == len(PROBES):
+            self._finish_round()
+        return True
+
+    def _collect(self, prefix: str, lines: list[str]):
+        kept = []
+        for line in lines:
+            if line.startswith(prefix) or line == "OK" or "ERROR" in line:
+                kept.append(line)
+            elif self.on_urc:
+                self.on_urc(line)
+        if kept:
+            self._round["answered"] = True
+        self._round["lines"][prefix] = kept
+
+    def _finish_round(self):
+        r, self._round = self._round, None
+        self._next_round = time.monotonic() + self.interval
+        lines = r["lines"]
+
+        def first(prefix):
+            return next((l for l in lines.get(prefix, ()) if l.startswith(prefix)), "")
+
+        rssi, ber = parse_csq(first("+CSQ:"))
+        creg = parse_reg(first("+CREG:"))
+        cereg = parse_reg(first("+CEREG:"))
+        sim = parse_cpin(lines.get("+CPIN:", []))
+        self.silent_rounds = 0 if r["answered"] else self.silent_rounds + 1
+        with self._ring_lock:
+            self.ring.append(r["t"], rssi, ber, creg, cereg, sim, r["answered"])
+
+    def sample_now(self) -> dict:
+        """Run a whole round immediately (the caller must own the port)."""
+        self._next_round = time.monotonic()
+        self.step()
+        while self._round is not None:
+            self.step()
+        return self.latest()
+
+    # ----- background thread -----
+
+    def start(self):
+        """Probe from a thread, taking ``lock`` only when nobody holds it."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="health", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 3.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.due():
+                self._stop.wait(min(1.0, self._next_round - time.monotonic()))
+                continue
+            if self.lock.acquire(blocking=False):
+                try:
+                    self.step()
+                finally:
+                    self.lock.release()
+            else:
+                # A send holds the port; try again shortly
+                self.skipped += 1
+                self._stop.wait(0.5)
+
+    # ----- queries -----
+
+    @property
+    def responding(self) -> bool:
+        return self.silent_rounds < MAX_SILENT_ROUNDS
+
+    def latest(self) -> dict | None:
+        with self._ring_lock:
+            sample = self.ring.latest()
+        return sample_to_dict(sample) if sample else None
+
+    def samples(self, last: int = 120) -> list[dict]:
+        """The newest ``last`` samples as dicts, oldest first."""
+        with self._ring_lock:
+            samples = list(self.ring.last(last))
+        return [sample_to_dict(s) for s in samples]
+
+    def usable(self, min_dbm: int = MIN_USABLE_DBM) -> bool:
+        """True if the last sample shows a ready SIM, registration and signal."""
+        latest = self.latest()
+        if latest is None:
+            return True  # nothing known yet
+        return (
+            latest["responding"]
+            and latest["sim"] in (None, "READY")
+            and latest["registered"]
+            and (latest["dbm"] is None or latest["dbm"] >= min_dbm)
+        )
+
+    def summary(self, last: int = 120) -> dict:
+        """Latest sample, signal range over the last ``last`` samples, and state."""
+        samples = self.samples(last)
+        return {
+            "latest": samples[-1] if samples else None,
+            "responding": self.responding,
+            "usable": self.usable(),
+            "interval": self.interval,
+            "samples": samples,
+            "signal": signal_range(samples),
+            "skipped_probes": self.skipped,
+        }
+
+
+def signal_range(samples: list[dict]) -> dict:
+    """Min, max and average dBm of sample dicts (None where unknown)."""
+    dbms = [s["dbm"] for s in samples if s["dbm"] is not None]
+    return {
+        "min_dbm": min(dbms) if dbms else None,
+        "max_dbm": max(dbms) if dbms else None,
+        "avg_dbm": round(sum(dbms) / len(dbms), 1) if dbms else None,
+    }
@@ -0,0 +1,336 @@
+"""
+Query past SMS traffic from the message archive or a JSON Lines log.
+
+``HistoryFilter`` describes the query (contact, direction, time range, text).
+Before any line is decoded it is checked against raw byte "needles" taken
+from the filter, so most non-matching lines cost one substring search:
+
+- With a segmented archive (``logs/sms/``), ``query_archive`` uses its index
+  to open only the segments that can match and seek past older records.
+- With a plain JSONL file (e.g. the old ``logs/sms.jsonl``), ``scan_jsonl``
+  memory-maps it, binary-searches the start time and jumps between
+  occurrences of the most selective needle with ``mmap.find``.
+
+``follow_archive`` / ``follow_jsonl`` keep yielding messages as they are
+appended, like ``tail -f``.
+"""
+
+from __future__ import annotations
+import gzip
+import json
+import mmap
+import os
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+from .archive import INDEX_NAME, MessageArchive, message_contact
+from .parser import message_time
+
+DIRECTIONS = ("sent", "received")
+# Records in a plain log are appended in time order, give or take clock changes
+ORDER_SLACK = 3600.0
+_BISECT_MIN = 64 * 1024
+_RELATIVE_RE = re.compile(r"^(\d+(?:\.\d+)?)\s*([smhdw])$")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_duration(value: str) -> float | None:
+    """"30m", "2h", "7d", "1w" -> seconds, or None if ``value`` isn't one."""
+    m = _RELATIVE_RE.match(value.strip().lower())
+    return float(m.group(1)) * _UNITS[m.group(2)] if m else None
+
+
+def parse_when(value: str, now: float | None = None) -> float:
+    """
+    Parse a time for ``--since`` / ``--until`` into an epoch time.
+
+    Accepts ISO dates and times ("2025-10-18", "2025-10-18 14:30") or an age
+    relative to now ("30m", "2h", "7d", "1w").
+
+    Raises:
+        ValueError: If the value is neither.
+    """
+    value = value.strip()
+    age = parse_duration(value)
+    if age is not None:
+        return (time.time() if now is None else now) - age
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid time {value!r}: use an ISO date/time or an age like 2h or 7d")
+
+
+class HistoryFilter:
+    """
+    Which messages a history query returns.
+
+    Args:
+        contact: Only messages to/from this number.
+        direction: "sent" or "received".
+        since: Epoch time; only messages at or after it.
+        until: Epoch time; only messages at or before it.
+        text: Substring the message text must contain.
+        ignore_case: Match ``text`` case-insensitively.
+    """
+
+    def __init__(
+        self,
+        contact: str | None = None,
+        direction: str | None = None,
+        since: float | None = None,
+        until: float | None = None,
+        text: str | None = None,
+        ignore_case: bool = False,
+    ):
+        if direction is not None and direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {DIRECTIONS}")
+        self.contact = contact or None
+        self.direction = direction
+        self.since = since
+        self.until = until
+        self.text = text or None
+        self.ignore_case = ignore_case
+        self._folded = self.text.casefold() if self.text and ignore_case else self.text
+
+    def matches(self, message: dict) -> bool:
+        if self.direction and message.get("direction", "received") != self.direction:
+            return False
+        if self.contact and message_contact(message) != self.contact:
+            return False
+        if self.since is not None or self.until is not None:
+            ts = message_time(message)
+            if ts is not None:
+                if self.since is not None and ts < self.since:
+                    return False
+                if self.until is not None and ts > self.until:
+                    return False
+        if self.text:
+            body = message.get("text") or ""
+            if self.ignore_case:
+                body = body.casefold()
+            if self._folded not in body:
+                return False
+        return True
+
+    def needles(self) -> list[bytes]:
+        """
+        Byte strings any matching raw JSON line must contain, most selective
+        first. Only values that JSON writes verbatim are used (no quotes,
+        backslashes, control characters or non-ASCII that may be escaped).
+        """
+        out = []
+        if self.contact and _verbatim(self.contact):
+            out.append(b'"' + self.contact.encode() + b'"')
+        if self.text and not self.ignore_case and _verbatim(self.text):
+            out.append(self.text.encode())
+        # Received records may have no "direction" key at all (older logs),
+        # so only "sent" can be required
+        if self.direction == "sent":
+            out.append(b'"sent"')
+        return out
+
+
+def _verbatim(value: str) -> bool:
+    return value.isascii() and value.isprintable() and '"' not in value and "\\" not in value
+
+
+def _decode(raw: bytes) -> dict | None:
+    try:
+        msg = json.loads(raw)
+    except ValueError:
+        return None
+    return msg if isinstance(msg, dict) else None
+
+
+# ----- segmented archive -----
+
+
+def query_archive(root: str | os.PathLike, flt: HistoryFilter) -> Iterator[dict]:
+    """Matching messages from a ``MessageArchive`` directory, oldest first."""
+    archive = MessageArchive(root, readonly=True)
+    for msg in archive.iter_messages(flt.since, flt.until, flt.contact, needles=flt.needles()):
+        if flt.matches(msg):
+            yield msg
+
+
+def has_archive(root: str | os.PathLike) -> bool:
+    root = Path(root)
+    return (root / INDEX_NAME).exists() or any(root.glob("sms-*.jsonl*"))
+
+
+def follow_archive(
+    root: str | os.PathLike, flt: HistoryFilter, poll: float = 1.0
+) -> Iterator[dict]:
+    """
+    Yield messages appended to the archive from now on (blocks; Ctrl+C stops).
+
+    When the writer rolls over, the finished segment is compressed before the
+    next one is created, so the rest of it is read from the ``.gz`` file.
+    """
+    root = Path(root)
+    needles = flt.needles()
+
+    def segment_names():
+        return sorted(p.name.removesuffix(".gz") for p in root.glob("sms-*.jsonl*"))
+
+    names = segment_names()
+    name = names[-1] if names else None
+    offset = 0
+    if name:
+        # Start at the end; a newest segment that is already compressed is done
+        offset = (root / name).stat().st_size if (root / name).exists() else -1
+    pending = b""
+    while True:
+        names = segment_names()
+        if name is None:
+            if names:
+                name, offset = names[0], 0
+            else:
+                time.sleep(poll)
+                continue
+        newer = [n for n in names if n > name]
+        path = root / name
+        if offset < 0:
+            data = b""
+        elif path.exists():
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        elif (root / (name + ".gz")).exists():
+            with gzip.open(root / (name + ".gz"), "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        else:
+            data = b""
+        offset += len(data)
+        *lines, pending = (pending + data).split(b"\n")
+        for raw in lines:
+            if all(n in raw for n in needles):
+                msg = _decode(raw)
+                if msg is not None and flt.matches(msg):
+                    yield msg
+        if newer and not data:
+            # The writer has moved on and this segment is fully read
+            name, offset, pending = newer[0], 0, b""
+        elif not data:
+            time.sleep(poll)
+
+
+# ----- plain JSON Lines file -----
+
+
+def _line_time(mm: mmap.mmap, start: int, size: int) -> tuple[int, float | None]:
+    """Time of the first complete line at or after ``start`` (and its offset)."""
+    if start:
+        nl = mm.find(b"\n", start)
+        if nl < 0:
+            return size, None
+        start = nl + 1
+    while start < size:
+        end = mm.find(b"\n", start)
+        if end < 0:
+            return size, None
+        msg = _decode(mm[start:end])
+        if msg is not None:
+            ts = message_time(msg)
+            if ts is not None:
+                return start, ts
+        start = end + 1
+    return size, None
+
+
+def _seek_since(mm: mmap.mmap, since: float, size: int) -> int:
+    """Line offset at or before the first record newer than ``since``."""
+    target = since - ORDER_SLACK
+    lo, hi = 0, size
+    while hi - lo > _BISECT_MIN:
+        mid = (lo + hi) // 2
+        offset, ts = _line_time(mm, mid, size)
+        if ts is None or ts >= target:
+            hi = mid
+        else:
+            lo = offset
+    return lo
+
+
+def _scan_lines(mm: mmap.mmap, start: int, end: int, needles: list[bytes]) -> Iterator[bytes]:
+    """Complete lines in [start, end) containing every needle."""
+    jump, rest = (needles[0], needles[1:]) if needles else (None, [])
+    pos = start
+    while pos < end:
+        if jump is not None:
+            hit = mm.find(jump, pos, end)
+            if hit < 0:
+                return
+            nl = mm.rfind(b"\n", pos, hit)
+            line_start = pos if nl < 0 else nl + 1
+        else:
+            line_start = pos
+        line_end = mm.find(b"\n", line_start, end)
+        if line_end < 0:
+            return  # partially written tail
+        pos = line_end + 1
+        line = mm[line_start:line_end]
+        if all(n in line for n in rest):
+            yield line
+
+
+def scan_jsonl(path: str | os.PathLike, flt: HistoryFilter) -> Iterator[dict]:
+    """Matching messages from a JSON Lines log, oldest first."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = _seek_since(mm, flt.since, size) if flt.since is not None else 0
+            for raw in _scan_lines(mm, start, size, flt.needles()):
+                msg = _decode(raw)
+                if msg is not None and flt.matches(msg):
+                    yield msg
+
+
+def follow_jsonl(path: str | os.PathLike, flt: HistoryFilter, poll: float = 1.0) -> Iterator[dict]:
+    """Yield messages appended to a JSON Lines log from now on."""
+    needles = flt.needles()
+    path = Path(path)
+    offset = path.stat().st_size if path.exists() else 0
+    pending = b""
+    while True:
+        size = path.stat().st_size if path.exists() else 0
+        if size < offset:
+            offset, pending = 0, b""  # truncated or replaced
+        if size == offset:
+            time.sleep(poll)
+            continue
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read(size - offset)
+        offset += len(data)
+        *lines, pending = (pending + data).split(b"\n")
+        for raw in lines:
+            if all(n in raw for n in needles):
+                msg = _decode(raw)
+                if msg is not None and flt.matches(msg):
+                    yield msg
+
+
+# ----- output -----
+
+
+TABLE_HEADER = f"{'Time':<19}  {'Dir':<3}  {'Contact':<16}  Text"
+
+
+def format_row(message: dict, width: int = 120) -> str:
+    """One table row: local time, IN/OUT, contact and the text on one line."""
+    ts = message_time(message)
+    when = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts else "?"
+    direction = "OUT" if message.get("direction") == "sent" else "IN"
+    contact = message_contact(message) or "?"
+    text = " ".join((message.get("text") or "").split())
+    if message.get("incomplete"):
+        text = "[incomplete] " + text
+    row = f"{when:<19}  {direction:<3}  {contact:<16}  {text}"
+    return row if len(row) <= width else row[: max(width - 3, 40)] + "..."
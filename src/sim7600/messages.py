@@ -0,0 +1,176 @@
+"""
+Compact in-memory message history.
+
+``Message`` stores one SMS in fixed slots instead of a per-message dict, and
+``MessageRing`` keeps the newest ``capacity`` of them in a preallocated
+circular buffer. Appending overwrites the oldest slot in place, so there is
+no list copy per message and the history can hold hundreds of thousands of
+messages. Per-contact counts are updated on append and eviction, so listing
+contacts never scans the buffer.
+"""
+
+from __future__ import annotations
+from collections import Counter
+from typing import Iterator
+
+# Keys stored in slots; anything else in a message dict goes to ``extra``
+_FIELDS = ("direction", "text", "timestamp", "raw_header", "received_at", "ascii_only")
+
+
+class Message:
+    """
+    One SMS, sent or received.
+
+    ``number`` is the other party: the sender of a received message or the
+    recipient of a sent one.
+    """
+
+    __slots__ = (
+        "direction", "number", "text", "timestamp", "raw_header",
+        "received_at", "ascii_only", "extra",
+    )
+
+    def __init__(
+        self,
+        direction: str,
+        number: str | None,
+        text: str = "",
+        timestamp: str | None = None,
+        raw_header: str | None = None,
+        received_at: str | None = None,
+        ascii_only: bool | None = None,
+        extra: dict | None = None,
+    ):
+        self.direction = direction
+        self.number = number
+        self.text = text
+        self.timestamp = timestamp
+        self.raw_header = raw_header
+        self.received_at = received_at
+        self.ascii_only = ascii_only
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Message":
+        direction = d.get("direction", "received")
+        if direction == "sent":
+            number = d.get("recipient")
+        else:
+            number = d.get("sender") or d.get("recipient")
+        extra = {
+            k: v
+            for k, v in d.items()
+            if k not in _FIELDS and k not in ("sender", "recipient")
+        }
+        return cls(
+            direction,
+            number,
+            d.get("text", ""),
+            d.get("timestamp"),
+            d.get("raw_header"),
+            d.get("received_at"),
+            d.get("ascii_only"),
+            extra or None,
+        )
+
+    def to_dict(self) -> dict:
+        """The same dict shape the archive and the dashboard API use."""
+        d = {"direction": self.direction}
+        d["recipient" if self.direction == "sent" else "sender"] = self.number
+        for key in _FIELDS[1:]:
+            value = getattr(self, key)
+            if value is not None:
+                d[key] = value
+        if self.extra:
+            d.update(self.extra)
+        return d
+
+    def __repr__(self) -> str:
+        return f"Message({self.direction!r}, {self.number!r}, {self.text[:20]!r})"
+
+
+class MessageRing:
+    """
+    Fixed-capacity history of the newest messages.
+
+    Append and eviction are O(1); ``recent(n)`` is O(n) and ``contacts()``
+    is O(number of contacts). Not thread-safe: callers hold their own lock.
+
+    Args:
+        capacity: Maximum number of messages kept.
+
+    Example:
+        >>> ring = MessageRing(100000)
+        >>> ring.append({"direction": "received", "sender": "+1234", "text": "hi"})
+        >>> ring.recent(50)       # newest first, as dicts
+        >>> ring.contacts()       # ['+1234']
+    """
+
+    def __init__(self, capacity: int = 10000):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._slots: list[Message | None] = [None] * capacity
+        self._next = 0  # slot the next message goes into
+        self._count = 0
+        self._contacts: Counter = Counter()
+        self._sorted_contacts: list[str] | None = None
+
+    def append(self, message: Message | dict):
+        if isinstance(message, dict):
+            message = Message.from_dict(message)
+        old = self._slots[self._next]
+        if old is not None:
+            self._forget_contact(old.number)
+        self._slots[self._next] = message
+        self._next = (self._next + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+        if message.number:
+            if message.number not in self._contacts:
+                self._sorted_contacts = None
+            self._contacts[message.number] += 1
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def _forget_contact(self, number: str | None):
+        if not number:
+            return
+        self._contacts[number] -= 1
+        if self._contacts[number] <= 0:
+            del self._contacts[number]
+            self._sorted_contacts = None
+
+    def clear(self):
+        self._slots = [None] * self.capacity
+        self._next = 0
+        self._count = 0
+        self._contacts.clear()
+        self._sorted_contacts = None
+
+    def recent(self, n: int = 50) -> list[dict]:
+        """The newest ``n`` messages as dicts, newest first."""
+        n = min(n, self._count)
+        slots, cap = self._slots, self.capacity
+        return [slots[(self._next - 1 - i) % cap].to_dict() for i in range(n)]
+
+    def contacts(self) -> list[str]:
+        """Sorted numbers of everyone in the history."""
+        if self._sorted_contacts is None:
+            self._sorted_contacts = sorted(self._contacts)
+        return list(self._sorted_contacts)
+
+    def contact_counts(self) -> Counter:
+        """Messages per number currently in the history."""
+        return Counter(self._contacts)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Message]:
+        """Oldest first."""
+        start = (self._next - self._count) % self.capacity
+        for i in range(self._count):
+            yield self._slots[(start + i) % self.capacity]
@@ -1,19 +1,33 @@
 from __future__ import annotations
+import json
+import os
 import time
-import serial
-from serial.tools import list_ports
-from typing import Iterable
-import unicodedata
+from typing import Callable, Iterable
 
+from . import startup
+from .codec import build_submit_pdus, plan_message
 
-def find_sim7600_port() -> str | None:
+# pyserial is imported where it is used: it and its port enumeration take
+# longer to import than the rest of a scripted ``sms send``.
+
+# Where the last detected modem's ports are remembered ('' disables)
+PORT_CACHE = os.path.join("~", ".cache", "sim7600", "ports.json")
+PORT_CACHE_VERSION = 1
+
+
+def find_sim7600_port(refresh: bool = False) -> str | None:
     """
     Automatically detect the SIM7600 modem AT PORT by scanning available COM ports.
     The SIM7600 creates multiple virtual ports - we specifically need the AT PORT.
     Returns the port name (e.g., 'COM10') if found, otherwise None.
+
+    The result is cached (see ``SIM7600_PORT_CACHE``) and reused while the
+    cached ports still exist; ``refresh=True`` forces a full scan.
     """
-    ports = list_ports.comports()
+    return _discover(refresh)[0]
+
 
+def _match_at_port(ports) -> str | None:
     # First pass: Look specifically for "AT PORT" in the description
     # This is the correct port for AT commands and SMS
     for port in ports:
@@ -32,26 +46,317 @@ def find_sim7600_port() -> str | None:
     return None
 
 
+SIMCOM_VID = 0x1E0E
+# USB interface number -> role, for the default (PID 9001) composition. Used
+# on Linux, where every interface shows up with the same description.
+_INTERFACE_ROLES = {0: "diagnostics", 1: "nmea", 2: "at", 3: "modem", 4: "audio"}
+# Windows driver descriptions, e.g. "Simcom HS-USB NMEA 9001"
+_DESCRIPTION_ROLES = (
+    ("at port", "at"),
+    ("nmea", "nmea"),
+    ("modem", "modem"),
+    ("audio", "audio"),
+    ("diagnostic", "diagnostics"),
+)
+
+# AT+CATR values: which interface unsolicited result codes (+CMT, RING) go to
+URC_ROUTES = {"all": 0, "uart": 1, "modem": 2, "at": 3}
+
+# Unsolicited result codes that can arrive in the middle of a command response
+URC_PREFIXES = ("+CMT:", "+CMTI:", "+CDS:", "+CDSI:", "+CLIP:", "+CRING:", "RING", "NO CARRIER")
+# In PDU mode these are followed by a second line holding the PDU
+_URC_WITH_PDU = ("+CMT:", "+CDS:")
+
+
+def find_sim7600_ports(refresh: bool = False) -> dict[str, str]:
+    """
+    Map each SIM7600 USB interface to its port.
+
+    Args:
+        refresh: Ignore the port cache and scan.
+
+    Returns:
+        A dict with some of the keys "at", "modem", "nmea", "audio" and
+        "diagnostics", e.g. ``{"at": "COM10", "modem": "COM11", "nmea": "COM9"}``.
+        Both "at" and "modem" accept AT commands.
+    """
+    return dict(_discover(refresh)[1])
+
+
+def _match_roles(ports) -> dict[str, str]:
+    found: dict[str, str] = {}
+    for port in ports:
+        desc = (port.description or "").lower()
+        manufacturer = (port.manufacturer or "").lower()
+        simcom = port.vid == SIMCOM_VID or "simcom" in desc or "simcom" in manufacturer
+        if not (simcom or "hs-usb" in desc):
+            continue
+        role = next((r for key, r in _DESCRIPTION_ROLES if key in desc), None)
+        if role is None and port.vid == SIMCOM_VID and port.location:
+            # "1-1.2:1.3" -> interface 3
+            iface = port.location.rpartition(".")[2]
+            if iface.isdigit():
+                role = _INTERFACE_ROLES.get(int(iface))
+        if role:
+            found.setdefault(role, port.device)
+    return found
+
+
+# ----- port discovery cache -----
+
+
+def _scan() -> tuple[str | None, dict[str, str], str | None]:
+    """Enumerate the ports once: (AT port, role map, USB key of the modem)."""
+    from serial.tools import list_ports
+
+    ports = list_ports.comports()
+    at_port = _match_at_port(ports)
+    roles = _match_roles(ports)
+    key = next(
+        (
+            f"{p.vid:04x}:{p.pid or 0:04x}:{p.serial_number or ''}"
+            for p in ports
+            if p.device == at_port and p.vid is not None
+        ),
+        None,
+    )
+    return at_port, roles, key
+
+
+def _port_cache_path() -> str | None:
+    path = os.getenv("SIM7600_PORT_CACHE", PORT_CACHE)
+    return os.path.expanduser(path) if path else None
+
+
+def _port_exists(device: str) -> bool:
+    """Cheap presence check, without enumerating USB devices."""
+    if os.name != "nt":
+        return os.path.exists(device)
+    import winreg
+
+    # Every present COM port is a value under this key
+    try:
+        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"HARDWARE\DEVICEMAP\SERIALCOMM") as key:
+            i = 0
+            while True:
+                if winreg.EnumValue(key, i)[1] == device:
+                    return True
+                i += 1
+    except OSError:
+        return False
+
+
+def _load_port_cache(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) and data.get("version") == PORT_CACHE_VERSION else {}
+
+
+def _save_port_cache(path: str, key: str, at_port: str, roles: dict[str, str]):
+    data = _load_port_cache(path) or {"version": PORT_CACHE_VERSION, "devices": {}}
+    data["devices"][key] = {"at": at_port, "ports": roles, "seen": time.time()}
+    data["last"] = key
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # the cache is only an optimisation
+
+
+def _discover(refresh: bool = False) -> tuple[str | None, dict[str, str]]:
+    """
+    Find the modem's ports, from the cache if the modem seen last (keyed by
+    USB VID:PID:serial) still has all of its ports, otherwise by scanning.
+    """
+    startup.mark("setup")
+    path = _port_cache_path()
+    if path and not refresh:
+        data = _load_port_cache(path)
+        entry = data.get("devices", {}).get(data.get("last"))
+        if entry and entry.get("at"):
+            ports = {entry["at"], *entry.get("ports", {}).values()}
+            if all(_port_exists(p) for p in ports):
+                startup.mark("port discovery (cache)")
+                return entry["at"], dict(entry.get("ports", {}))
+    at_port, roles, key = _scan()
+    if path and at_port and key:
+        _save_port_cache(path, key, at_port, roles)
+    startup.mark("port discovery (scan)")
+    return at_port, roles
+
+
+def forget_port_cache():
+    """Drop the cached ports, e.g. after an auto-detected port failed to open."""
+    path = _port_cache_path()
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def resolve_urc_port(
+    value: str | None, command_port: str, interface: str = "modem"
+) -> tuple[str | None, str]:
+    """
+    Work out the second channel for unsolicited result codes.
+
+    Args:
+        value: A port name, "auto" to use whichever AT-capable interface the
+            commands are not using, or ""/None for a single port.
+        command_port: The port commands are sent on.
+        interface: Which interface ``value`` is when given explicitly
+            ("modem" or "at"), so the modem can be told where to send URCs.
+
+    Returns:
+        ``(port, interface)``; port is None when no second channel is used.
+    """
+    if not value or value.lower() == "none":
+        return None, interface
+    if value.lower() != "auto":
+        return value, interface
+    ports = find_sim7600_ports()
+    for role in ("modem", "at"):
+        if ports.get(role) and ports[role] != command_port:
+            return ports[role], role
+    return None, interface
+
+
+def batch_error(results: list[dict], expected: int | None = None) -> str | None:
+    """
+    Describe the first failure in ``Modem.batch`` results, or None if all
+    ``expected`` commands (default: all results) succeeded.
+    """
+    total = len(results) if expected is None else expected
+    for i, r in enumerate(results, 1):
+        if r["ok"]:
+            continue
+        reply = r["final"] or f"no response within {r['seconds']:.1f} s"
+        detail = f"; response: {' | '.join(r['lines'])}" if r["lines"] else ""
+        return f"{r['command']} failed at step {i} of {total}: {reply}{detail}"
+    if len(results) < total:
+        return f"only {len(results)} of {total} commands ran"
+    return None
+
+
+class _UrcFilter:
+    """
+    Separates unsolicited lines from a command's response on a shared port.
+
+    Called with each line read; returns True (after handing the line to
+    ``on_urc``) if it was unsolicited. ``own`` is the command's own response
+    prefix, e.g. "+CMGS:", which is never taken for a URC.
+    """
+
+    def __init__(self, on_urc: Callable[[str], None] | None):
+        self.on_urc = on_urc
+        self._pdu_next = False  # the line after a PDU-mode +CMT header is its PDU
+
+    def __call__(self, line: str, own: str | None = None) -> bool:
+        if not self._pdu_next and not (
+            line.startswith(URC_PREFIXES) and not (own and line.startswith(own))
+        ):
+            return False
+        self._pdu_next = not self._pdu_next and line.startswith(_URC_WITH_PDU)
+        if self.on_urc:
+            self.on_urc(line)
+        return True
+
+
+def _own_prefix(cmd: str) -> str:
+    """Information-line prefix of a command, e.g. "+CLIP:" for "AT+CLIP?"."""
+    return cmd.strip()[2:].split("=", 1)[0].rstrip("?") + ":"
+
+
 class Modem:
+    """
+    One modem session.
+
+    Commands always go to ``port``. If ``urc_port`` is given, a second
+    AT-capable interface is opened and the modem is told (AT+CATR) to send
+    unsolicited result codes such as +CMT and RING there, so ``readline()``
+    keeps receiving while a long exchange like AT+CMGS holds the command port.
+
+    Ports may be pyserial URLs (e.g. ``socket://127.0.0.1:7001``), which lets
+    either channel be pointed at a simulated device.
+
+    Args:
+        port: Command port (e.g. "COM10").
+        baud: Baud rate for both channels.
+        timeout: Read timeout in seconds.
+        echo_raw: Print every line read.
+        urc_port: Optional second port for URCs.
+        urc_interface: Which interface ``urc_port`` is: "modem" or "at".
+        exclusive: Lock the ports so a second process (e.g. ``health`` next
+            to ``sms receive``) fails to open them instead of stealing lines.
+            Windows always opens COM ports exclusively.
+    """
+
     def __init__(
         self,
         port: str,
         baud: int = 115200,
         timeout: float = 1.0,
         echo_raw: bool = False,
+        urc_port: str | None = None,
+        urc_interface: str = "modem",
+        exclusive: bool = True,
     ):
+        if urc_port and urc_interface not in URC_ROUTES:
+            raise ValueError(f"Unknown URC interface: {urc_interface!r}")
         self.port = port
         self.baud = baud
         self.timeout = timeout
         self.echo_raw = echo_raw
+        self.urc_port = urc_port
+        self.urc_interface = urc_interface
+        self.exclusive = exclusive
         self.ser: serial.Serial | None = None
+        self.urc_ser: serial.Serial | None = None
+        # Concatenated SMS reference; random start so restarts don't reuse one
+        self._concat_ref = int.from_bytes(os.urandom(1), "big")
+
+    @property
+    def has_urc_channel(self) -> bool:
+        """True when URCs arrive on their own port, apart from commands."""
+        return self.urc_ser is not None
+
+    def _open_port(self, port: str) -> serial.Serial:
+        import serial
+
+        return serial.serial_for_url(
+            port, self.baud, timeout=self.timeout, exclusive=self.exclusive
+        )
 
     def open(self):
-        self.ser = serial.Serial(self.port, self.baud, timeout=self.timeout)
+        startup.mark("setup")
+        self.ser = self._open_port(self.port)
+        if self.urc_port:
+            try:
+                self.urc_ser = self._open_port(self.urc_port)
+            except Exception:
+                self.ser.close()
+                raise
         # A brief settle time after opening
         time.sleep(0.2)
+        startup.mark("open port")
 
     def close(self):
+        if self.urc_ser is not None:
+            try:
+                # Send URCs everywhere again so a later single-port session sees them
+                self.batch([f"AT+CATR={URC_ROUTES['all']}"], timeout=0.5)
+            except Exception:
+                pass
+            if self.urc_ser.is_open:
+                self.urc_ser.close()
+            self.urc_ser = None
         if self.ser and self.ser.is_open:
             self.ser.close()
 
@@ -61,10 +366,10 @@ class Modem:
         data = (cmd.strip() + "\r").encode("utf-8", errors="ignore")
         self.ser.write(data)
 
-    def readline(self) -> str:
-        if not self.ser or not self.ser.is_open:
+    def _read(self, ser) -> str:
+        if not ser or not ser.is_open:
             return ""
-        raw = self.ser.readline()
+        raw = ser.readline()
         try:
             s = raw.decode("utf-8", errors="ignore").rstrip("\r\n")
         except Exception:
@@ -73,59 +378,228 @@ class Modem:
             print(s)
         return s
 
+    def readline(self) -> str:
+        """Read the next unsolicited line (the URC channel, if there is one)."""
+        return self._read(self.urc_ser if self.urc_ser is not None else self.ser)
+
+    def read_response(self) -> str:
+        """Read the next line of a command response from the command port."""
+        return self._read(self.ser)
+
+    def _urc_route_cmd(self) -> str:
+        route = URC_ROUTES[self.urc_interface] if self.has_urc_channel else URC_ROUTES["all"]
+        return f"AT+CATR={route}"
+
     def init_sms_push(self):
         # Basic sanity & setup
-        for cmd in (
+        self._init(
             "AT",
             "AT+CMEE=2",
-            "AT+CMGF=1",
-            'AT+CSCS="GSM"',
+            self._urc_route_cmd(),
+            "AT+CMGF=0",  # PDU mode: whole message + concatenation header
             "AT+CNMI=2,2,0,0,0",
-        ):
-            self.write_cmd(cmd)
-            # Read a few lines to consume OK / errors
-            self._drain(0.6)
+        )
 
     def init_voice_listen(self):
         """
         Initialize modem to report incoming call indications with caller ID.
         Enables: verbose errors, caller ID presentation, and ring reporting.
         """
-        for cmd in (
+        self._init(
             "AT",
             "AT+CMEE=2",     # verbose errors
+            self._urc_route_cmd(),  # where RING/+CLIP are reported
             "AT+CLIP=1",     # enable caller ID reporting: +CLIP: "<num>",...
             "AT+CRC=1",      # extended ring indications (optional)
-        ):
-            self.write_cmd(cmd)
-            self._drain(0.5)
+        )
+
+    def init_listen(self):
+        """
+        Initialize modem for SMS push and incoming call reporting together,
+        so one read loop sees both +CMT and RING/+CLIP indications.
+        """
+        self._init(
+            "AT",
+            "AT+CMEE=2",
+            self._urc_route_cmd(),
+            "AT+CMGF=0",
+            "AT+CNMI=2,2,0,0,0",
+            "AT+CLIP=1",
+            "AT+CRC=1",
+        )
+
+    def _init(self, *commands: str):
+        """
+        Run an init sequence with ``batch``.
 
-    def _drain(self, dur: float = 0.5):
+        Raises:
+            RuntimeError: If a command fails or gets no answer; the message
+                says which one and what the modem replied.
+        """
+        # Whatever was queued before this session (old results, a partial
+        # line) would be taken for the first command's answer
+        self.ser.reset_input_buffer()
+        results = self.batch(commands)
+        error = batch_error(results, len(commands))
+        if error:
+            raise RuntimeError(error)
+
+    def command(
+        self, cmd: str, timeout: float = 2.0, on_urc: Callable[[str], None] | None = None
+    ) -> list[str]:
+        """
+        Send one AT command and collect its response lines.
+
+        Reads until a final result code (OK / ERROR / +CME ERROR / +CMS ERROR)
+        or until ``timeout`` expires. The final result is the last line.
+
+        With ``on_urc``, unsolicited lines that arrive meanwhile (an incoming
+        +CMT and its PDU, RING, ...) go to it instead of into the result;
+        without it they are returned with the response.
+        """
+        return self._command(cmd, timeout, _UrcFilter(on_urc) if on_urc else None)
+
+    def _command(self, cmd: str, timeout: float, urc: _UrcFilter | None) -> list[str]:
+        own = _own_prefix(cmd)
+        self.write_cmd(cmd)
+        lines: list[str] = []
         t0 = time.time()
-        while time.time() - t0 < dur:
-            _ = self.readline()
+        while time.time() - t0 < timeout:
+            line = self.read_response()
+            if not line or line == cmd.strip():
+                continue
+            if urc and urc(line, own):
+                continue
+            lines.append(line)
+            if line == "OK" or "ERROR" in line:
+                break
+        return lines
+
+    def batch(
+        self,
+        commands: Iterable[str | tuple[str, float]],
+        timeout: float = 2.0,
+        stop_on_error: bool = True,
+        on_urc: Callable[[str], None] | None = None,
+    ) -> list[dict]:
+        """
+        Run AT commands back to back and report each one's outcome.
+
+        Each command is written as soon as the previous one's final result
+        code arrives, instead of after a fixed pause, so a sequence takes only
+        as long as the modem needs to answer it. Responses are matched to
+        commands in order. Unsolicited lines that arrive in between (+CMT and
+        its PDU, RING, ...) are handed to ``on_urc`` instead of being taken
+        for part of a response.
 
-    def send_sms(self, phone_number: str, message: str, encoding: str = "auto") -> bool:
+        Args:
+            commands: AT commands, or ``(command, timeout)`` for slow ones.
+            timeout: Seconds to wait for each command's final result code.
+            stop_on_error: Stop at the first command that fails or times out.
+            on_urc: Called with each unsolicited line seen during the batch.
+
+        Returns:
+            One dict per command that was run, in order: ``command``, ``ok``,
+            ``final`` (OK / ERROR / +CME ERROR: ..., or None if nothing came
+            back in time), ``lines`` (the information lines) and ``seconds``.
+
+        Example:
+            >>> results = modem.batch(["AT", "AT+CMEE=2", ("AT+CGPS=1,1", 3.0)])
+            >>> [r["ok"] for r in results]
+            [True, True, True]
+            >>> batch_error(results)    # None, or what failed and why
         """
-        Send an SMS message.
+        results = []
+        urc = _UrcFilter(on_urc)
+        for item in commands:
+            cmd, limit = (item, timeout) if isinstance(item, str) else item
+            cmd = cmd.strip()
+            own = _own_prefix(cmd)
+            lines: list[str] = []
+            final = None
+            started = time.monotonic()
+            self.write_cmd(cmd)
+            while time.monotonic() - started < limit:
+                line = self.read_response()
+                if not line or line == cmd:
+                    continue  # read timeout or command echo
+                if urc(line, own):
+                    continue
+                if line == "OK" or "ERROR" in line:
+                    final = line
+                    break
+                lines.append(line)
+            ok = final == "OK"
+            results.append({
+                "command": cmd,
+                "ok": ok,
+                "final": final,
+                "lines": lines,
+                "seconds": round(time.monotonic() - started, 3),
+            })
+            if not ok and stop_on_error:
+                break
+        return results
+
+    def start_gps(self, rate_hz: int = 1):
+        """
+        Start the GNSS engine in standalone mode.
+
+        Args:
+            rate_hz: NMEA output rate, 1 or 10 Hz (AT+CGPSNMEARATE).
+
+        Raises:
+            RuntimeError: If the modem refuses or doesn't answer AT+CGPS=1,1.
+        """
+        self.command("AT+CGPS=0", timeout=3.0)  # rate can only change while off
+        self.command(f"AT+CGPSNMEARATE={1 if rate_hz >= 10 else 0}")
+        error = batch_error(self.batch([("AT+CGPS=1,1", 3.0)]))
+        if error:
+            raise RuntimeError(error)
+
+    def stop_gps(self):
+        self.command("AT+CGPS=0", timeout=3.0)
+
+    def gps_info(self) -> str | None:
+        """Poll AT+CGPSINFO and return the raw "+CGPSINFO:" line, if any."""
+        for line in self.command("AT+CGPSINFO"):
+            if line.startswith("+CGPSINFO:"):
+                return line
+        return None
+
+    def send_sms(
+        self,
+        phone_number: str,
+        message: str,
+        encoding: str = "auto",
+        on_urc: Callable[[str], None] | None = None,
+    ) -> bool:
+        """
+        Send an SMS message in PDU mode.
+
+        Messages longer than one SMS are split into a concatenated message
+        using the fewest parts (see ``sim7600.codec``).
 
         Args:
             phone_number: Recipient phone number (e.g., "+1234567890")
             message: Message text to send
             encoding: Character encoding - "auto" (default), "gsm", or "ucs2"
-                     "auto" tries GSM first, falls back to UCS2 for special chars
-                     "gsm" for standard ASCII/GSM characters
+                     "auto" uses GSM 7-bit, or UCS2 if any character needs it
+                     "gsm" always uses GSM 7-bit, replacing unsupported characters
                      "ucs2" for Unicode/emoji support
+            on_urc: Called with unsolicited lines (an SMS arriving mid-send)
+                read from a port shared with the receiver; otherwise they
+                are discarded
 
         Returns:
-            True if message sent successfully, False otherwise
+            True if every part was sent successfully, False otherwise
 
         Example:
             >>> modem = Modem("COM10")
             >>> modem.open()
             >>> modem.send_sms("+1234567890", "Hello!")
             True
-            >>> modem.send_sms("+1234567890", "Hello 🎉", encoding="ucs2")
+            >>> modem.send_sms("+1234567890", "Hello 🎉")   # sent as UCS2
             True
         """
         if not self.ser or not self.ser.is_open:
@@ -139,102 +613,69 @@ class Modem:
         if len(message) > 1600:
             raise ValueError("Message too long (max 1600 characters)")
 
-        try:
-            # All messages use GSM encoding
-            # Non-ASCII characters are handled by normalization and the user
-            # has been warned at the CLI level if message contains special chars
-
-            # Set text mode
-            self.write_cmd("AT+CMGF=1")
-            time.sleep(0.5)
-            self._drain(0.3)
-
-            # Set GSM character encoding
-            self.write_cmd('AT+CSCS="GSM"')
-            time.sleep(0.3)
-            self._drain(0.3)
-
-            # Initiate SMS send
-            self.write_cmd(f'AT+CMGS="{phone_number}"')
-            time.sleep(0.5)
-
-            # Wait for '>' prompt
-            prompt_received = False
-            for _ in range(10):
-                line = self.readline()
-                if ">" in line:
-                    prompt_received = True
-                    break
-
-            if not prompt_received:
-                if self.echo_raw:
-                    print("ERROR: Did not receive '>' prompt from modem")
-                return False
-
-            # Send message + Ctrl+Z (chr(26))
-            # User has been warned about non-ASCII characters at the CLI level
-            # Try to send as ASCII first for best compatibility
-            try:
-                message_data = (message + chr(26)).encode("ascii")
-            except UnicodeEncodeError:
-                # Contains non-ASCII - normalize and strip accents
-                normalized = unicodedata.normalize("NFD", message)
-                cleaned = "".join(
-                    char
-                    for char in normalized
-                    if ord(char) < 128 or unicodedata.category(char) != "Mn"
-                )
-                # Replace any remaining non-ASCII with ?
-                cleaned = "".join(char if ord(char) < 128 else "?" for char in cleaned)
-                message_data = (cleaned + chr(26)).encode("ascii")
-
-            self.ser.write(message_data)
-
-            # Wait for confirmation
-            time.sleep(1)  # Give modem time to send
-
-            success = False
-            got_cmgs = False
-            got_ok = False
-            error_msg = None
-
-            for _ in range(20):  # Wait up to ~2 seconds for response
-                line = self.readline()
-                if not line:
-                    time.sleep(0.1)
-                    continue
+        plan = plan_message(message, encoding)
+        self._concat_ref = (self._concat_ref + 1) % 256
+        pdus = build_submit_pdus(phone_number, plan, self._concat_ref)
 
-                if self.echo_raw:
-                    print(f"Response: {line}")
-
-                # Look for success indicators
-                if "+CMGS:" in line:
-                    got_cmgs = True
-                    success = True
-                elif "OK" in line:
-                    got_ok = True
-                    success = True
-                elif "ERROR" in line or "+CMS ERROR" in line:
-                    error_msg = line
-                    if self.echo_raw:
-                        print(f"ERROR: Failed to send SMS: {line}")
+        try:
+            urc = _UrcFilter(on_urc)
+            self._command("AT+CMGF=0", 1.0, urc)
+            for i, (pdu, length) in enumerate(pdus, 1):
+                if not self._send_pdu(pdu, length, urc):
+                    if self.echo_raw and len(pdus) > 1:
+                        print(f"ERROR: Part {i}/{len(pdus)} was not sent")
                     return False
-
-                # Break early if we got both confirmations or just OK
-                if (got_cmgs and got_ok) or (got_ok and success):
-                    break
-
-            if not success and error_msg:
-                if self.echo_raw:
-                    print(f"ERROR: {error_msg}")
-
-            return success
+            return True
 
         except Exception as e:
             if self.echo_raw:
                 print(f"Exception while sending SMS: {e}")
             return False
 
+    def _send_pdu(
+        self, pdu: str, length: int, urc: _UrcFilter, timeout: float = 30.0
+    ) -> bool:
+        """One AT+CMGS exchange; True once the modem reports +CMGS / OK."""
+        self.write_cmd(f"AT+CMGS={length}")
+
+        # Wait for '>' prompt
+        prompt_received = False
+        for _ in range(10):
+            line = self.read_response()
+            if line and urc(line, "+CMGS:"):
+                continue
+            if ">" in line:
+                prompt_received = True
+                break
+            if "ERROR" in line:
+                break
+
+        if not prompt_received:
+            if self.echo_raw:
+                print("ERROR: Did not receive '>' prompt from modem")
+            return False
+
+        # PDU hex + Ctrl+Z (chr(26))
+        self.ser.write(pdu.encode("ascii") + b"\x1a")
+
+        # The network round trip can take several seconds
+        success = False
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            line = self.read_response()
+            if not line or urc(line, "+CMGS:"):
+                continue
+
+            if "+CMGS:" in line:
+                success = True
+            elif line == "OK":
+                return True
+            elif "ERROR" in line:
+                if self.echo_raw:
+                    print(f"ERROR: Failed to send SMS: {line}")
+                return False
+        return success
+
     def lines(self) -> Iterable[str]:
         while True:
             yield self.readline()
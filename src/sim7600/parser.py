@@ -1,4 +1,5 @@
 import re
+from datetime import datetime, timedelta, timezone
 from typing import Optional, Tuple, Dict
 
 # Example incoming lines for +CMT mode:
@@ -20,4 +21,57 @@ def parse_cmt_header(line: str) -> Optional[Dict[str, str]]:
         "alpha": m.group("alpha"),
         "timestamp": m.group("timestamp"),
         "raw_header": line.strip(),
-    }
\ No newline at end of file
+    }
+
+# Modem timestamps look like "25/10/18,14:25:44+08": yy/MM/dd,hh:mm:ss
+# followed by the zone offset in quarter hours.
+MODEM_TS_RE = re.compile(
+    r'^(?P<yy>\d{2})/(?P<mo>\d{2})/(?P<dd>\d{2}),'
+    r'(?P<hh>\d{2}):(?P<mi>\d{2}):(?P<ss>\d{2})(?P<tz>[+-]\d{1,2})?$'
+)
+
+
+def parse_modem_timestamp(value: str) -> Optional[datetime]:
+    """Parse a modem "yy/MM/dd,hh:mm:ss+zz" timestamp into an aware datetime."""
+    m = MODEM_TS_RE.match(value.strip())
+    if not m:
+        return None
+    quarters = int(m.group("tz") or 0)
+    try:
+        return datetime(
+            2000 + int(m.group("yy")),
+            int(m.group("mo")),
+            int(m.group("dd")),
+            int(m.group("hh")),
+            int(m.group("mi")),
+            int(m.group("ss")),
+            tzinfo=timezone(timedelta(minutes=15 * quarters)),
+        )
+    except ValueError:
+        return None
+
+
+def message_time(message: Dict[str, str]) -> Optional[float]:
+    """
+    Best-effort epoch time for a logged message.
+
+    Received messages carry the modem timestamp plus a local ``received_at``
+    ISO time; sent messages carry an ISO ``timestamp``. A number is taken as
+    epoch seconds. Returns None if no field can be parsed.
+    """
+    for key in ("received_at", "timestamp"):
+        value = message.get(key)
+        if not value or isinstance(value, bool):
+            continue
+        if isinstance(value, (int, float)):
+            return float(value)
+        if not isinstance(value, str):
+            continue
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            pass
+        dt = parse_modem_timestamp(value)
+        if dt:
+            return dt.timestamp()
+    return None
@@ -0,0 +1,378 @@
+"""
+Staged receive pipeline with bounded queues.
+
+    source (serial lines) -> parse -> filter/dedup -> sink, sink, ...
+
+Each arrow is a bounded queue drained by its own worker thread, so the serial
+reader only ever does ``readline()`` and a queue put. When a queue is full the
+stage's overflow policy decides what happens:
+
+- ``block``: the producer waits (back-pressure; never use it for the source).
+- ``drop-oldest``: the oldest queued item is discarded to make room.
+- ``spill``: items go to a file on disk and are replayed in order once the
+  stage catches up.
+
+Every stage reports its queue depth and counters through ``metrics()``.
+"""
+
+from __future__ import annotations
+import collections
+import logging
+import os
+import pickle
+import queue
+import struct
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable
+
+from .events import EventParser, SmsEvent
+
+OVERFLOW_POLICIES = ("block", "drop-oldest", "spill")
+_LEN = struct.Struct("<I")
+_WAKE = object()  # wakes an idle worker so it notices stop()
+
+
+class Stage:
+    """
+    One pipeline step: a bounded queue plus a worker thread.
+
+    Args:
+        name: Used in metrics and log messages.
+        func: Called with each item; returns an iterable of outputs (or None).
+        maxsize: Queue capacity.
+        overflow: One of ``OVERFLOW_POLICIES``.
+        spill_dir: Where ``spill`` keeps its overflow file.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[object], Iterable | None],
+        maxsize: int = 1000,
+        overflow: str = "block",
+        spill_dir: str | os.PathLike | None = None,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow!r}")
+        self.name = name
+        self.func = func
+        self.overflow = overflow
+        self.downstream: list[Stage] = []
+        self.logger = logging.getLogger("sim7600")
+
+        self._q: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._spill_dir = Path(spill_dir or tempfile.gettempdir())
+        self._spill_path: Path | None = None
+        self._spill_file = None
+        self._spilled_pending = 0
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"stage-{name}", daemon=True)
+
+        self.processed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.errors = 0
+        self.max_depth = 0
+
+    # ----- producer side -----
+
+    def put(self, item):
+        if self.overflow == "block":
+            self._q.put(item)
+        elif self.overflow == "drop-oldest":
+            while True:
+                try:
+                    self._q.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        self._q.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+        else:
+            with self._lock:
+                # Once spilling, keep spilling until the file is replayed so
+                # items stay in order.
+                if self._spilled_pending == 0:
+                    try:
+                        self._q.put_nowait(item)
+                        self._note_depth()
+                        return
+                    except queue.Full:
+                        pass
+                self._spill(item)
+        self._note_depth()
+
+    def _note_depth(self):
+        depth = self._q.qsize() + self._spilled_pending
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def _spill(self, item):
+        if self._spill_file is None:
+            # A fresh, uniquely named file: a leftover from an earlier process
+            # (same PID in a container) must never be replayed
+            self._spill_dir.mkdir(parents=True, exist_ok=True)
+            fd, path = tempfile.mkstemp(
+                prefix=f"sim7600-spill-{self.name}-", suffix=".bin", dir=self._spill_dir
+            )
+            self._spill_path = Path(path)
+            self._spill_file = os.fdopen(fd, "w+b")
+            self._spill_read_pos = 0
+        data = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+        self._spill_file.seek(0, os.SEEK_END)
+        self._spill_file.write(_LEN.pack(len(data)) + data)
+        self._spilled_pending += 1
+        self.spilled += 1
+
+    def _unspill(self, limit: int = 256) -> list:
+        """Read back up to ``limit`` spilled items (oldest first)."""
+        with self._lock:
+            if not self._spilled_pending:
+                return []
+            f = self._spill_file
+            f.flush()
+            f.seek(self._spill_read_pos)
+            items = []
+            while len(items) < limit and self._spilled_pending:
+                (n,) = _LEN.unpack(f.read(_LEN.size))
+                items.append(pickle.loads(f.read(n)))
+                self._spilled_pending -= 1
+            self._spill_read_pos = f.tell()
+            if not self._spilled_pending:
+                self._remove_spill()
+            return items
+
+    def _remove_spill(self):
+        """Close and delete the spill file; the caller holds ``_lock``."""
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+            self._spill_path.unlink(missing_ok=True)
+
+    # ----- worker side -----
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Process what is queued, then stop the worker. Waits at most
+        ``timeout`` seconds, even if a sink hangs with the queue full.
+        """
+        self._stopping.set()
+        try:
+            self._q.put_nowait(_WAKE)
+        except queue.Full:
+            pass  # the worker is busy and checks the flag between items
+        self._thread.join(timeout)
+        with self._lock:
+            if self._spilled_pending:
+                self.logger.warning(
+                    f"Pipeline stage {self.name} stopped with "
+                    f"{self._spilled_pending} spilled items unprocessed"
+                )
+                self._spilled_pending = 0
+            self._remove_spill()
+
+    def _run(self):
+        # Order: once anything is spilled, ``put`` sends every new item to the
+        # spill too, so the queue only holds items older than the spill. The
+        # queue is drained first, then the whole spill, before the queue is
+        # read again.
+        while True:
+            if self._q.empty():
+                if self._spilled_pending:
+                    self._drain_spill()
+                    continue
+                if self._stopping.is_set():
+                    return
+            try:
+                item = self._q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if item is not _WAKE:
+                self._process(item)
+
+    def _drain_spill(self):
+        while True:
+            items = self._unspill()
+            if not items:
+                return
+            for spilled in items:
+                self._process(spilled)
+
+    def _process(self, item):
+        try:
+            out = self.func(item)
+        except Exception as e:
+            self.errors += 1
+            self.logger.error(f"Pipeline stage {self.name} failed: {e}")
+            return
+        self.processed += 1
+        if out:
+            for result in out:
+                for stage in self.downstream:
+                    stage.put(result)
+
+    def metrics(self) -> dict:
+        return {
+            "stage": self.name,
+            "overflow": self.overflow,
+            "depth": self._q.qsize() + self._spilled_pending,
+            "capacity": self._q.maxsize,
+            "max_depth": self.max_depth,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "errors": self.errors,
+        }
+
+
+class Deduplicator:
+    """Drop SMS already seen recently (modems may re-deliver after a reset)."""
+
+    def __init__(self, size: int = 1024):
+        self.size = size
+        self._seen: collections.OrderedDict = collections.OrderedDict()
+
+    def __call__(self, event) -> bool:
+        if not isinstance(event, SmsEvent):
+            return True
+        key = (event.sender, event.timestamp, event.text)
+        if key in self._seen:
+            self._seen.move_to_end(key)
+            return False
+        self._seen[key] = None
+        if len(self._seen) > self.size:
+            self._seen.popitem(last=False)
+        return True
+
+
+class ReceivePipeline:
+    """
+    Wire a modem line source to sinks through parse and filter stages.
+
+    Args:
+        read_line: Returns the next modem line ("" on timeout).
+        sinks: Callables taking one event; each gets its own stage.
+        parser: Turns lines into events (default ``EventParser()``).
+        accept: Optional predicate; events for which it is False are dropped.
+        dedup: Drop repeated SMS.
+        queue_size: Capacity of every stage queue.
+        overflow: Policy for the parse and filter stages.
+        sink_overflow: Policy for sink stages.
+        spill_dir: Directory for spill files.
+
+    Example:
+        >>> p = ReceivePipeline(modem.readline, [ConsoleSink(), ArchiveSink(a)])
+        >>> p.run()            # blocks until stop() or Ctrl+C
+    """
+
+    def __init__(
+        self,
+        read_line: Callable[[], str],
+        sinks: Iterable[Callable],
+        parser: EventParser | None = None,
+        accept: Callable[[object], bool] | None = None,
+        dedup: bool = True,
+        queue_size: int = 1000,
+        overflow: str = "spill",
+        sink_overflow: str = "spill",
+        spill_dir: str | os.PathLike | None = None,
+    ):
+        self.read_line = read_line
+        self.parser = parser or EventParser()
+        self.sinks = list(sinks)
+        self._dedup = Deduplicator() if dedup else None
+        self._accept = accept
+        self._stop = threading.Event()
+        self._shut_down = False
+
+        self.parse_stage = Stage("parse", self._parse, queue_size, overflow, spill_dir)
+        self.filter_stage = Stage("filter", self._filter, queue_size, overflow, spill_dir)
+        self.sink_stages = [
+            Stage(
+                f"sink{i}-{type(sink).__name__}",
+                self._deliver(sink),
+                queue_size,
+                sink_overflow,
+                spill_dir,
+            )
+            for i, sink in enumerate(self.sinks)
+        ]
+        self.parse_stage.downstream.append(self.filter_stage)
+        self.filter_stage.downstream.extend(self.sink_stages)
+        self.lines_read = 0
+
+    @property
+    def stages(self) -> list[Stage]:
+        return [self.parse_stage, self.filter_stage, *self.sink_stages]
+
+    def _parse(self, line: str):
+        # Empty lines are readline timeouts: let the parser close idle calls
+        return self.parser.feed(line) if line else self.parser.tick()
+
+    def _filter(self, event):
+        if self._dedup and not self._dedup(event):
+            return None
+        if self._accept and not self._accept(event):
+            return None
+        return (event,)
+
+    @staticmethod
+    def _deliver(sink):
+        def deliver(event):
+            sink(event)
+            return None
+
+        return deliver
+
+    def start(self):
+        for stage in reversed(self.stages):
+            stage.start()
+
+    def run(self):
+        """Read lines until ``stop()``; the calling thread is the serial reader."""
+        self.start()
+        try:
+            while not self._stop.is_set():
+                line = self.read_line()
+                if line:
+                    self.lines_read += 1
+                    self.parse_stage.put(line)
+                else:
+                    self.parse_stage.put("")
+                    time.sleep(0)  # yield to the stage workers
+        finally:
+            self.shutdown()
+
+    def stop(self):
+        self._stop.set()
+
+    def shutdown(self, timeout: float = 5.0):
+        """Drain every stage in order, then close sinks that have ``close()``."""
+        self._stop.set()
+        if self._shut_down:
+            return
+        self._shut_down = True
+        for stage in self.stages:
+            stage.stop(timeout)
+        for sink in self.sinks:
+            if hasattr(sink, "close"):
+                try:
+                    sink.close()
+                except Exception as e:
+                    logging.getLogger("sim7600").error(f"Closing {sink!r} failed: {e}")
+
+    def metrics(self) -> dict:
+        return {
+            "lines_read": self.lines_read,
+            "stages": [stage.metrics() for stage in self.stages],
+        }
+
@@ -0,0 +1,351 @@
+"""
+Scheduled and deferred SMS sends.
+
+``SendScheduler`` runs inside a long-running process that already owns the
+modem (the dashboard backend or ``sms receive``). Jobs wait in a heap ordered
+by due time; one thread sleeps until the earliest is due and hands every due
+job (up to ``batch_size``) to a ``dispatch`` callable in one batch, so the
+modem lock is taken once per batch instead of once per process start.
+
+Pending jobs and recent results are saved to a JSON file after every change,
+so nothing is lost across restarts. Other processes (``sms schedule`` on the
+CLI) add or cancel jobs by dropping small files into an inbox directory,
+which the scheduler picks up within ``poll_interval`` seconds::
+
+    logs/scheduled.json           # pending jobs + recent results
+    logs/scheduled-inbox/*.json   # requests from other processes
+"""
+
+from __future__ import annotations
+import collections
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterable
+
+from .codec import plan_message
+
+SCHEDULE_PATH = "logs/scheduled.json"
+INBOX_DIR = "logs/scheduled-inbox"
+SCHEDULE_VERSION = 1
+
+# dispatch(jobs) -> one result per job: True sent, False failed, None not tried.
+# It may be a generator: results produced before an exception are kept.
+Dispatch = Callable[[list[dict]], Iterable]
+
+
+def _when(value) -> float:
+    """Epoch seconds from an epoch number, a datetime or an ISO string."""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid send time: {value!r}")
+
+
+def new_job(phone: str, message: str, due, job_id: str | None = None) -> dict:
+    """
+    Build a validated job dict.
+
+    Raises:
+        ValueError: If the number or message is empty, the message is too long
+            for one concatenated SMS, or ``due`` can't be parsed.
+    """
+    phone = (phone or "").strip()
+    message = (message or "").strip()
+    if not phone or not message:
+        raise ValueError("Phone and message required")
+    plan_message(message)  # raises ValueError if it can't be sent
+    return {
+        "id": job_id or uuid.uuid4().hex[:12],
+        "phone": phone,
+        "message": message,
+        "due": _when(due),
+        "created": time.time(),
+        "attempts": 0,
+        "status": "pending",
+    }
+
+
+def _write_json(path: Path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def submit(inbox: str | os.PathLike, phone: str, message: str, due) -> dict:
+    """Queue a job for the scheduler running in another process."""
+    job = new_job(phone, message, due)
+    _write_json(Path(inbox) / f"{time.time_ns():020d}-{job['id']}.json", job)
+    return job
+
+
+def request_cancel(inbox: str | os.PathLike, job_id: str):
+    """Ask the scheduler running in another process to cancel a job."""
+    _write_json(Path(inbox) / f"{time.time_ns():020d}-cancel.json", {"cancel": job_id})
+
+
+def load_jobs(path: str | os.PathLike = SCHEDULE_PATH) -> dict:
+    """Read a schedule file without a running scheduler (pending and recent)."""
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"pending": [], "recent": []}
+    return {"pending": data.get("pending", []), "recent": data.get("recent", [])}
+
+
+class SendScheduler:
+    """
+    Persistent timer queue for SMS sends.
+
+    Args:
+        dispatch: Sends a batch of due jobs; returns one result per job
+            (True sent, False failed, None not attempted, e.g. modem offline).
+        path: JSON file for pending jobs ('' or None keeps them in memory).
+        inbox: Directory watched for jobs from other processes (None: off).
+        batch_size: Most jobs handed to ``dispatch`` at once.
+        max_attempts: Failed sends are retried until this many attempts.
+        retry_delay: Seconds before a retry (times the attempt number).
+        keep: Finished jobs kept for ``recent()``.
+        poll_interval: Seconds between inbox checks.
+        batch_window: Jobs due this many seconds after the earliest one go
+            out in the same batch.
+
+    Example:
+        >>> scheduler = SendScheduler(backend.dispatch_scheduled)
+        >>> scheduler.start()
+        >>> scheduler.send_after("+1234567890", "Meeting in 10 minutes", 50 * 60)
+        >>> scheduler.send_at("+1234567890", "Good morning", "2025-10-20T08:00")
+    """
+
+    def __init__(
+        self,
+        dispatch: Dispatch,
+        path: str | os.PathLike | None = SCHEDULE_PATH,
+        inbox: str | os.PathLike | None = INBOX_DIR,
+        batch_size: int = 10,
+        max_attempts: int = 3,
+        retry_delay: float = 60.0,
+        keep: int = 100,
+        poll_interval: float = 1.0,
+        batch_window: float = 1.0,
+    ):
+        self.dispatch = dispatch
+        self.path = Path(path) if path else None
+        self.inbox = Path(inbox) if inbox else None
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.batch_window = batch_window
+        self.logger = logging.getLogger("sim7600")
+
+        self.jobs: dict[str, dict] = {}  # pending, by id
+        self._heap: list[tuple[float, int, str]] = []  # (due, seq, id)
+        self._seq = itertools.count()
+        self._recent: collections.deque = collections.deque(maxlen=keep)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._load()
+
+    # ----- public API -----
+
+    def send_at(self, phone: str, message: str, when) -> dict:
+        """Schedule a message for ``when`` (epoch, datetime or ISO string)."""
+        return self.add(new_job(phone, message, when))
+
+    def send_after(self, phone: str, message: str, delay: float) -> dict:
+        """Schedule a message ``delay`` seconds from now."""
+        return self.send_at(phone, message, time.time() + max(0.0, delay))
+
+    def add(self, job: dict) -> dict:
+        with self._cond:
+            if job["id"] in self.jobs:
+                return dict(self.jobs[job["id"]])
+            self._push(job)
+            self._save()
+            self._cond.notify()
+        return dict(job)
+
+    def cancel(self, job_id: str) -> bool:
+        with self._cond:
+            job = self.jobs.pop(job_id, None)
+            if job is None:
+                return False
+            # Its heap entry is skipped when it comes up
+            job["status"] = "cancelled"
+            self._recent.append(job)
+            self._save()
+        return True
+
+    def pending(self) -> list[dict]:
+        """Pending jobs, soonest first."""
+        with self._cond:
+            return sorted((dict(j) for j in self.jobs.values()), key=lambda j: j["due"])
+
+    def recent(self) -> list[dict]:
+        """Finished jobs (sent, failed, cancelled), newest first."""
+        with self._cond:
+            return [dict(j) for j in reversed(self._recent)]
+
+    def __len__(self) -> int:
+        return len(self.jobs)
+
+    # ----- heap and persistence -----
+
+    def _push(self, job: dict):
+        self.jobs[job["id"]] = job
+        heapq.heappush(self._heap, (job["due"], next(self._seq), job["id"]))
+
+    def _load(self):
+        if not self.path or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Could not read {self.path}: {e}")
+            return
+        if data.get("version") != SCHEDULE_VERSION:
+            return
+        for job in data.get("pending", []):
+            self._push(job)
+        self._recent.extend(data.get("recent", [])[::-1])
+
+    def _save(self):
+        if not self.path:
+            return
+        data = {
+            "version": SCHEDULE_VERSION,
+            "pending": sorted(self.jobs.values(), key=lambda j: j["due"]),
+            "recent": list(reversed(self._recent)),
+        }
+        try:
+            _write_json(self.path, data)
+        except OSError as e:
+            self.logger.error(f"Could not save {self.path}: {e}")
+
+    def _read_inbox(self):
+        """Apply jobs and cancellations dropped in by other processes."""
+        if not self.inbox or not self.inbox.is_dir():
+            return
+        for entry in sorted(self.inbox.glob("*.json")):
+            try:
+                request = json.loads(entry.read_text(encoding="utf-8"))
+                if "cancel" in request:
+                    self.cancel(request["cancel"])
+                else:
+                    self.add(new_job(request["phone"], request["message"],
+                                     request["due"], request.get("id")))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.logger.error(f"Ignoring scheduled send {entry.name}: {e}")
+            entry.unlink(missing_ok=True)
+
+    # ----- dispatching -----
+
+    def _due_batch(self, now: float) -> list[dict]:
+        batch = []
+        while self._heap and len(batch) < self.batch_size:
+            due, _, job_id = self._heap[0]
+            job = self.jobs.get(job_id)
+            if job is None or job["due"] != due:
+                heapq.heappop(self._heap)  # cancelled or rescheduled
+                continue
+            if due > now:
+                break
+            heapq.heappop(self._heap)
+            batch.append(job)
+        return batch
+
+    def run_due(self, now: float | None = None) -> int:
+        """Dispatch every job that is due now, in batches. Returns jobs sent."""
+        sent = 0
+        while True:
+            with self._cond:
+                horizon = (time.time() if now is None else now) + self.batch_window
+                batch = self._due_batch(horizon)
+            if not batch:
+                return sent
+            results = []
+            try:
+                for result in self.dispatch([dict(j) for j in batch]):
+                    results.append(result)
+            except Exception as e:
+                # Jobs already reported keep their result, so ones that went
+                # out are never resent. The job being handled counts as a
+                # failed attempt; the ones after it were not tried.
+                self.logger.error(f"Scheduled send failed: {e}")
+                if len(results) < len(batch):
+                    results.append(False)
+            results += [None] * (len(batch) - len(results))
+            with self._cond:
+                deferred = self._settle(batch, results)
+                self._save()
+            sent += sum(1 for r in results if r is True)
+            if deferred:
+                return sent  # modem not available; try again later
+
+    def _settle(self, batch: list[dict], results: list) -> bool:
+        """Record results; reschedule failures. True if any job was deferred."""
+        now = time.time()
+        deferred = False
+        for job, result in zip(batch, results):
+            if job["id"] not in self.jobs:
+                continue  # cancelled while sending
+            if result is None:
+                deferred = True
+                job["due"] = now + self.retry_delay
+                heapq.heappush(self._heap, (job["due"], next(self._seq), job["id"]))
+                continue
+            job["attempts"] += 1
+            if result:
+                job["status"] = "sent"
+                job["sent_at"] = now
+            elif job["attempts"] < self.max_attempts:
+                job["due"] = now + self.retry_delay * job["attempts"]
+                heapq.heappush(self._heap, (job["due"], next(self._seq), job["id"]))
+                continue
+            else:
+                job["status"] = "failed"
+            del self.jobs[job["id"]]
+            self._recent.append(job)
+        return deferred
+
+    # ----- background thread -----
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._read_inbox()
+            self.run_due()
+            with self._cond:
+                wait = self.poll_interval if self.inbox else 3600.0
+                if self._heap:
+                    wait = min(wait, max(0.0, self._heap[0][0] - time.time()))
+                if wait > 0 and not self._stop.is_set():
+                    self._cond.wait(wait)
@@ -0,0 +1,76 @@
+"""
+Startup profiling for ``python -m sim7600 --profile-startup``.
+
+``enable()`` runs first thing in ``main()``. From then on ``mark(label)``
+closes a phase (argument parsing, port discovery, opening the port, ...),
+and every import is timed through a wrapper around ``__import__``. The
+report goes to stderr when the process exits, so commands that end with
+``sys.exit()`` are covered too::
+
+    $ python -m sim7600 --profile-startup sms send +1234567890 "Hi"
+    Startup profile (ms):
+      before main (CPU)               21.4
+      parse arguments                  3.1
+      setup                            9.8   +14 modules
+      port discovery (cache)           0.2
+      ...
+"""
+
+from __future__ import annotations
+import atexit
+import builtins
+import sys
+import time
+
+# (label, perf_counter, modules loaded) at the end of each phase
+_marks: list[tuple[str, float, int]] = []
+_imports = {"seconds": 0.0, "depth": 0}
+_enabled = False
+
+
+def enable():
+    """Start recording; the report is printed at exit."""
+    global _enabled
+    if _enabled:
+        return
+    _enabled = True
+    _marks.append(("start", time.perf_counter(), len(sys.modules)))
+    _imports["before_main"] = time.process_time()
+
+    real_import = builtins.__import__
+
+    def timed_import(*args, **kwargs):
+        # Only the outermost import is timed; nested ones are part of it
+        if _imports["depth"]:
+            return real_import(*args, **kwargs)
+        _imports["depth"] = 1
+        started = time.perf_counter()
+        try:
+            return real_import(*args, **kwargs)
+        finally:
+            _imports["seconds"] += time.perf_counter() - started
+            _imports["depth"] = 0
+
+    builtins.__import__ = timed_import
+    atexit.register(report)
+
+
+def mark(label: str):
+    """End the current phase and name it ``label`` (no-op unless enabled)."""
+    if _enabled:
+        _marks.append((label, time.perf_counter(), len(sys.modules)))
+
+
+def report(file=None):
+    file = file or sys.stderr
+    mark("run command")
+    rows = [("before main (CPU)", _imports["before_main"] * 1000, 0)]
+    for (_, t0, n0), (label, t1, n1) in zip(_marks, _marks[1:]):
+        rows.append((label, (t1 - t0) * 1000, n1 - n0))
+    total = (_marks[-1][1] - _marks[0][1]) * 1000
+    print("Startup profile (ms):", file=file)
+    for label, ms, modules in rows:
+        extra = f"   +{modules} modules" if modules else ""
+        print(f"  {label:<28} {ms:8.1f}{extra}", file=file)
+    print(f"  {'imports after main':<28} {_imports['seconds'] * 1000:8.1f}", file=file)
+    print(f"  {'total after main':<28} {total:8.1f}", file=file)
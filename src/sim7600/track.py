@@ -0,0 +1,265 @@
+"""
+Track simplification and export for recorded GPS fixes.
+
+``Simplifier`` works online: fixes are first thinned by distance/time
+thresholds, then each closed window of survivors is reduced with
+Douglas-Peucker. Coordinates are projected to local metres once per window
+into ``array`` columns and the perpendicular-distance pass runs over those
+columns, so memory stays bounded by the window size.
+
+Exports: GPX, GeoJSON and the binary track format from ``sim7600.gps``.
+"""
+
+from __future__ import annotations
+import itertools
+import json
+import math
+import os
+from array import array
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, TextIO
+from xml.sax.saxutils import escape
+
+from .gps import TRACK_MAGIC, TRACK_RECORD
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def _project(fixes: list[tuple]) -> tuple[array, array]:
+    """Equirectangular projection around the window's first fix, in metres."""
+    lat0 = math.radians(fixes[0][1])
+    kx = EARTH_RADIUS_M * math.cos(lat0) * math.pi / 180.0
+    ky = EARTH_RADIUS_M * math.pi / 180.0
+    lon0 = fixes[0][2]
+    lat0d = fixes[0][1]
+    xs = array("d", [(f[2] - lon0) * kx for f in fixes])
+    ys = array("d", [(f[1] - lat0d) * ky for f in fixes])
+    return xs, ys
+
+
+def douglas_peucker(fixes: list[tuple], epsilon_m: float) -> list[tuple]:
+    """
+    Simplify a list of fixes, keeping points further than ``epsilon_m`` from
+    the simplified line. Iterative, so long windows don't hit recursion limits.
+    """
+    n = len(fixes)
+    if n < 3 or epsilon_m <= 0:
+        return list(fixes)
+    xs, ys = _project(fixes)
+    keep = bytearray(n)
+    keep[0] = keep[n - 1] = 1
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        x1, y1, x2, y2 = xs[first], ys[first], xs[last], ys[last]
+        dx, dy = x2 - x1, y2 - y1
+        seg_len = math.hypot(dx, dy)
+        best, best_d = -1, epsilon_m
+        for i in range(first + 1, last):
+            if seg_len == 0.0:
+                d = math.hypot(xs[i] - x1, ys[i] - y1)
+            else:
+                d = abs(dy * xs[i] - dx * ys[i] + x2 * y1 - y2 * x1) / seg_len
+            if d > best_d:
+                best, best_d = i, d
+        if best >= 0:
+            keep[best] = 1
+            stack.append((first, best))
+            stack.append((best, last))
+    return [f for f, k in zip(fixes, keep) if k]
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class Simplifier:
+    """
+    Online track simplifier.
+
+    Args:
+        epsilon_m: Douglas-Peucker tolerance in metres (0 disables DP).
+        min_distance_m: Drop fixes closer than this to the last kept fix...
+        max_interval_s: ...unless this much time has passed since it.
+        window: Fixes per Douglas-Peucker window.
+
+    Example:
+        >>> s = Simplifier(epsilon_m=5)
+        >>> for fix in fixes:
+        ...     out.extend(s.push(fix))
+        >>> out.extend(s.flush())
+    """
+
+    def __init__(
+        self,
+        epsilon_m: float = 5.0,
+        min_distance_m: float = 2.0,
+        max_interval_s: float = 60.0,
+        window: int = 2000,
+    ):
+        self.epsilon_m = epsilon_m
+        self.min_distance_m = min_distance_m
+        self.max_interval_s = max_interval_s
+        self.window = max(window, 3)
+        self._buf: list[tuple] = []
+        self._last: tuple | None = None
+        self._dropped: tuple | None = None  # so flush() can end on the final fix
+        self._emitted_first = False
+
+    def push(self, fix: tuple) -> list[tuple]:
+        """Feed one fix; returns fixes finalized by a closed window (may be empty)."""
+        last = self._last
+        if last is not None:
+            moved = haversine_m(last[1], last[2], fix[1], fix[2])
+            if moved < self.min_distance_m and fix[0] - last[0] < self.max_interval_s:
+                self._dropped = fix
+                return []
+        self._last = fix
+        self._dropped = None
+        self._buf.append(fix)
+        if len(self._buf) >= self.window:
+            return self._close_window()
+        return []
+
+    def _close_window(self) -> list[tuple]:
+        kept = douglas_peucker(self._buf, self.epsilon_m)
+        # The window's last point starts the next window so segments join up
+        self._buf = [self._buf[-1]]
+        out = kept if not self._emitted_first else kept[1:]
+        self._emitted_first = True
+        return out
+
+    def flush(self) -> list[tuple]:
+        """Close the current window and return its remaining fixes."""
+        if self._dropped is not None:
+            self._buf.append(self._dropped)
+            self._dropped = None
+        if not self._buf or (self._emitted_first and len(self._buf) == 1):
+            return []
+        out = self._close_window()
+        self._buf = []
+        return out
+
+
+def simplify(fixes: Iterable[tuple], **kwargs) -> Iterator[tuple]:
+    """Stream ``fixes`` through a ``Simplifier``."""
+    s = Simplifier(**kwargs)
+    for fix in fixes:
+        yield from s.push(fix)
+    yield from s.flush()
+
+
+def simplify_to(fixes: Iterable[tuple], max_points: int, epsilon_m: float = 2.0) -> list[tuple]:
+    """
+    Simplify with a growing tolerance until at most ``max_points`` remain.
+
+    ``fixes`` is read once and may be a generator such as ``read_track``.
+    Each pass simplifies the previous pass's output, so only the first one
+    touches every fix.
+    """
+    it = iter(fixes)
+    out = []
+    for fix in it:
+        out.append(fix)
+        if len(out) > max_points:
+            break
+    else:
+        return out  # short enough as it is
+    eps = epsilon_m
+    out = list(simplify(itertools.chain(out, it), epsilon_m=eps, min_distance_m=eps / 2))
+    while len(out) > max_points and eps < 100_000:
+        eps *= 2
+        out = list(simplify(out, epsilon_m=eps, min_distance_m=eps / 2))
+    return out
+
+
+# ----- export -----
+
+
+def _iso(t: float) -> str:
+    return datetime.fromtimestamp(t, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def write_gpx(fixes: Iterable[tuple], fp: TextIO, name: str = "SIM7600 track"):
+    fp.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    fp.write('<gpx version="1.1" creator="sim7600" xmlns="http://www.topografix.com/GPX/1/1">\n')
+    fp.write(f"  <trk><name>{escape(name)}</name><trkseg>\n")
+    for t, lat, lon, alt, speed, course, sats in fixes:
+        fp.write(f'    <trkpt lat="{lat:.7f}" lon="{lon:.7f}">')
+        if not math.isnan(alt):
+            fp.write(f"<ele>{alt:.1f}</ele>")
+        fp.write(f"<time>{_iso(t)}</time>")
+        if sats:
+            fp.write(f"<sat>{sats}</sat>")
+        fp.write("</trkpt>\n")
+    fp.write("  </trkseg></trk>\n</gpx>\n")
+
+
+def to_geojson(fixes: Iterable[tuple]) -> dict:
+    """GeoJSON Feature with a LineString and per-point times."""
+    coords, times = [], []
+    for f in fixes:
+        coords.append([round(f[2], 7), round(f[1], 7)])
+        times.append(f[0])
+    return {
+        "type": "Feature",
+        "geometry": {"type": "LineString", "coordinates": coords},
+        "properties": {"times": times},
+    }
+
+
+def write_geojson(fixes: Iterable[tuple], fp: TextIO):
+    json.dump(to_geojson(fixes), fp)
+
+
+def write_binary(fixes: Iterable[tuple], path: str | os.PathLike) -> int:
+    """Write fixes in the binary track format. Returns the record count."""
+    n = 0
+    with open(path, "wb") as f:
+        f.write(TRACK_MAGIC)
+        for t, lat, lon, alt, speed, course, sats in fixes:
+            f.write(TRACK_RECORD.pack(t, lat, lon, alt, speed, course, sats))
+            n += 1
+    return n
+
+
+def export_track(fixes: Iterable[tuple], fmt: str, out: str | os.PathLike):
+    """Export fixes as ``gpx``, ``geojson`` or ``bin``."""
+    if fmt == "bin":
+        write_binary(fixes, out)
+        return
+    with open(out, "w", encoding="utf-8") as fp:
+        if fmt == "gpx":
+            write_gpx(fixes, fp)
+        elif fmt == "geojson":
+            write_geojson(fixes, fp)
+        else:
+            raise ValueError(f"Unknown export format: {fmt}")
+
+
+
+class SimplifyingWriter:
+    """Wrap a ``TrackWriter`` so only simplified fixes reach the file."""
+
+    def __init__(self, writer, simplifier: Simplifier):
+        self.writer = writer
+        self.simplifier = simplifier
+
+    @property
+    def count(self) -> int:
+        return self.writer.count
+
+    def write(self, *fix):
+        for kept in self.simplifier.push(fix):
+            self.writer.write(*kept)
+
+    def close(self):
+        for kept in self.simplifier.flush():
+            self.writer.write(*kept)
+        self.writer.close()
@@ -0,0 +1,322 @@
+"""
+Batched HTTP forwarding of modem events.
+
+``WebhookSink`` is a sink (see ``sim7600.events``) that never blocks the
+serial read loop: events go into a bounded in-memory queue, a batcher thread
+groups them, and a small pool of sender threads POSTs the batches over
+keep-alive connections. Batches that fail are written to a retry directory
+and re-sent oldest first, so nothing is lost if the endpoint is slow, down or
+the process restarts.
+
+Each POST body is::
+
+    {"batch": "<sortable id>", "messages": [<event dict>, ...]}
+
+Batch ids sort in creation order, so the receiver can restore ordering and
+drop duplicates after a retry.
+"""
+
+from __future__ import annotations
+import http.client
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+
+class WebhookError(RuntimeError):
+    """The endpoint rejected a batch (non-2xx response)."""
+
+    def __init__(self, status: int, body: str = ""):
+        super().__init__(f"HTTP {status}: {body[:200]}")
+        self.status = status
+
+
+class _ConnectionPool:
+    """Keep-alive HTTP(S) connections to one host, reused across batches."""
+
+    def __init__(self, url: str, size: int, timeout: float):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported webhook URL: {url}")
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path or "/"
+        if parts.query:
+            self.path += "?" + parts.query
+        self.timeout = timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue(maxsize=size)
+
+    def _new(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def post(self, body: bytes, headers: dict) -> int:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._new()
+        try:
+            conn.request("POST", self.path, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except Exception:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+        if not 200 <= resp.status < 300:
+            raise WebhookError(resp.status, data.decode("utf-8", "replace"))
+        return resp.status
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class WebhookSink:
+    """
+    Forward events to an HTTP endpoint in batches.
+
+    Args:
+        url: Endpoint receiving JSON POSTs.
+        batch_size: Maximum events per POST.
+        flush_interval: Maximum seconds an event waits for its batch to fill.
+        max_in_flight: Concurrent POSTs (also the connection pool size).
+        queue_dir: Directory for batches awaiting retry.
+        max_pending: In-memory queue size; beyond it events spill to disk.
+        timeout: Per-request socket timeout in seconds.
+        headers: Extra request headers (e.g. Authorization).
+
+    Example:
+        >>> sink = WebhookSink("http://127.0.0.1:8080/sms")
+        >>> ReceivePipeline(modem.readline, [ConsoleSink(), sink]).run()
+    """
+
+    def __init__(
+        self,
+        url: str,
+        batch_size: int = 50,
+        flush_interval: float = 1.0,
+        max_in_flight: int = 2,
+        queue_dir: str | os.PathLike = "logs/webhook-queue",
+        max_pending: int = 10000,
+        timeout: float = 10.0,
+        headers: dict | None = None,
+        retry_max_delay: float = 300.0,
+    ):
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_dir = Path(queue_dir)
+        self.queue_dir.mkdir(parents=True, exist_ok=True)
+        self.retry_max_delay = retry_max_delay
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.logger = logging.getLogger("sim7600")
+
+        self.max_in_flight = max_in_flight
+        self._pool = _ConnectionPool(url, max_in_flight, timeout)
+        self._pending: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._seq = itertools.count()
+        self._seq_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake_retry = threading.Event()
+        self.stats = {"sent": 0, "failed": 0, "spilled": 0, "dead": 0}
+        self._stats_lock = threading.Lock()
+        # Events that overflowed the queue are appended here until the next
+        # retry pass turns the file into a batch
+        self._spill_lock = threading.Lock()
+        self._spill_path: Path | None = None
+        self._spill_count = 0
+
+        self._batcher = threading.Thread(target=self._batch_loop, daemon=True)
+        self._retrier = threading.Thread(target=self._retry_loop, daemon=True)
+        self._batcher.start()
+        self._retrier.start()
+
+    # ----- sink interface -----
+
+    def __call__(self, event):
+        payload = event.to_dict() if hasattr(event, "to_dict") else dict(event)
+        try:
+            self._pending.put_nowait(payload)
+        except queue.Full:
+            # Never block the caller: park the event on disk for the retrier
+            self._spill_event(payload)
+            self._count("spilled")
+
+    def close(self, timeout: float = 10.0):
+        """Flush queued events; anything not delivered stays in ``queue_dir``."""
+        self._stop.set()
+        self._batcher.join(timeout)
+        # Wait for in-flight POSTs by taking every slot
+        acquired = 0
+        deadline = time.monotonic() + timeout
+        while acquired < self.max_in_flight and time.monotonic() < deadline:
+            if self._slots.acquire(timeout=0.1):
+                acquired += 1
+        for _ in range(acquired):
+            self._slots.release()  # the retrier's last pass needs them
+        leftovers = []
+        while True:
+            try:
+                leftovers.append(self._pending.get_nowait())
+            except queue.Empty:
+                break
+        if leftovers:
+            self._spill(leftovers)
+        self._wake_retry.set()
+        self._retrier.join(timeout)
+        self._pool.close()
+
+    # ----- batching and sending -----
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _batch_id(self) -> str:
+        with self._seq_lock:
+            return f"{time.time_ns():020d}-{next(self._seq) % 1000000:06d}"
+
+    def _batch_loop(self):
+        while not (self._stop.is_set() and self._pending.empty()):
+            try:
+                first = self._pending.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._slots.acquire()
+            threading.Thread(
+                target=self._send_fresh, args=(self._batch_id(), batch), daemon=True
+            ).start()
+
+    def _post(self, batch_id: str, messages: list) -> None:
+        body = json.dumps(
+            {"batch": batch_id, "messages": messages}, ensure_ascii=False
+        ).encode("utf-8")
+        self._pool.post(body, self.headers)
+
+    def _send_fresh(self, batch_id: str, messages: list):
+        try:
+            self._post(batch_id, messages)
+            self._count("sent", len(messages))
+        except Exception as e:
+            self._count("failed")
+            self.logger.warning(f"Webhook batch {batch_id} failed ({e}); queued for retry")
+            self._write_batch(batch_id, messages)
+            self._wake_retry.set()
+        finally:
+            self._slots.release()
+
+    # ----- disk queue -----
+
+    def _write_batch(self, batch_id: str, messages: list):
+        path = self.queue_dir / f"{batch_id}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(messages, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _spill(self, messages: list):
+        self._write_batch(self._batch_id(), messages)
+        self._wake_retry.set()
+
+    def _spill_event(self, payload: dict):
+        """Append one event to the open spill file (a ``.spill`` JSON Lines file)."""
+        with self._spill_lock:
+            if self._spill_path is None:
+                self._spill_path = self.queue_dir / f"{self._batch_id()}.spill"
+            with open(self._spill_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+            self._spill_count += 1
+            full = self._spill_count >= self.batch_size
+            if full:
+                self._seal_spills()
+        if full:
+            self._wake_retry.set()
+
+    def _seal_spills(self):
+        """Turn spill files (including any left by a crash) into batch files."""
+        for path in sorted(self.queue_dir.glob("*.spill")):
+            messages = []
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            messages.append(json.loads(line))
+                        except ValueError:
+                            pass  # torn last line after a crash
+            except OSError:
+                continue
+            if messages:
+                self._write_batch(path.stem, messages)
+            path.unlink(missing_ok=True)
+        self._spill_path = None
+        self._spill_count = 0
+
+    def pending_batches(self) -> list[Path]:
+        return sorted(self.queue_dir.glob("*.json"))
+
+    def _retry_loop(self):
+        delay = 1.0
+        while True:
+            self._wake_retry.wait(timeout=delay)
+            self._wake_retry.clear()
+            if self._stop.is_set() and not self._batcher.is_alive():
+                # One last pass on shutdown, without backoff
+                self._drain_disk_queue()
+                return
+            delay = 1.0 if self._drain_disk_queue() else min(delay * 2, self.retry_max_delay)
+
+    def _drain_disk_queue(self) -> bool:
+        """Re-send queued batches oldest first. Returns False if the endpoint failed."""
+        with self._spill_lock:
+            self._seal_spills()
+        for path in self.pending_batches():
+            try:
+                messages = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            try:
+                # Counts against max_in_flight like a fresh batch
+                with self._slots:
+                    self._post(path.stem, messages)
+            except WebhookError as e:
+                if 400 <= e.status < 500 and e.status not in (408, 429):
+                    # The endpoint will never accept this batch; park it
+                    dead = self.queue_dir / "dead"
+                    dead.mkdir(exist_ok=True)
+                    os.replace(path, dead / path.name)
+                    self._count("dead")
+                    self.logger.error(f"Webhook rejected batch {path.stem}: {e}")
+                    continue
+                return False
+            except Exception:
+                return False
+            self._count("sent", len(messages))
+            path.unlink(missing_ok=True)
+        return True
@@ -27,10 +27,44 @@ def main():
         action="store_true",
         help="Enable debug mode"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="WSGI worker processes; >1 serves with gunicorn (default: 1)"
+    )
+    parser.add_argument(
+        "--history",
+        type=int,
+        default=None,
+        help="Messages kept in memory (default: $DASHBOARD_HISTORY or 10000)"
+    )
+    parser.add_argument(
+        "--backend-address",
+        default=None,
+        help="host:port of the modem backend process (default: 127.0.0.1:5050)"
+    )
+    parser.add_argument(
+        "--backend-only",
+        action="store_true",
+        help="Only run the modem backend (for an externally managed gunicorn)"
+    )
     
     args = parser.parse_args()
     
-    run_dashboard(host=args.host, port=args.port, debug=args.debug)
+    if args.backend_only:
+        from .backend import parse_address, serve_backend
+        serve_backend(parse_address(args.backend_address), history_size=args.history)
+        return
+
+    run_dashboard(
+        host=args.host,
+        port=args.port,
+        debug=args.debug,
+        workers=args.workers,
+        backend_address=args.backend_address,
+        history=args.history,
+    )
 
 
 if __name__ == "__main__":
@@ -1,18 +1,31 @@
 """
 Flask web application for SIM7600 dashboard.
 Uses the core sim7600 package - no code duplication!
+
+All modem and message state lives in a ``DashboardBackend``. By default the
+app creates one in-process; ``run_dashboard(workers=N)`` instead starts a
+separate backend process and serves the app from N WSGI workers. Each worker
+uses a ``WorkerBackend``: it answers reads from the files the backend writes
+and sends through a proxy (see ``backend.py`` and ``wsgi.py``).
 """
 
 from flask import Flask, render_template, request, jsonify
 from pathlib import Path
-import json
-import threading
-from datetime import datetime
+import os
 import time
 
 # Import from core sim7600 package - no duplication!
-from sim7600 import Modem, find_sim7600_port
-from sim7600.parser import parse_cmt_header
+from sim7600.codec import plan_message
+from sim7600.gps import fix_to_dict, read_track
+from sim7600.track import simplify_to, to_geojson
+
+from .backend import (
+    DashboardBackend,
+    connect_backend,
+    new_authkey,
+    parse_address,
+    serve_backend,
+)
 
 
 app = Flask(
@@ -21,82 +34,26 @@ app = Flask(
     static_folder=str(Path(__file__).parent / "static"),
 )
 
-# Global state
-modem = None
-modem_port = None
-modem_connected = False
-receiving_thread = None
-stop_receiving = False
-messages = []
-modem_lock = threading.Lock()  # Prevent concurrent modem access
-
-
-def load_existing_messages():
-    """Load messages from the JSONL log file."""
-    global messages
-    log_path = Path("logs/sms.jsonl")
-    if log_path.exists():
-        with open(log_path, "r", encoding="utf-8") as f:
-            for line in f:
-                if line.strip():
-                    try:
-                        msg = json.loads(line)
-                        messages.append(msg)
-                    except:
-                        pass
-    # Keep only last 100 messages in memory
-    messages = messages[-100:]
-
-
-def receive_sms_loop():
-    """Background thread to receive SMS messages."""
-    global modem, stop_receiving, messages
-
-    if not modem or not modem.ser or not modem.ser.is_open:
-        return
+# Shared state: a DashboardBackend, or a WorkerBackend in front of one
+backend = None
+history_size = None  # messages kept in memory; None uses the backend default
+
+GPS_TRACK = "logs/gps/track.bin"  # written by `python -m sim7600 gps track`
 
-    pending_header = None
-    while not stop_receiving:
-        try:
-            # Use lock when reading from modem
-            with modem_lock:
-                line = modem.readline()
-            if not line:
-                time.sleep(0.1)
-                continue
-
-            if pending_header is None:
-                hdr = parse_cmt_header(line)
-                if hdr:
-                    pending_header = hdr
-                continue
-            else:
-                body = line.strip()
-                if not body:
-                    continue
-
-                message = {
-                    "direction": "received",
-                    "sender": pending_header["number"],
-                    "timestamp": pending_header["timestamp"],
-                    "text": body,
-                    "raw_header": pending_header["raw_header"],
-                    "received_at": datetime.now().isoformat(),
-                }
-
-                messages.append(message)
-                messages[:] = messages[-100:]  # Keep last 100
-
-                # Save to log file
-                log_path = Path("logs/sms.jsonl")
-                log_path.parent.mkdir(parents=True, exist_ok=True)
-                with open(log_path, "a", encoding="utf-8") as f:
-                    f.write(json.dumps(message, ensure_ascii=False) + "\n")
-
-                pending_header = None
-        except Exception as e:
-            print(f"Error in receive loop: {e}")
-            time.sleep(1)
+
+def get_backend():
+    """The backend in use, creating an in-process one on first use."""
+    global backend
+    if backend is None:
+        backend = DashboardBackend(history_size=history_size)
+        backend.load_existing_messages()
+    return backend
+
+
+def use_backend(new_backend):
+    """Point the app at a backend (e.g. a ``WorkerBackend``)."""
+    global backend
+    backend = new_backend
 
 
 @app.route("/")
@@ -108,32 +65,92 @@ def index():
 @app.route("/api/status")
 def status():
     """Get modem connection status."""
-    return jsonify(
-        {
-            "connected": modem_connected,
-            "port": modem_port,
-            "message_count": len(messages),
-        }
-    )
+    return jsonify(get_backend().status())
+
+
+@app.route("/api/pipeline")
+def pipeline_metrics():
+    """Queue depth and counters for each receive pipeline stage."""
+    return jsonify(get_backend().pipeline_metrics())
+
+
+@app.route("/api/health")
+def health():
+    """Signal, registration and SIM state samples (``?last=N``, oldest first)."""
+    last = min(max(request.args.get("last", 120, type=int), 1), 2880)
+    return jsonify(get_backend().health_summary(last))
+
+
+@app.route("/api/analytics")
+def analytics():
+    """Traffic volumes, failure rates, top contacts and send latency."""
+    hours = min(max(request.args.get("hours", 24, type=int), 1), 24 * 90)
+    top = min(max(request.args.get("top", 10, type=int), 1), 100)
+    return jsonify(get_backend().analytics_summary(hours, top))
 
 
 @app.route("/api/messages")
 def get_messages():
     """Get recent messages."""
-    # Return messages in reverse order (newest first)
-    return jsonify({"messages": list(reversed(messages[-50:]))})  # Last 50 messages
+    # Last 50 messages, newest first
+    return jsonify({"messages": get_backend().recent_messages(50)})
 
 
 @app.route("/api/contacts")
 def get_contacts():
     """Get unique phone numbers from message history."""
-    contacts = set()
-    for msg in messages:
-        if msg.get("direction") == "received" and msg.get("sender"):
-            contacts.add(msg["sender"])
-        elif msg.get("direction") == "sent" and msg.get("recipient"):
-            contacts.add(msg["recipient"])
-    return jsonify({"contacts": sorted(list(contacts))})
+    return jsonify({"contacts": get_backend().contacts()})
+
+
+@app.route("/api/gps")
+def get_gps():
+    """Get the latest GPS fixes recorded by the tracker."""
+    last = min(request.args.get("last", 100, type=int), 5000)
+    if not Path(GPS_TRACK).exists():
+        return jsonify({"fix": None, "track": []})
+    try:
+        # Only the tail of the track file is read
+        track = [fix_to_dict(f) for f in read_track(GPS_TRACK, last=last)]
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+    return jsonify({"fix": track[-1] if track else None, "track": track})
+
+
+_track_cache = {}  # (args, file size) -> response body, one entry
+
+
+@app.route("/api/gps/track")
+def get_gps_track():
+    """Simplified track (GeoJSON) for a time range, default the last 24 hours."""
+    until = request.args.get("until", type=float)
+    since = request.args.get("since", type=float)
+    if since is None:
+        # Whole minutes, so repeated requests for the default view hit the cache
+        since = float(int((until or time.time()) - 24 * 3600) // 60 * 60)
+    max_points = min(request.args.get("max_points", 1500, type=int), 20000)
+    path = Path(GPS_TRACK)
+    if not path.exists():
+        return jsonify(to_geojson([]))
+
+    key = (since, until, max_points, path.stat().st_size)
+    if key not in _track_cache:
+        raw_points = 0
+
+        def fixes():
+            nonlocal raw_points
+            for fix in read_track(path, since=since, until=until):
+                raw_points += 1
+                yield fix
+
+        # Streamed: the range is never held in memory as a whole
+        try:
+            feature = to_geojson(simplify_to(fixes(), max_points))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+        feature["properties"]["raw_points"] = raw_points
+        _track_cache.clear()
+        _track_cache[key] = feature
+    return jsonify(_track_cache[key])
 
 
 @app.route("/api/send", methods=["POST"])
@@ -146,105 +163,93 @@ def send_sms():
     if not phone or not message:
         return jsonify({"success": False, "error": "Phone and message required"}), 400
 
-    if not modem_connected or not modem:
-        return jsonify({"success": False, "error": "Modem not connected"}), 500
-
     try:
-        # Check for non-ASCII characters
-        try:
-            message.encode("ascii")
-            ascii_only = True
-            preview = message
-        except UnicodeEncodeError:
-            ascii_only = False
-            # Generate preview (same logic as CLI)
-            import unicodedata
-
-            normalized = unicodedata.normalize("NFD", message)
-            preview = ""
-            for char in normalized:
-                if ord(char) < 128:
-                    preview += char
-                elif unicodedata.category(char) == "Mn":
-                    continue
-                else:
-                    preview += "?"
-
-        # Send the message using core sim7600 package (with lock for thread safety)
-        print(f"[DEBUG] Attempting to send SMS to {phone}: {message}")
-        with modem_lock:
-            success = modem.send_sms(phone, message)
-        print(f"[DEBUG] send_sms returned: {success}")
-
-        if success:
-            # Log the sent message
-            sent_message = {
-                "direction": "sent",
-                "recipient": phone,
-                "text": message,
-                "timestamp": datetime.now().isoformat(),
-                "ascii_only": ascii_only,
-            }
-
-            # Add to in-memory messages list
-            messages.append(sent_message)
-            messages[:] = messages[-100:]  # Keep last 100
-
-            # Save to log file
-            log_path = Path("logs/sms.jsonl")
-            log_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(log_path, "a", encoding="utf-8") as f:
-                f.write(json.dumps(sent_message, ensure_ascii=False) + "\n")
-
-            return jsonify(
-                {
-                    "success": True,
-                    "message": "SMS sent successfully!",
-                    "ascii_only": ascii_only,
-                    "preview": preview if not ascii_only else None,
-                }
-            )
-        else:
-            return jsonify({"success": False, "error": "Failed to send SMS"}), 500
-
+        result = get_backend().send(phone, message)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+    if not result["success"]:
+        return jsonify({"success": False, "error": "Failed to send SMS"}), 500
+    return jsonify({**result, "message": "SMS sent successfully!"})
 
-@app.route("/api/connect", methods=["POST"])
-def connect_modem():
-    """Connect to the modem."""
-    global modem, modem_port, modem_connected, receiving_thread, stop_receiving
 
-    try:
-        # Use core sim7600 package to find modem
-        port = find_sim7600_port()
-        if not port:
-            return jsonify({"success": False, "error": "Modem not found"}), 404
+@app.route("/api/scheduled")
+def list_scheduled():
+    """Pending scheduled sends (soonest first) and recently finished ones."""
+    return jsonify(get_backend().scheduled())
 
-        # Open modem using core sim7600 package (with lock)
-        with modem_lock:
-            modem = Modem(port, echo_raw=True)  # Enable debug output
-            modem.open()
-            modem.init_sms_push()
 
-        modem_port = port
-        modem_connected = True
-
-        # Start receiving thread
-        stop_receiving = False
-        receiving_thread = threading.Thread(target=receive_sms_loop, daemon=True)
-        receiving_thread.start()
+@app.route("/api/scheduled", methods=["POST"])
+def schedule_sms():
+    """Schedule an SMS: ``at`` (ISO time or epoch seconds) or ``after`` (seconds)."""
+    data = request.json or {}
+    phone = data.get("phone", "").strip()
+    message = data.get("message", "").strip()
+    at, after = data.get("at"), data.get("after")
+    if at is None and after is None:
+        return jsonify({"success": False, "error": "Give 'at' or 'after'"}), 400
+    try:
+        job = get_backend().schedule(phone, message, at=at, after=after)
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "job": job})
+
+
+@app.route("/api/scheduled/<job_id>", methods=["DELETE"])
+def cancel_scheduled(job_id):
+    """Cancel a pending scheduled send."""
+    if not get_backend().cancel_scheduled(job_id):
+        return jsonify({"success": False, "error": "No such pending job"}), 404
+    return jsonify({"success": True})
+
+
+@app.route("/api/encode", methods=["POST"])
+def encode_preview():
+    """How a message would be sent: encoding and number of SMS segments."""
+    message = (request.json or {}).get("message", "")
+    if not message:
+        return jsonify({"encoding": "gsm", "segments": 0, "units": 0, "per_segment": 160})
+    try:
+        plan = plan_message(message)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    info = plan.to_dict()
+    del info["text"]  # same as the input for automatic encoding
+    return jsonify(info)
 
-        return jsonify({"success": True, "port": port})
 
+@app.route("/api/connect", methods=["POST"])
+def connect_modem():
+    """Connect to the modem."""
+    try:
+        port = get_backend().connect()
     except Exception as e:
-        modem_connected = False
         return jsonify({"success": False, "error": str(e)}), 500
+    if not port:
+        return jsonify({"success": False, "error": "Modem not found"}), 404
+    return jsonify({"success": True, "port": port})
 
 
-def run_dashboard(host="127.0.0.1", port=5000, debug=False):
-    """Run the web dashboard."""
+def _print(text, fallback):
+    """Print with an ASCII fallback for Windows consoles without emoji support."""
+    try:
+        print(text)
+    except UnicodeEncodeError:
+        print(fallback)
+
+
+def run_dashboard(
+    host="127.0.0.1", port=5000, debug=False, workers=1, backend_address=None, history=None
+):
+    """
+    Run the web dashboard.
+
+    With ``workers`` > 1 the modem is owned by a separate backend process and
+    the app is served by that many gunicorn worker processes. ``history`` is
+    the number of messages kept in memory.
+    """
+    global history_size
+    history_size = history
     try:
         print(f"\n🌐 SIM7600 Web Dashboard")
         print(f"{'='*50}")
@@ -259,58 +264,76 @@ def run_dashboard(host="127.0.0.1", port=5000, debug=False):
         print(f"   Press Ctrl+C to stop")
         print(f"{'='*50}\n")
 
+    if workers > 1:
+        _run_production(host, port, workers, parse_address(backend_address))
+        return
+
     # Load existing messages
-    load_existing_messages()
-    try:
-        print(f"✅ Loaded {len(messages)} existing messages")
-    except UnicodeEncodeError:
-        print(f"[OK] Loaded {len(messages)} existing messages")
+    b = get_backend()
+    _print(f"✅ Loaded {len(b.messages)} existing messages",
+           f"[OK] Loaded {len(b.messages)} existing messages")
 
     # Try to auto-connect to modem
     try:
-        global modem, modem_port, modem_connected, receiving_thread, stop_receiving
-        port_found = find_sim7600_port()
+        port_found = b.connect()
         if port_found:
-            # Use lock for modem initialization
-            with modem_lock:
-                modem = Modem(port_found, echo_raw=True)  # Enable debug output
-                modem.open()
-                modem.init_sms_push()
-            modem_port = port_found
-            modem_connected = True
-            try:
-                print(f"✅ Connected to modem on {port_found}")
-            except UnicodeEncodeError:
-                print(f"[OK] Connected to modem on {port_found}")
-
-            # Start receiving thread
-            stop_receiving = False
-            receiving_thread = threading.Thread(target=receive_sms_loop, daemon=True)
-            receiving_thread.start()
-            try:
-                print(f"✅ Started SMS receiver")
-            except UnicodeEncodeError:
-                print(f"[OK] Started SMS receiver")
+            _print(f"✅ Connected to modem on {port_found}",
+                   f"[OK] Connected to modem on {port_found}")
+            _print(f"✅ Started SMS receiver", f"[OK] Started SMS receiver")
         else:
-            try:
-                print(
-                    "⚠️  Modem not found. You can connect manually from the dashboard."
-                )
-            except UnicodeEncodeError:
-                print(
-                    "[WARNING] Modem not found. You can connect manually from the dashboard."
-                )
+            _print("⚠️  Modem not found. You can connect manually from the dashboard.",
+                   "[WARNING] Modem not found. You can connect manually from the dashboard.")
     except Exception as e:
-        try:
-            print(f"⚠️  Could not auto-connect to modem: {e}")
-        except UnicodeEncodeError:
-            print(f"[WARNING] Could not auto-connect to modem: {e}")
+        _print(f"⚠️  Could not auto-connect to modem: {e}",
+               f"[WARNING] Could not auto-connect to modem: {e}")
 
-    try:
-        print(f"\n🚀 Opening dashboard at http://{host}:{port}")
-        print(f"   (The browser should open automatically)\n")
-    except UnicodeEncodeError:
-        print(f"\n[STARTING] Opening dashboard at http://{host}:{port}")
-        print(f"   (The browser should open automatically)\n")
+    _print(f"\n🚀 Opening dashboard at http://{host}:{port}\n   (The browser should open automatically)\n",
+           f"\n[STARTING] Opening dashboard at http://{host}:{port}\n   (The browser should open automatically)\n")
 
     app.run(host=host, port=port, debug=debug, use_reloader=False)
+
+
+def _run_production(host, port, workers, backend_address):
+    """Start the modem backend process, then serve the app with gunicorn."""
+    import multiprocessing
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("Production mode needs gunicorn (Linux/macOS):")
+        print("  pip install -e .[production]")
+        return
+
+    # Workers find the backend through the environment they inherit
+    os.environ.setdefault("SIM7600_BACKEND_KEY", new_authkey())
+    os.environ["SIM7600_BACKEND"] = f"{backend_address[0]}:{backend_address[1]}"
+    authkey = os.environ["SIM7600_BACKEND_KEY"].encode()
+
+    backend_proc = multiprocessing.Process(
+        target=serve_backend,
+        args=(backend_address, authkey),
+        kwargs={"history_size": history_size},
+        daemon=True,
+    )
+    backend_proc.start()
+    # Fail early if the backend can't start (e.g. the address is taken)
+    connect_backend(backend_address, authkey)
+
+    class DashboardApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+
+        def load(self):
+            # Runs in each worker after fork
+            from .wsgi import app as wsgi_app
+
+            return wsgi_app
+
+    _print(f"\n🚀 Serving with {workers} workers at http://{host}:{port}\n",
+           f"\n[STARTING] Serving with {workers} workers at http://{host}:{port}\n")
+    try:
+        DashboardApplication().run()
+    finally:
+        backend_proc.terminate()
+        backend_proc.join(5)
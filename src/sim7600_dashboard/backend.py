@@ -0,0 +1,628 @@
+"""
+Modem-owning backend for the dashboard.
+
+``DashboardBackend`` holds everything that used to live in ``app.py`` module
+globals: the modem, the receive pipeline and the message history. In the
+default single-process mode the Flask app uses one directly. In production
+mode it runs in its own process, so only one process ever touches the serial
+port, and each WSGI worker wraps a ``multiprocessing`` manager proxy to it in
+a ``WorkerBackend``.
+
+Workers answer reads themselves: message history and contacts come from the
+archive the backend writes, analytics from its snapshot, and status, health
+and pipeline metrics from small JSON files the backend publishes every
+second (``publish_state``). Only sends, connecting and scheduled sends are
+calls into the backend process.
+"""
+
+from __future__ import annotations
+import json
+import logging
+import os
+import secrets
+import tempfile
+import threading
+import time
+from datetime import datetime
+from multiprocessing.managers import BaseManager
+from pathlib import Path
+
+from sim7600 import Modem, find_sim7600_port
+from sim7600.modem import resolve_urc_port
+from sim7600.analytics import ANALYTICS_PATH, TrafficStats
+from sim7600.archive import MessageArchive, import_legacy_log
+from sim7600.codec import plan_message
+from sim7600.events import SmsEvent
+from sim7600.health import HealthSampler, signal_range
+from sim7600.messages import MessageRing
+from sim7600.pipeline import ReceivePipeline
+from sim7600.scheduler import SCHEDULE_PATH, SendScheduler
+
+ARCHIVE_DIR = "logs/sms"
+LEGACY_LOG = "logs/sms.jsonl"
+HISTORY_SIZE = 10000  # messages kept in memory for the API
+HEALTH_INTERVAL = 30.0  # seconds between signal/registration/SIM samples
+STATE_DIR = "logs/dashboard"  # status and health published for WSGI workers
+PUBLISH_INTERVAL = 1.0  # seconds between state files written for workers
+DEFAULT_BACKEND_ADDRESS = ("127.0.0.1", 5050)
+
+
+class DashboardBackend:
+    """Modem session, receiver and message history behind the dashboard API."""
+
+    def __init__(
+        self,
+        archive_dir: str = ARCHIVE_DIR,
+        legacy_log: str = LEGACY_LOG,
+        echo_raw: bool = True,
+        history_size: int | None = None,
+        urc_port: str | None = None,
+        urc_interface: str | None = None,
+        analytics_path: str | None = None,
+    ):
+        self.archive_dir = archive_dir
+        self.legacy_log = legacy_log
+        self.echo_raw = echo_raw
+        # Optional second AT interface for incoming SMS ("auto" to discover)
+        self.urc_port = urc_port if urc_port is not None else os.environ.get("URC_PORT", "")
+        self.urc_interface = urc_interface or os.environ.get("URC_INTERFACE", "modem")
+
+        self.modem: Modem | None = None
+        self.modem_port: str | None = None
+        self.modem_connected = False
+        self.modem_lock = threading.Lock()  # Prevent concurrent modem access
+        self.logger = logging.getLogger("sim7600")
+        self.receive_pipeline: ReceivePipeline | None = None
+        self._receiving_thread: threading.Thread | None = None
+        self.health: HealthSampler | None = None
+        self.health_interval = float(os.environ.get("HEALTH_INTERVAL", HEALTH_INTERVAL))
+        self._published_health = None
+
+        if history_size is None:
+            history_size = int(os.environ.get("DASHBOARD_HISTORY", HISTORY_SIZE))
+        self.messages = MessageRing(history_size)
+        self._messages_lock = threading.Lock()
+        self.archive: MessageArchive | None = None
+        if analytics_path is None:
+            analytics_path = os.environ.get("ANALYTICS_PATH", ANALYTICS_PATH)
+        self.analytics = TrafficStats.load(analytics_path)
+        # Scheduled sends go out through this session once a modem is connected
+        self.scheduler = SendScheduler(
+            self.dispatch_scheduled, os.environ.get("SCHEDULE_PATH", SCHEDULE_PATH)
+        )
+
+    # ----- history -----
+
+    def load_existing_messages(self) -> int:
+        """Load the most recent messages from the segmented archive."""
+        if self.archive is None:
+            self.archive = MessageArchive(self.archive_dir)
+            # One-time import of the old single-file log into an empty archive
+            import_legacy_log(self.archive, self.legacy_log)
+        # Fill the in-memory ring; only the newest segments are read
+        recent = self.archive.tail(self.messages.capacity)
+        with self._messages_lock:
+            self.messages.clear()
+            self.messages.extend(recent)
+            return len(self.messages)
+
+    def _add_message(self, message: dict):
+        with self._messages_lock:
+            self.messages.append(message)  # evicts the oldest when full
+        if self.archive is None:
+            self.load_existing_messages()
+        self.archive.append(message)
+
+    def recent_messages(self, n: int = 50) -> list[dict]:
+        """Newest first."""
+        with self._messages_lock:
+            return self.messages.recent(n)
+
+    def contacts(self) -> list[str]:
+        """Unique phone numbers from message history."""
+        with self._messages_lock:
+            return self.messages.contacts()
+
+    def status(self) -> dict:
+        health = self.health
+        return {
+            # A modem that stops answering health probes counts as disconnected
+            "connected": self.modem_connected and (health is None or health.responding),
+            "port": self.modem_port,
+            "message_count": len(self.messages),
+            "health": health.latest() if health else None,
+        }
+
+    def health_summary(self, last: int = 120) -> dict:
+        if self.health is None:
+            return {"latest": None, "responding": False, "usable": False, "samples": []}
+        return self.health.summary(last)
+
+    def analytics_summary(self, hours: int = 24, top: int = 10) -> dict:
+        return self.analytics.summary(hours, top)
+
+    def pipeline_metrics(self) -> dict:
+        if self.receive_pipeline is None:
+            return {"lines_read": 0, "stages": []}
+        return self.receive_pipeline.metrics()
+
+    def publish_state(self, state_dir: str = STATE_DIR):
+        """
+        Write status, pipeline metrics and health samples for WSGI workers.
+
+        ``status.json`` is rewritten on every call; ``health.json`` (the whole
+        sample ring) only after a new sample. Pending analytics are saved too.
+        """
+        state = Path(state_dir)
+        _write_json(
+            state / "status.json",
+            {"status": self.status(), "pipeline": self.pipeline_metrics()},
+        )
+        health = self.health
+        key = (id(health), health.latest() if health else None)
+        if key != self._published_health:
+            summary = self.health_summary(health.ring.capacity if health else 1)
+            _write_json(state / "health.json", summary)
+            self._published_health = key
+        self.analytics.maybe_save()
+
+    # ----- modem -----
+
+    def connect(self, port: str | None = None) -> str | None:
+        """
+        Open the modem and start the receiver.
+
+        Returns the port, or None if no modem was found.
+        """
+        # Stop the previous receiver before reopening the port
+        self._stop_receiver()
+
+        port = port or find_sim7600_port()
+        if not port:
+            return None
+        urc_port, urc_interface = resolve_urc_port(self.urc_port, port, self.urc_interface)
+        try:
+            with self.modem_lock:
+                if self.modem:
+                    self.modem.close()
+                self.modem = Modem(
+                    port,
+                    echo_raw=self.echo_raw,
+                    urc_port=urc_port,
+                    urc_interface=urc_interface,
+                )
+                self.modem.open()
+                try:
+                    self.modem.init_sms_push()
+                except Exception:
+                    self.modem.close()
+                    raise
+        except Exception:
+            self.modem_connected = False
+            raise
+
+        self.modem_port = port
+        self.modem_connected = True
+        self.health = HealthSampler(
+            self.modem,
+            self.modem_lock,
+            interval=self.health_interval,
+            on_urc=self._urc_on_command_port,
+        )
+        if self.modem.has_urc_channel:
+            # Command port is idle between sends: probe from a thread
+            self.health.start()
+        self.scheduler.start()
+        self._receiving_thread = threading.Thread(target=self._receive_loop, daemon=True)
+        self._receiving_thread.start()
+        return port
+
+    def _urc_on_command_port(self, line: str):
+        # An SMS or RING that arrived while a probe or a send was reading the port
+        if self.receive_pipeline is not None:
+            self.receive_pipeline.parse_stage.put(line)
+
+    def _stop_receiver(self):
+        if self.health is not None:
+            self.health.stop()
+        if self.receive_pipeline is not None:
+            self.receive_pipeline.stop()
+        if self._receiving_thread is not None:
+            self._receiving_thread.join(timeout=5)
+            self._receiving_thread = None
+
+    def _receive_loop(self):
+        """Background thread to receive SMS messages."""
+        modem = self.modem
+
+        def read_line():
+            try:
+                if modem.has_urc_channel:
+                    # Own port: never waits behind a send
+                    return modem.readline()
+                # Use lock when reading from modem; health probes run
+                # between reads, never during a send
+                with self.modem_lock:
+                    if self.health is not None:
+                        self.health.step()
+                    return modem.readline()
+            except Exception as e:
+                self.logger.error(f"Error in receive loop: {e}")
+                time.sleep(1)
+                return ""
+
+        def store(event):
+            if isinstance(event, SmsEvent):
+                self._add_message(event.to_dict())
+                self.analytics.record_received(event.sender)
+
+        # Parsing and saving run on pipeline stages, off the serial-reading thread
+        self.receive_pipeline = ReceivePipeline(read_line, [store])
+        self.receive_pipeline.run()
+
+    def send(self, phone: str, message: str) -> dict:
+        """
+        Send an SMS and record it.
+
+        Returns a dict with ``success`` plus the ``encoding`` and number of
+        ``segments`` used. Raises RuntimeError if the modem is not connected.
+        """
+        if not self.modem_connected or not self.modem:
+            raise RuntimeError("Modem not connected")
+
+        plan = plan_message(message)
+
+        # Send the message using core sim7600 package (with lock for thread safety)
+        with self.modem_lock:
+            success = self._send_locked(phone, message)
+
+        if not success:
+            return {"success": False}
+
+        self._record_sent(phone, message)
+        return {"success": True, "encoding": plan.encoding, "segments": plan.segments}
+
+    def _send_locked(self, phone: str, message: str) -> bool:
+        """Send one SMS and count it; the caller holds ``modem_lock``."""
+        started = time.monotonic()
+        try:
+            success = self.modem.send_sms(phone, message, on_urc=self._urc_on_command_port)
+        except Exception:
+            self.analytics.record_send(phone, ok=False)
+            raise
+        self.analytics.record_send(phone, ok=success, latency=time.monotonic() - started)
+        return success
+
+    def _record_sent(self, phone: str, message: str, **extra):
+        self._add_message(
+            {
+                "direction": "sent",
+                "recipient": phone,
+                "text": message,
+                "timestamp": datetime.now().isoformat(),
+                **extra,
+            }
+        )
+
+    # ----- scheduled sends -----
+
+    def dispatch_scheduled(self, jobs: list[dict]):
+        """
+        Send a batch of due scheduled jobs under one hold of the modem lock.
+
+        Yields each job's result as soon as it is known. Jobs are deferred
+        (None) while the modem is disconnected or the health sampler reports
+        no usable signal.
+        """
+        if not self.modem_connected or not self.modem:
+            yield from [None] * len(jobs)
+            return
+        if self.health is not None and not self.health.usable():
+            self.logger.warning("Poor signal or no network; deferring scheduled sends")
+            yield from [None] * len(jobs)
+            return
+        with self.modem_lock:
+            for job in jobs:
+                yield self._send_scheduled(job)
+
+    def _send_scheduled(self, job: dict) -> bool:
+        """Send and record one job; the caller holds ``modem_lock``."""
+        try:
+            ok = self._send_locked(job["phone"], job["message"])
+        except Exception as e:
+            self.logger.error(f"Scheduled send to {job['phone']} failed: {e}")
+            return False
+        if ok:
+            try:
+                self._record_sent(job["phone"], job["message"], scheduled=job["id"])
+            except Exception as e:
+                # Sent all the same: reporting failure would send it again
+                self.logger.error(f"Could not record scheduled send {job['id']}: {e}")
+        return ok
+
+    def schedule(
+        self, phone: str, message: str, at=None, after: float | None = None
+    ) -> dict:
+        """
+        Schedule an SMS for ``at`` (epoch or ISO time) or ``after`` seconds.
+
+        Raises ValueError for an invalid number, message or time.
+        """
+        if at is None:
+            return self.scheduler.send_after(phone, message, float(after or 0.0))
+        return self.scheduler.send_at(phone, message, at)
+
+    def scheduled(self) -> dict:
+        return {"pending": self.scheduler.pending(), "recent": self.scheduler.recent()}
+
+    def cancel_scheduled(self, job_id: str) -> bool:
+        return self.scheduler.cancel(job_id)
+
+    def close(self):
+        self.scheduler.stop()
+        self._stop_receiver()
+        with self.modem_lock:
+            if self.modem:
+                self.modem.close()
+        if self.archive:
+            self.archive.close()
+        self.analytics.close()
+
+
+# ----- sharing across processes -----
+
+_backend: DashboardBackend | None = None
+
+
+def _get_backend() -> DashboardBackend:
+    return _backend
+
+
+class BackendManager(BaseManager):
+    """Serves one ``DashboardBackend`` to WSGI worker processes."""
+
+
+BackendManager.register("get_backend", callable=_get_backend)
+
+
+def parse_address(value: str | None) -> tuple[str, int]:
+    """'host:port' -> (host, port); None gives the default address."""
+    if not value:
+        return DEFAULT_BACKEND_ADDRESS
+    host, _, port = value.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def serve_backend(
+    address: tuple[str, int] = DEFAULT_BACKEND_ADDRESS,
+    authkey: bytes | None = None,
+    auto_connect: bool = True,
+    history_size: int | None = None,
+):
+    """Run the modem-owning backend process (blocks)."""
+    global _backend
+    _backend = DashboardBackend(history_size=history_size)
+    count = _backend.load_existing_messages()
+    print(f"[backend] Loaded {count} existing messages")
+    if auto_connect:
+        try:
+            port = _backend.connect()
+            if port:
+                print(f"[backend] Connected to modem on {port}")
+            else:
+                print("[backend] Modem not found. Connect from the dashboard.")
+        except Exception as e:
+            print(f"[backend] Could not auto-connect to modem: {e}")
+
+    key = authkey or os.environ.get("SIM7600_BACKEND_KEY", "").encode()
+    if not key:
+        key = new_authkey().encode()
+        print(f"[backend] Workers need SIM7600_BACKEND_KEY={key.decode()}")
+    manager = BackendManager(address=address, authkey=key)
+    server = manager.get_server()
+
+    # Workers read status and health from these files instead of calling in
+    state_dir = os.environ.get("DASHBOARD_STATE", STATE_DIR)
+    stop = threading.Event()
+
+    def publish():
+        while True:
+            try:
+                _backend.publish_state(state_dir)
+            except Exception as e:
+                _backend.logger.error(f"Could not publish dashboard state: {e}")
+            if stop.wait(PUBLISH_INTERVAL):
+                return
+
+    threading.Thread(target=publish, name="publish", daemon=True).start()
+    print(f"[backend] Serving on {address[0]}:{address[1]}")
+    try:
+        server.serve_forever()
+    finally:
+        stop.set()
+        _backend.close()
+
+
+def connect_backend(
+    address: tuple[str, int] = DEFAULT_BACKEND_ADDRESS,
+    authkey: bytes | None = None,
+    timeout: float = 30.0,
+):
+    """Proxy to a running backend; retries until it accepts connections."""
+    key = authkey or os.environ.get("SIM7600_BACKEND_KEY", "").encode()
+    deadline = time.monotonic() + timeout
+    while True:
+        manager = BackendManager(address=address, authkey=key)
+        try:
+            manager.connect()
+            return manager.get_backend()
+        except (ConnectionRefusedError, OSError):
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def new_authkey() -> str:
+    return secrets.token_hex(16)
+
+
+def _write_json(path: Path, data):
+    """Replace ``path`` atomically; the temporary name is unique per writer."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+# ----- worker-side reads -----
+
+
+class WorkerBackend:
+    """
+    The backend as one WSGI worker sees it: reads served locally, writes proxied.
+
+    Message history and contacts are kept in the worker's own ``MessageRing``
+    and topped up from the archive with ``MessageArchive.read_after``, at most
+    every ``refresh`` seconds. Status, pipeline metrics and health come from
+    the files ``DashboardBackend.publish_state`` writes, and analytics from the
+    backend's snapshot (both re-read only when the file changes). Sends,
+    connecting and scheduled sends go to ``proxy``.
+
+    Args:
+        proxy: ``connect_backend()`` proxy to the modem-owning process.
+        archive_dir: Archive the backend writes.
+        history_size: Messages kept in memory.
+        state_dir: Where the backend publishes status and health.
+        analytics_path: The backend's analytics snapshot.
+        refresh: Minimum seconds between archive reads.
+    """
+
+    def __init__(
+        self,
+        proxy,
+        archive_dir: str = ARCHIVE_DIR,
+        history_size: int | None = None,
+        state_dir: str | None = None,
+        analytics_path: str | None = None,
+        refresh: float = 0.5,
+    ):
+        self.proxy = proxy
+        self.archive = MessageArchive(archive_dir, readonly=True)
+        if history_size is None:
+            history_size = int(os.environ.get("DASHBOARD_HISTORY", HISTORY_SIZE))
+        self.messages = MessageRing(history_size)
+        self.refresh = refresh
+        self.state_dir = Path(state_dir or os.environ.get("DASHBOARD_STATE", STATE_DIR))
+        if analytics_path is None:
+            analytics_path = os.environ.get("ANALYTICS_PATH", ANALYTICS_PATH)
+        self.analytics_path = Path(analytics_path) if analytics_path else None
+        self._position = None  # where the last archive read stopped
+        self._synced = None  # monotonic time of the last archive read
+        self._lock = threading.Lock()
+        self._files: dict[Path, tuple] = {}  # path -> (mtime_ns, size, value)
+
+    # ----- history -----
+
+    def _sync(self):
+        """Append messages the backend archived since the last read."""
+        now = time.monotonic()
+        if self._synced is not None and now - self._synced < self.refresh:
+            return
+        new, self._position = self.archive.read_after(
+            self._position, last=self.messages.capacity
+        )
+        self.messages.extend(new)
+        self._synced = now
+
+    def recent_messages(self, n: int = 50) -> list[dict]:
+        """Newest first."""
+        with self._lock:
+            self._sync()
+            return self.messages.recent(n)
+
+    def contacts(self) -> list[str]:
+        """Unique phone numbers from message history."""
+        with self._lock:
+            self._sync()
+            return self.messages.contacts()
+
+    # ----- published state -----
+
+    def _load(self, path: Path | None, parse):
+        """``parse(path)``, cached until the file changes; None if it's missing."""
+        if path is None:
+            return None
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._files.get(path)
+            if cached is None or cached[:2] != (st.st_mtime_ns, st.st_size):
+                try:
+                    cached = self._files[path] = (st.st_mtime_ns, st.st_size, parse(path))
+                except (OSError, ValueError):
+                    return cached[2] if cached else None
+            return cached[2]
+
+    def _state(self, name: str) -> dict | None:
+        return self._load(
+            self.state_dir / name, lambda p: json.loads(p.read_text(encoding="utf-8"))
+        )
+
+    def status(self) -> dict:
+        published = self._state("status.json")
+        status = dict(published["status"]) if published else {
+            "connected": False, "port": None, "health": None,
+        }
+        with self._lock:
+            self._sync()
+            status["message_count"] = len(self.messages)
+        return status
+
+    def pipeline_metrics(self) -> dict:
+        published = self._state("status.json")
+        return published["pipeline"] if published else {"lines_read": 0, "stages": []}
+
+    def health_summary(self, last: int = 120) -> dict:
+        published = self._state("health.json")
+        if published is None:
+            return {"latest": None, "responding": False, "usable": False, "samples": []}
+        samples = published["samples"][-last:]
+        return {
+            **published,
+            "latest": samples[-1] if samples else None,
+            "samples": samples,
+            "signal": signal_range(samples),
+        }
+
+    def analytics_summary(self, hours: int = 24, top: int = 10) -> dict:
+        stats = self._load(self.analytics_path, TrafficStats.load)
+        if stats is None:
+            stats = TrafficStats(None)
+        return stats.summary(hours, top)
+
+    # ----- proxied to the backend process -----
+
+    def connect(self, port: str | None = None) -> str | None:
+        return self.proxy.connect(port)
+
+    def send(self, phone: str, message: str) -> dict:
+        result = self.proxy.send(phone, message)
+        with self._lock:
+            self._synced = None  # show the sent message on the next read
+        return result
+
+    def schedule(self, phone: str, message: str, at=None, after: float | None = None) -> dict:
+        return self.proxy.schedule(phone, message, at=at, after=after)
+
+    def scheduled(self) -> dict:
+        return self.proxy.scheduled()
+
+    def cancel_scheduled(self, job_id: str) -> bool:
+        return self.proxy.cancel_scheduled(job_id)
@@ -1,6 +1,7 @@
 // SIM7600 Dashboard JavaScript
 
 let contacts = [];
+let encodeTimer = null;
 
 // Update status on page load
 document.addEventListener("DOMContentLoaded", function () {
@@ -11,9 +12,21 @@ document.addEventListener("DOMContentLoaded", function () {
   // Auto-refresh messages every 5 seconds
   setInterval(loadMessages, 5000);
 
+  // Pending scheduled sends every 5 seconds
+  loadScheduled();
+  setInterval(loadScheduled, 5000);
+
   // Auto-update status every 3 seconds
   setInterval(updateStatus, 3000);
 
+  // GPS position every 5 seconds
+  loadGps();
+  setInterval(loadGps, 5000);
+
+  // Simplified 24h track every minute
+  loadGpsTrack();
+  setInterval(loadGpsTrack, 60000);
+
   // Character counter
   const messageInput = document.getElementById("message");
   const charCount = document.getElementById("charCount");
@@ -21,8 +34,9 @@ document.addEventListener("DOMContentLoaded", function () {
   messageInput.addEventListener("input", function () {
     charCount.textContent = this.value.length;
 
-    // Check for non-ASCII characters
-    checkSpecialCharacters(this.value);
+    // Ask the server how the message will be encoded (debounced)
+    clearTimeout(encodeTimer);
+    encodeTimer = setTimeout(() => updateEncodingInfo(this.value.trim()), 250);
   });
 
   // Form submission
@@ -53,6 +67,7 @@ async function updateStatus() {
     }
 
     countEl.textContent = `${data.message_count} messages`;
+    updateSignal(data.connected ? data.health : null);
   } catch (error) {
     console.error("Error updating status:", error);
   }
@@ -99,6 +114,71 @@ async function loadMessages() {
   }
 }
 
+// Load latest GPS fix
+async function loadGps() {
+  try {
+    const response = await fetch("/api/gps?last=1");
+    const data = await response.json();
+    const fix = data.fix;
+    if (!fix) return;
+
+    const lat = fix.lat.toFixed(6);
+    const lon = fix.lon.toFixed(6);
+    const speed = fix.speed !== null ? (fix.speed * 3.6).toFixed(1) : "-";
+    const alt = fix.alt !== null ? fix.alt.toFixed(1) : "-";
+    const fixEl = document.getElementById("gpsFix");
+    fixEl.className = "gps-fix";
+    fixEl.innerHTML = `
+      <span><a href="https://www.openstreetmap.org/?mlat=${lat}&mlon=${lon}#map=16/${lat}/${lon}" target="_blank">${lat}, ${lon}</a></span>
+      <span>Alt: ${alt} m</span>
+      <span>Speed: ${speed} km/h</span>
+      <span>Sats: ${fix.sats || "-"}</span>
+    `;
+    document.getElementById("gpsAge").textContent = new Date(
+      fix.time * 1000
+    ).toLocaleString();
+  } catch (error) {
+    console.error("Error loading GPS:", error);
+  }
+}
+
+// Draw the simplified track for the last 24 hours
+async function loadGpsTrack() {
+  try {
+    const response = await fetch("/api/gps/track");
+    const data = await response.json();
+    const coords = data.geometry.coordinates;
+    const svg = document.getElementById("gpsTrack");
+    if (coords.length < 2) {
+      svg.style.display = "none";
+      return;
+    }
+
+    // Equirectangular projection scaled to fit the box
+    const lats = coords.map((c) => c[1]);
+    const lons = coords.map((c) => c[0]);
+    const minLat = Math.min(...lats);
+    const maxLat = Math.max(...lats);
+    const minLon = Math.min(...lons);
+    const maxLon = Math.max(...lons);
+    const k = Math.cos((((minLat + maxLat) / 2) * Math.PI) / 180);
+    const span = Math.max((maxLon - minLon) * k, maxLat - minLat, 1e-6);
+    const points = coords
+      .map(
+        (c) =>
+          `${(((c[0] - minLon) * k) / span) * 1000},${((maxLat - c[1]) / span) * 1000}`
+      )
+      .join(" ");
+
+    svg.setAttribute("viewBox", "-20 -20 1040 1040");
+    svg.setAttribute("preserveAspectRatio", "xMidYMid meet");
+    svg.innerHTML = `<polyline points="${points}" />`;
+    svg.style.display = "block";
+  } catch (error) {
+    console.error("Error loading GPS track:", error);
+  }
+}
+
 // Refresh messages (called by button)
 function refreshMessages() {
   loadMessages();
@@ -111,12 +191,18 @@ async function sendSMS(e) {
 
   const phone = document.getElementById("phone").value.trim();
   const message = document.getElementById("message").value.trim();
+  const sendAt = document.getElementById("sendAt").value;
 
   if (!phone || !message) {
     showStatus("Please fill in all fields", "error");
     return;
   }
 
+  if (sendAt) {
+    await scheduleSMS(phone, message, sendAt);
+    return;
+  }
+
   const sendBtn = e.target.querySelector('button[type="submit"]');
   sendBtn.disabled = true;
   sendBtn.textContent = "Sending...";
@@ -136,9 +222,11 @@ async function sendSMS(e) {
       showStatus("✅ SMS sent successfully!", "success");
       clearForm();
 
-      if (!data.ascii_only && data.preview) {
+      if (data.segments > 1) {
         showStatus(
-          `SMS sent. Special characters were converted. Sent as: "${data.preview}"`,
+          `✅ SMS sent in ${data.segments} parts (${
+            data.encoding === "ucs2" ? "Unicode" : "GSM 7-bit"
+          })`,
           "success"
         );
       }
@@ -153,33 +241,142 @@ async function sendSMS(e) {
   }
 }
 
-// Check for special characters
-function checkSpecialCharacters(message) {
+// Schedule an SMS for later (datetime-local value, server local time)
+async function scheduleSMS(phone, message, at) {
+  try {
+    const response = await fetch("/api/scheduled", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({ phone, message, at }),
+    });
+    const data = await response.json();
+    if (data.success) {
+      showStatus(
+        `⏰ Scheduled for ${new Date(data.job.due * 1000).toLocaleString()}`,
+        "success"
+      );
+      clearForm();
+      loadScheduled();
+    } else {
+      showStatus(`❌ Error: ${data.error}`, "error");
+    }
+  } catch (error) {
+    showStatus(`❌ Error: ${error.message}`, "error");
+  }
+}
+
+// Load pending scheduled sends
+async function loadScheduled() {
+  try {
+    const response = await fetch("/api/scheduled");
+    const data = await response.json();
+    const list = document.getElementById("scheduledList");
+    document.getElementById("scheduledCount").textContent = data.pending.length
+      ? `${data.pending.length} pending`
+      : "";
+
+    if (data.pending.length === 0) {
+      list.innerHTML = '<div class="no-messages">Nothing scheduled</div>';
+      return;
+    }
+
+    list.innerHTML = data.pending
+      .map((job) => {
+        const retry = job.attempts ? ` · retry ${job.attempts}` : "";
+        return `
+            <div class="message-item scheduled">
+                <div class="message-header">
+                    <span class="message-sender">⏰ To: ${escapeHtml(job.phone)}</span>
+                    <span class="message-time">${new Date(
+                      job.due * 1000
+                    ).toLocaleString()}${retry}
+                      <button class="btn btn-small" onclick="cancelScheduled('${escapeHtml(
+                        job.id
+                      )}')">Cancel</button>
+                    </span>
+                </div>
+                <div class="message-text">${escapeHtml(job.message)}</div>
+            </div>
+        `;
+      })
+      .join("");
+  } catch (error) {
+    console.error("Error loading scheduled sends:", error);
+  }
+}
+
+// Cancel a pending scheduled send
+async function cancelScheduled(id) {
+  try {
+    const response = await fetch(`/api/scheduled/${encodeURIComponent(id)}`, {
+      method: "DELETE",
+    });
+    const data = await response.json();
+    if (!data.success) {
+      showStatus(`❌ Error: ${data.error}`, "error");
+    }
+    loadScheduled();
+  } catch (error) {
+    showStatus(`❌ Error: ${error.message}`, "error");
+  }
+}
+
+// Show encoding and segment count for the message being typed
+async function updateEncodingInfo(message) {
   const warningDiv = document.getElementById("warning");
   const previewDiv = document.getElementById("preview");
+  const segmentInfo = document.getElementById("segmentInfo");
+
+  if (!message) {
+    segmentInfo.textContent = "1 SMS";
+    warningDiv.style.display = "none";
+    return;
+  }
+
+  try {
+    const response = await fetch("/api/encode", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ message }),
+    });
+    const data = await response.json();
+    if (data.error) {
+      segmentInfo.textContent = data.error;
+      return;
+    }
+
+    segmentInfo.textContent =
+      data.segments > 1
+        ? `${data.segments} SMS (${data.per_segment} per part)`
+        : `1 SMS (${data.units} / ${data.per_segment})`;
 
-  // Try to encode as ASCII
-  let hasSpecialChars = false;
-  for (let char of message) {
-    if (char.charCodeAt(0) > 127) {
-      hasSpecialChars = true;
-      break;
+    if (data.encoding === "ucs2") {
+      // Unicode halves the characters per SMS
+      warningDiv.style.display = "block";
+      previewDiv.textContent =
+        "Message will be sent as Unicode (UCS2): 70 characters per SMS, 67 per part when split.";
+    } else {
+      warningDiv.style.display = "none";
     }
+  } catch (error) {
+    console.error("Error checking encoding:", error);
   }
+}
 
-  if (hasSpecialChars) {
-    // Show warning
-    const preview = message
-      .normalize("NFD")
-      .replace(/[\u0300-\u036f]/g, "")
-      .replace(/[^\x00-\x7F]/g, "?");
-    warningDiv.style.display = "block";
-    previewDiv.innerHTML = `Message will be sent as: <strong>"${escapeHtml(
-      preview
-    )}"</strong>`;
-  } else {
-    warningDiv.style.display = "none";
+// Signal strength, network registration and SIM state from the health sampler
+function updateSignal(health) {
+  const signalEl = document.getElementById("signal");
+  if (!health) {
+    signalEl.textContent = "";
+    return;
   }
+  const parts = [health.dbm === null ? "📶 No signal" : `📶 ${health.dbm} dBm`];
+  if (!health.registered) parts.push("not registered");
+  if (health.sim && health.sim !== "READY") parts.push(`SIM: ${health.sim}`);
+  signalEl.textContent = parts.join(" · ");
+  signalEl.title = `Checked ${health.at}`;
 }
 
 // Show status message
@@ -198,7 +395,9 @@ function showStatus(message, type) {
 function clearForm() {
   document.getElementById("phone").value = "";
   document.getElementById("message").value = "";
+  document.getElementById("sendAt").value = "";
   document.getElementById("charCount").textContent = "0";
+  document.getElementById("segmentInfo").textContent = "1 SMS";
   document.getElementById("warning").style.display = "none";
 }
 
@@ -0,0 +1,20 @@
+"""
+WSGI entry point for production serving.
+
+Each worker connects to the modem-owning backend process instead of opening
+the modem itself, and serves history, status, health and analytics from the
+files that process writes (see ``WorkerBackend``). Start the backend first::
+
+    SIM7600_BACKEND_KEY=secret python -m sim7600_dashboard --backend-only
+    SIM7600_BACKEND_KEY=secret gunicorn -w 4 sim7600_dashboard.wsgi:app
+
+``python -m sim7600 dashboard --workers 4`` does both for you.
+"""
+
+import os
+
+from .app import app, history_size, use_backend
+from .backend import WorkerBackend, connect_backend, parse_address
+
+proxy = connect_backend(parse_address(os.environ.get("SIM7600_BACKEND")))
+use_backend(WorkerBackend(proxy, history_size=history_size))